@@ -3,7 +3,9 @@
 
 """ POBOT Junior Cup Web application.
 """
+from pjc.web import logqueue
 from pjc.web.application import PJCWebApp
+from pjc.web.watchdog import StallWatchdog
 
 __author__ = 'eric'
 
@@ -45,6 +47,63 @@ if __name__ == '__main__':
             help='data storage directory path',
             dest='data_home',
             default=default_data_home)
+        parser.add_argument(
+            '--storage',
+            help='tournament storage mode (json: full rewrite on each change, journal: append-only journal, '
+                 'sqlite: SQLite database updated row by row)',
+            dest='storage',
+            choices=PJCWebApp.STORAGE_MODES,
+            default=PJCWebApp.STORAGE_JSON)
+        parser.add_argument(
+            '--data-format',
+            help='tournament data file format (binary: compact and quickly loaded, json: human readable), '
+                 'both being read whatever this setting',
+            dest='data_format',
+            choices=PJCWebApp.DATA_FORMATS,
+            default=PJCWebApp.DATA_FORMAT_BINARY)
+        parser.add_argument(
+            '--journal-compaction',
+            help='count of journal records triggering a compaction (journal storage mode only)',
+            dest='journal_compaction',
+            type=int,
+            default=PJCWebApp.JOURNAL_COMPACTION_THRESHOLD)
+        parser.add_argument(
+            '--save-delay',
+            help='delay (in seconds) during which tournament save requests are coalesced',
+            dest='save_delay',
+            type=float,
+            default=PJCWebApp.SAVE_DELAY)
+        parser.add_argument(
+            '--stall-threshold',
+            help='delay (in seconds) after which the IO loop is considered as stalled, and its stack logged '
+                 '(0 to disable the detection)',
+            dest='stall_threshold',
+            type=float,
+            default=StallWatchdog.THRESHOLD)
+        parser.add_argument(
+            '--trace-sampling',
+            help='ratio (between 0 and 1) of the requests whose processing stages are traced (0 to disable the '
+                 'tracing)',
+            dest='trace_sampling',
+            type=float,
+            default=0.0)
+        parser.add_argument(
+            '--processes',
+            help='count of serving processes (0: one per CPU core), sharing the tournament managed by the first one',
+            dest='processes',
+            type=int,
+            default=1)
+        parser.add_argument(
+            '--sync-logging',
+            help='writes the logs synchronously, instead of from a background thread',
+            dest='sync_logging',
+            action='store_true')
+        parser.add_argument(
+            '--log-rate-limit',
+            help='maximum count of TV displays sequencing log records per second (0 for no limit)',
+            dest='log_rate_limit',
+            type=int,
+            default=20)
         seq_arg = parser.add_argument(
             '--display-sequence',
             help='TV display sequence (as a JSON array of page names)',
@@ -55,6 +114,10 @@ if __name__ == '__main__':
         if cli_args.debug:
             log.warn('debug mode activated')
 
+        if not cli_args.sync_logging:
+            rate_limits = {PJCWebApp.SEQUENCING_LOG_NAME: cli_args.log_rate_limit} if cli_args.log_rate_limit else None
+            logqueue.install(rate_limits=rate_limits)
+
         # expands the display_sequence if the keyword "all" has been used (debug mode only)
         if cli_args.display_sequence == "all":
             if cli_args.debug:
@@ -74,8 +137,7 @@ if __name__ == '__main__':
         _here = os.path.dirname(__file__)
         _web_root = os.path.join(_here, '../lib/pjc/web')
 
-        app = PJCWebApp(_web_root, cli_settings)
-        app.start()
+        pjc.web.application.serve(_web_root, cli_settings, processes=cli_args.processes)
 
     except Exception as e:
         log.exception('unexpected error - aborting')
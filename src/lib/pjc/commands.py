@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+""" Tournament modification commands.
+
+Commands have the same form as the mutation records notified by the tournament, and are applied with
+`Tournament.apply_mutation()`. Being plain JSON serializable dictionaries, they can be queued, journaled or sent
+to another process before being applied.
+"""
+
+__author__ = 'eric'
+
+
+def set_robotics_score(team_num, round_num, score):
+    return {'op': 'set_robotics_score', 'team': team_num, 'round': round_num, 'score': score.serialize()}
+
+
+def clear_robotics_score(team_num, round_num):
+    return {'op': 'clear_robotics_score', 'team': team_num, 'round': round_num}
+
+
+def set_research_evaluation(team_num, score):
+    return {'op': 'set_research_evaluation', 'team': team_num, 'score': score.serialize()}
+
+
+def clear_research_evaluation(team_num):
+    return {'op': 'clear_research_evaluation', 'team': team_num}
+
+
+def set_jury_evaluation(team_num, score):
+    return {'op': 'set_jury_evaluation', 'team': team_num, 'score': score.serialize()}
+
+
+def clear_jury_evaluation(team_num):
+    return {'op': 'clear_jury_evaluation', 'team': team_num}
+
+
+def set_team_presence(team_num, present):
+    return {'op': 'set_team_presence', 'team': team_num, 'present': present}
+
+
+def set_planning(times):
+    """
+    :param list times: the time limits of the planning items, as `datetime.time` instances
+    """
+    return {'op': 'set_planning', 'planning': [t.strftime('%H:%M') for t in times]}
+
+
+def deserialize_teams(teams):
+    """
+    :param dict teams: the teams, in the form produced by the tournament serialization
+    """
+    return {'op': 'deserialize_teams', 'teams': teams}
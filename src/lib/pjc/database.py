@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+
+""" SQLite storage of the tournament.
+
+Instead of a single document rewritten as a whole, the tournament is stored in tables updated row by row as
+modifications are performed. The database is kept up to date by registering `TournamentDatabase.apply()` as a
+mutation listener of the tournament (see `Tournament.add_mutation_listener()`) : each batch of mutation records
+results in a single transaction, touching only the rows of the modified teams and scores.
+
+Tables :
+    - settings : the tournament level data (planning, start time), as JSON values keyed by name
+    - teams : the teams, keyed by their number
+    - plannings : the planning items of the teams (0 to 2 for the robotics matches, 3 for the research
+      presentation), with the assigned table or jury
+    - scores : the scores of the teams, keyed by round ("rob1" to "rob3", "research" or "jury") and team number.
+      The score items are stored as a JSON dictionary, together with the evaluated points so that results can be
+      queried by external tools.
+
+The database is used in WAL mode, so that external readers do not block the application, and conversely.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+
+from .tournament import ResearchEvaluationScore, JuryEvaluationScore
+
+__author__ = 'eric'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS teams (
+    num INTEGER PRIMARY KEY,
+    name TEXT,
+    school TEXT,
+    grade INTEGER NOT NULL,
+    grade_label TEXT,
+    grade_orig TEXT,
+    city TEXT,
+    department TEXT,
+    present INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS plannings (
+    team_num INTEGER NOT NULL,
+    item INTEGER NOT NULL,
+    time TEXT NOT NULL,
+    assignment INTEGER,
+    PRIMARY KEY (team_num, item)
+);
+CREATE TABLE IF NOT EXISTS scores (
+    round TEXT NOT NULL,
+    team_num INTEGER NOT NULL,
+    items TEXT NOT NULL,
+    points INTEGER NOT NULL,
+    PRIMARY KEY (round, team_num)
+);
+CREATE INDEX IF NOT EXISTS scores_team ON scores (team_num);
+"""
+
+
+def _text(value):
+    """ Converts byte strings (such as the ones read from the teams CSV file) to unicode, as required by sqlite3.
+    """
+    return value.decode('utf-8') if isinstance(value, str) else value
+
+
+def _json(value):
+    return json.dumps(value, separators=(',', ':'))
+
+
+class TournamentDatabase(object):
+    """ The SQLite database storing a tournament.
+    """
+    def __init__(self, path, robotics_score_types):
+        """
+        :param str path: the path of the database file, created if not existing
+        :param tuple robotics_score_types: the score types of the robotics rounds, used for evaluating the points
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._path = path
+        self._robotics_round_ids = ['rob%d' % round_num for round_num in range(1, len(robotics_score_types) + 1)]
+        self._score_types = dict(zip(self._robotics_round_ids, robotics_score_types))
+        self._score_types.update(research=ResearchEvaluationScore, jury=JuryEvaluationScore)
+
+        self._connection = sqlite3.connect(path)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        # as for the journal, committed modifications must survive a power cut
+        self._connection.execute('PRAGMA synchronous=FULL')
+        self._connection.executescript(SCHEMA)
+
+    @property
+    def path(self):
+        return self._path
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @property
+    def mtime(self):
+        """ The last modification time of the database, including the changes not checkpointed yet.
+        """
+        paths = (self._path, self._path + '-wal')
+        return max(os.stat(path).st_mtime for path in paths if os.path.exists(path))
+
+    def is_empty(self):
+        return self._connection.execute('SELECT COUNT(*) FROM settings').fetchone()[0] == 0
+
+    # Writing
+
+    def save(self, tournament):
+        """ Replaces the database content by the whole tournament.
+
+        :param Tournament tournament: the tournament
+        """
+        rounds = zip(self._robotics_round_ids, tournament.get_robotics_rounds()) + [
+            ('research', tournament.research_evaluations),
+            ('jury', tournament.jury_evaluations),
+        ]
+
+        with self._connection as cnx:
+            cnx.execute('DELETE FROM scores')
+            self._set_setting(cnx, 'planning', [t.strftime('%H:%M') for t in tournament.planning])
+            self._set_setting(cnx, 'start_time', tournament.start_time.strftime('%H:%M'))
+            self._replace_teams(cnx, dict((team.num, team.serialize()) for team in tournament.teams(False)))
+            for round_id, round_ in rounds:
+                points = round_.points
+                cnx.executemany(
+                    'INSERT INTO scores (round, team_num, items, points) VALUES (?, ?, ?, ?)',
+                    (
+                        (round_id, team_num, _json(items), points[team_num])
+                        for team_num, items in round_.serialize().iteritems()
+                    )
+                )
+
+    def apply(self, records):
+        """ Applies a list of mutation records, in a single transaction.
+
+        The signature of this method allows using it directly as a tournament mutation listener.
+
+        :param list records: the mutation records
+        :raises ValueError: if a record operation is unknown
+        """
+        if not records:
+            return
+
+        with self._connection as cnx:
+            for record in records:
+                op = record['op']
+                if op == 'set_robotics_score':
+                    self._set_score(cnx, 'rob%d' % record['round'], record['team'], record['score'])
+                elif op == 'clear_robotics_score':
+                    self._clear_score(cnx, 'rob%d' % record['round'], record['team'])
+                elif op == 'set_research_evaluation':
+                    self._set_score(cnx, 'research', record['team'], record['score'])
+                elif op == 'clear_research_evaluation':
+                    self._clear_score(cnx, 'research', record['team'])
+                elif op == 'set_jury_evaluation':
+                    self._set_score(cnx, 'jury', record['team'], record['score'])
+                elif op == 'clear_jury_evaluation':
+                    self._clear_score(cnx, 'jury', record['team'])
+                elif op == 'set_team_presence':
+                    cnx.execute('UPDATE teams SET present = ? WHERE num = ?', (record['present'], record['team']))
+                elif op == 'set_planning':
+                    self._set_setting(cnx, 'planning', record['planning'])
+                elif op == 'set_start_time':
+                    self._set_setting(cnx, 'start_time', record['start_time'])
+                elif op == 'deserialize_teams':
+                    self._replace_teams(cnx, record['teams'])
+                else:
+                    raise ValueError('unknown mutation (%s)' % op)
+
+    def _set_setting(self, cnx, name, value):
+        cnx.execute('INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)', (name, _json(value)))
+
+    def _set_score(self, cnx, round_id, team_num, items):
+        points = self._score_types[round_id](**items).evaluate()
+        cnx.execute(
+            'INSERT OR REPLACE INTO scores (round, team_num, items, points) VALUES (?, ?, ?, ?)',
+            (round_id, team_num, _json(items), points)
+        )
+
+    def _clear_score(self, cnx, round_id, team_num):
+        cnx.execute('DELETE FROM scores WHERE round = ? AND team_num = ?', (round_id, team_num))
+
+    def _replace_teams(self, cnx, teams):
+        cnx.execute('DELETE FROM teams')
+        cnx.execute('DELETE FROM plannings')
+        for num, team in teams.iteritems():
+            grade = team['grade']
+            cnx.execute(
+                'INSERT INTO teams (num, name, school, grade, grade_label, grade_orig, city, department, present) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    int(num), _text(team['name']), _text(team['school']),
+                    grade['code'], _text(grade['label']), _text(grade['orig']),
+                    _text(team['city']), _text(team['department']), team['present']
+                )
+            )
+            cnx.executemany(
+                'INSERT INTO plannings (team_num, item, time, assignment) VALUES (?, ?, ?, ?)',
+                ((int(num), item, time, assignment) for item, (time, assignment) in enumerate(team['planning']))
+            )
+
+    # Reading
+
+    def read(self):
+        """ Returns the database content, in the form produced by `Tournament.serialize()`.
+
+        :raises ValueError: if the database is empty
+        """
+        cnx = self._connection
+        settings = dict((name, json.loads(value)) for name, value in cnx.execute('SELECT name, value FROM settings'))
+        if not settings:
+            raise ValueError('empty tournament database (%s)' % self._path)
+
+        plannings = {}
+        for team_num, item, time, assignment in cnx.execute(
+                'SELECT team_num, item, time, assignment FROM plannings ORDER BY team_num, item'):
+            plannings.setdefault(team_num, []).append((time, assignment))
+
+        teams = {}
+        for num, name, school, grade, grade_label, grade_orig, city, department, present in cnx.execute(
+                'SELECT num, name, school, grade, grade_label, grade_orig, city, department, present FROM teams'):
+            teams[num] = {
+                'name': name,
+                'school': school,
+                'grade': {'code': grade, 'label': grade_label, 'orig': grade_orig},
+                'city': city,
+                'department': department,
+                'present': bool(present),
+                'planning': plannings.get(num, []),
+            }
+
+        scores = dict((round_id, {}) for round_id in self._score_types)
+        for round_id, team_num, items in cnx.execute('SELECT round, team_num, items FROM scores'):
+            scores[round_id][team_num] = json.loads(items)
+
+        return {
+            'teams': teams,
+            'planning': settings['planning'],
+            'start_time': settings['start_time'],
+            'robotics_rounds': [scores[round_id] for round_id in self._robotics_round_ids],
+            'research_evaluations': scores['research'],
+            'jury_evaluations': scores['jury'],
+        }
+
+    def load(self, tournament):
+        """ Loads the database content in a tournament.
+
+        :param Tournament tournament: the tournament
+        :raises ValueError: if the database is empty
+        """
+        tournament.deserialize(self.read())
+
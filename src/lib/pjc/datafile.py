@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+
+""" Compact binary format of the tournament data file.
+
+The JSON form of the tournament (see `Tournament.serialize()`) is slow to load : times have to be parsed, and
+each score has to be rebuilt and evaluated again. The binary form stores the tournament in a layout close to the
+in-memory one :
+
+    - times are stored as minutes of the day
+    - the scores of a round are stored as the columns of `ScoreColumns` : a byte per team number telling if the
+      team has a score, and a column per score item
+
+Numbers are stored as little endian integers, and strings as UTF-8, prefixed by their length (0xFFFF standing
+for None). The file starts with a header containing a magic string and the format version, so that files saved
+in JSON (by older versions) can be recognized and loaded the former way.
+
+The file is loaded through a memory mapping, and the scores of a round are decoded only when accessed for the
+first time (see `LazyScoreColumns`). Only the teams are decoded when loading the file.
+
+The evaluated points are not stored, but computed again when decoding the scores, so that they always follow the
+current scoring rules, even if they have changed since the file was saved. Files of the format version 1, which
+stored them, are still loaded (the stored points being ignored).
+
+Scores which items are not integers or booleans, or which values do not fit in 32 bits, cannot be stored in this
+format. `pack()` raises a ValueError in this case, and the tournament must be saved in JSON.
+"""
+
+from array import array
+import datetime
+import json
+import mmap
+import os
+import struct
+import sys
+
+from .tournament import (
+    Team, TeamPlanning, Grade, Round, ScoreColumns, LazyScoreColumns, ResearchEvaluationScore, JuryEvaluationScore
+)
+
+__author__ = 'eric'
+
+MAGIC = b'PJCB'
+FORMAT_VERSION = 2
+
+# magic, format version, start time, planning (4 times), robotics round count, team count
+HEADER = struct.Struct('<4sHH4HHI')
+# num, grade code, present, planning flag, and the 4 planning items (time, table or jury, -1 if not assigned),
+# which content is meaningless if the team has no planning
+TEAM = struct.Struct('<IbBB' + 'Hh' * 4)
+# round : score count, column count
+ROUND = struct.Struct('<IB')
+STRING_LENGTH = struct.Struct('<H')
+NONE_LENGTH = 0xFFFF
+
+# column type codes in the file, with the corresponding array type codes and item sizes
+COLUMN_INT, COLUMN_BOOL = b'i', b'b'
+COLUMN_ARRAYS = {COLUMN_INT: ('i', 4), COLUMN_BOOL: ('b', 1)}
+
+
+def _check_array_sizes():
+    for typecode, size in COLUMN_ARRAYS.itervalues():
+        if array(typecode).itemsize != size:
+            raise RuntimeError('unsupported platform (array type %s size)' % typecode)
+
+_check_array_sizes()
+
+
+def is_binary(content):
+    """ Tells if a data file content is in the binary format (as opposed to JSON).
+
+    :param content: the beginning of the file content (at least 4 bytes)
+    """
+    return content[:len(MAGIC)] == MAGIC
+
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+
+def _time(minutes):
+    return datetime.time(minutes // 60, minutes % 60)
+
+
+class _Writer(object):
+    def __init__(self):
+        self._parts = []
+
+    def add(self, s, *values):
+        self._parts.append(s.pack(*values))
+
+    def add_bytes(self, value):
+        self._parts.append(bytes(value))
+
+    def add_string(self, value):
+        if value is None:
+            self.add(STRING_LENGTH, NONE_LENGTH)
+            return
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        elif not isinstance(value, str):
+            raise ValueError('unsupported string value (%r)' % value)
+        if len(value) >= NONE_LENGTH:
+            raise ValueError('string too long (%d bytes)' % len(value))
+        self.add(STRING_LENGTH, len(value))
+        self.add_bytes(value)
+
+    def add_array(self, typecode, values):
+        try:
+            a = array(typecode, values)
+        except OverflowError:
+            raise ValueError('value out of range')
+        if sys.byteorder == 'big':
+            a.byteswap()
+        self.add_bytes(a.tostring())
+
+    def getvalue(self):
+        return b''.join(self._parts)
+
+
+def _pack_round(writer, round_):
+    score_type = round_.score_type
+    mask, types, columns, _ = round_.scores.export()
+    if any(t is not None and t is not score_type for t in types):
+        raise ValueError('unsupported score type in round %s' % score_type.__name__)
+
+    column_types = []
+    for name in score_type.items:
+        column = columns.get(name)
+        if column is None:
+            continue
+        if not isinstance(column, array):
+            raise ValueError('unsupported values for %s.%s' % (score_type.__name__, name))
+        column_types.append((name, COLUMN_BOOL if column.typecode == ScoreColumns.BOOL_CODE else COLUMN_INT, column))
+    size = len(mask)
+    writer.add_string(score_type.__name__)
+    writer.add(ROUND, size, len(column_types))
+    for name, code, _ in column_types:
+        writer.add_string(name)
+        writer.add_bytes(code)
+    writer.add_bytes(mask)
+    for _, code, column in column_types:
+        writer.add_array(COLUMN_ARRAYS[code][0], column[:size])
+
+
+def pack(tournament):
+    """ Returns the binary form of a tournament.
+
+    :param Tournament tournament: the tournament
+    :rtype: str
+    :raises ValueError: if the tournament content cannot be stored in this format
+    """
+    robotics_rounds = tournament.get_robotics_rounds()
+    teams = sorted(tournament.teams(False), key=lambda t: t.num)
+
+    writer = _Writer()
+    writer.add(
+        HEADER, MAGIC, FORMAT_VERSION, _minutes(tournament.start_time),
+        *([_minutes(t) for t in tournament.planning] + [len(robotics_rounds), len(teams)])
+    )
+
+    for team in teams:
+        grade = team.grade
+        items = [0, -1] * 4
+        if team.planning is not None:
+            for item in range(4):
+                entry = team.planning[item]
+                assignment = entry.table if item < 3 else entry.jury
+                items[2 * item:2 * item + 2] = _minutes(entry.time), -1 if assignment is None else assignment
+        writer.add(TEAM, team.num, grade.code, bool(team.present), team.planning is not None, *items)
+        for value in (team.name, team.school, team.city, team.department, grade.label, grade.orig):
+            writer.add_string(value)
+
+    for round_ in robotics_rounds + [tournament.research_evaluations, tournament.jury_evaluations]:
+        _pack_round(writer, round_)
+
+    return writer.getvalue()
+
+
+class _Reader(object):
+    def __init__(self, buf):
+        self._buf = buf
+        self.offset = 0
+
+    def read(self, s):
+        try:
+            values = s.unpack_from(self._buf, self.offset)
+        except struct.error:
+            raise ValueError('truncated data file')
+        self.offset += s.size
+        return values
+
+    def _end(self, count):
+        end = self.offset + count
+        if end > len(self._buf):
+            raise ValueError('truncated data file')
+        return end
+
+    def read_bytes(self, count):
+        end = self._end(count)
+        value = self._buf[self.offset:end]
+        self.offset = end
+        return value
+
+    def skip(self, count):
+        """ Moves past the given count of bytes, without reading them.
+        """
+        self.offset = self._end(count)
+
+    def read_string(self):
+        length, = self.read(STRING_LENGTH)
+        if length == NONE_LENGTH:
+            return None
+        return self.read_bytes(length).decode('utf-8')
+
+
+def _column_decoder(buf, score_type, size, names, mask_offset, columns_offset):
+    """ Returns the function decoding the columns of a round, as expected by `LazyScoreColumns`.
+
+    The points of the scores are evaluated from the decoded items.
+    """
+    def read_array(file_typecode, offset):
+        typecode, item_size = COLUMN_ARRAYS[file_typecode]
+        a = array(typecode)
+        a.fromstring(buf[offset:offset + size * item_size])
+        if sys.byteorder == 'big':
+            a.byteswap()
+        return a, offset + size * item_size
+
+    def decode():
+        mask = bytearray(buf[mask_offset:mask_offset + size])
+        offset = columns_offset
+        columns = {}
+        for name, code in names:
+            column, offset = read_array(code, offset)
+            # int32 columns are widened to the type used by ScoreColumns (boolean ones already use it)
+            columns[name] = column if code == COLUMN_BOOL else array(ScoreColumns.INT_CODE, column)
+        types = [score_type if flag else None for flag in mask]
+
+        points = [0] * size
+        for team_num, flag in enumerate(mask):
+            if flag:
+                points[team_num] = score_type(**dict(
+                    (name, bool(columns[name][team_num]) if code == COLUMN_BOOL else columns[name][team_num])
+                    for name, code in names
+                )).evaluate()
+        try:
+            points = array(ScoreColumns.INT_CODE, points)
+        except OverflowError:
+            pass
+        return mask, types, columns, points
+
+    return decode
+
+
+def _unpack_round(reader, buf, score_type, version):
+    type_name = reader.read_string()
+    if type_name != score_type.__name__:
+        raise ValueError('unexpected round (%s instead of %s)' % (type_name, score_type.__name__))
+    size, column_count = reader.read(ROUND)
+
+    names = []
+    for _ in range(column_count):
+        name = reader.read_string()
+        code = reader.read_bytes(1)
+        if name not in score_type.items or code not in COLUMN_ARRAYS:
+            raise ValueError('unexpected column (%s.%s)' % (type_name, name))
+        names.append((name, code))
+
+    mask_offset = reader.offset
+    reader.skip(size)
+    if version == 1:
+        # points column, evaluated again when decoding
+        reader.skip(size * 4)
+    columns_offset = reader.offset
+    reader.skip(sum(size * COLUMN_ARRAYS[code][1] for _, code in names))
+    if column_count < len(score_type.items) and buf[mask_offset:mask_offset + size].count(b'\x01'):
+        raise ValueError('missing columns for %s scores' % type_name)
+
+    return Round(
+        score_type, LazyScoreColumns(_column_decoder(buf, score_type, size, names, mask_offset, columns_offset))
+    )
+
+
+def unpack(buf, tournament):
+    """ Loads the binary form of a tournament.
+
+    The scores are not decoded yet, and `buf` is kept for decoding them when accessed.
+
+    :param buf: the binary form (see `pack()`), as a string or any object supporting slicing (such as mmap)
+    :param Tournament tournament: the tournament, which content is replaced
+    :raises ValueError: if the content is invalid, or not compatible with the tournament
+    """
+    reader = _Reader(buf)
+    header = reader.read(HEADER)
+    magic, version, start_time = header[:3]
+    planning_times, robotics_round_count, team_count = header[3:7], header[7], header[8]
+    if magic != MAGIC:
+        raise ValueError('not a binary data file')
+    if version > FORMAT_VERSION:
+        raise ValueError('unsupported data file version (%d)' % version)
+
+    score_types = [round_.score_type for round_ in tournament.get_robotics_rounds()]
+    if robotics_round_count != len(score_types):
+        raise ValueError('robotics round count mismatch (%d instead of %d)' % (robotics_round_count, len(score_types)))
+
+    teams = []
+    for _ in xrange(team_count):
+        record = reader.read(TEAM)
+        num, grade_code, present, has_planning = record[:4]
+        name, school, city, department, grade_label, grade_orig = [reader.read_string() for _ in range(6)]
+        planning = None
+        if has_planning:
+            planning = TeamPlanning([
+                (_time(minutes), None if assignment == -1 else assignment)
+                for minutes, assignment in zip(record[4::2], record[5::2])
+            ])
+        grade = Grade({'code': grade_code, 'label': grade_label, 'orig': grade_orig})
+        teams.append(Team(num, name, school, grade, city, department, bool(present), planning=planning))
+
+    rounds = [
+        _unpack_round(reader, buf, score_type, version)
+        for score_type in score_types + [ResearchEvaluationScore, JuryEvaluationScore]
+    ]
+
+    tournament.restore(
+        teams, [_time(minutes) for minutes in planning_times], _time(start_time), rounds[:-2], rounds[-2], rounds[-1]
+    )
+
+
+def load(path, tournament):
+    """ Loads a tournament data file, whatever its format.
+
+    Binary files are mapped in memory, while JSON ones are read and deserialized.
+
+    :param str path: the path of the file
+    :param Tournament tournament: the tournament, which content is replaced
+    :returns bool: True if the file is in the binary format
+    """
+    with open(path, 'rb') as fp:
+        if not is_binary(fp.read(len(MAGIC))):
+            fp.seek(0)
+            tournament.deserialize(json.load(fp))
+            return False
+
+        size = os.fstat(fp.fileno()).st_size
+        # the mapping stays valid once the file is closed, and is released with the last lazy round using it
+        buf = mmap.mmap(fp.fileno(), size, access=mmap.ACCESS_READ)
+    unpack(buf, tournament)
+    return True
+
+
+def dump_json(tournament):
+    """ Returns the JSON form of a tournament, as written in the data file.
+    """
+    return json.dumps(tournament.serialize(), indent=4)
+
+
+def dump(tournament):
+    """ Returns the binary form of a tournament if possible, or its JSON form otherwise.
+    """
+    try:
+        return pack(tournament)
+    except ValueError:
+        return dump_json(tournament)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+""" Append-only journal of tournament mutations.
+
+The journal stores the mutation records notified by the tournament (see `Tournament.add_mutation_listener()`)
+as one compact JSON line per record. Each append is flushed and synced to disk before returning, so that
+acknowledged modifications survive a crash or a power cut.
+
+The journal is meant to be used in conjunction with a full snapshot of the tournament : at startup,
+the snapshot is loaded and the journal records are replayed on top of it. Writing a new snapshot then allows
+to reset the journal (compaction).
+
+Since all the mutation operations set absolute values, replaying records already included in the snapshot
+is harmless. This makes the compaction safe even if a crash occurs between the snapshot write and the
+journal reset.
+
+When the snapshot is written in the background, records can be appended while it is being written. The journal
+is then rotated when the snapshot content is captured : the current records are moved to a rotated segment,
+which is discarded once the snapshot is written, while new records go to a fresh journal file. At replay time,
+the rotated segment (if still present) is replayed before the current journal.
+"""
+
+import json
+import logging
+import os
+
+__author__ = 'eric'
+
+
+class Journal(object):
+    """ The journal file.
+    """
+    def __init__(self, path):
+        """
+        :param str path: the path of the journal file
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._path = path
+        self._fp = None
+        self._record_count = 0
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def rotated_path(self):
+        return self._path + '.old'
+
+    @property
+    def record_count(self):
+        """ The count of records appended since the journal has been opened or reset.
+        """
+        return self._record_count
+
+    def _open(self):
+        if self._fp is None:
+            self._fp = open(self._path, 'ab')
+        return self._fp
+
+    def append(self, records):
+        """ Appends a list of mutation records and syncs them to disk.
+
+        The signature of this method allows using it directly as a tournament mutation listener.
+
+        :param list records: the mutation records
+        :returns int: the count of bytes written
+        """
+        if not records:
+            return 0
+
+        fp = self._open()
+        data = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+        fp.write(data)
+        fp.flush()
+        os.fsync(fp.fileno())
+        self._record_count += len(records)
+        return len(data)
+
+    def replay(self, tournament):
+        """ Applies the records stored in the journal files (rotated segment first) to a tournament.
+
+        A truncated last record, which can result from a crash in the middle of a write, is ignored.
+
+        :param Tournament tournament: the tournament to which records are applied
+        :returns int: the count of replayed records
+        """
+        return self._replay_file(self.rotated_path, tournament) + self._replay_file(self._path, tournament)
+
+    def _replay_file(self, path, tournament):
+        count = 0
+        try:
+            fp = open(path, 'rb')
+        except IOError:
+            return count
+
+        with fp:
+            for line_num, line in enumerate(fp, start=1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    self.log.warning(
+                        'invalid record at line %d of %s (truncated write ?) - ignored', line_num, path
+                    )
+                    break
+                tournament.apply_mutation(record)
+                count += 1
+
+        self.log.info('%d record(s) replayed from %s', count, path)
+        return count
+
+    def reset(self):
+        """ Empties the journal, once its content has been included in a snapshot.
+        """
+        self.close()
+        with open(self._path, 'wb') as fp:
+            os.fsync(fp.fileno())
+        self.discard_rotated()
+        self._record_count = 0
+
+    def rotate(self):
+        """ Moves the current records to the rotated segment, and restarts with an empty journal.
+
+        If a rotated segment is still present (because the snapshot supposed to include it has not been
+        written), the current records are added to it.
+        """
+        self.close()
+        if os.path.exists(self.rotated_path):
+            if os.path.exists(self._path):
+                with open(self._path, 'rb') as src, open(self.rotated_path, 'ab') as dst:
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.remove(self._path)
+        elif os.path.exists(self._path):
+            os.rename(self._path, self.rotated_path)
+        self._record_count = 0
+
+    def discard_rotated(self, *args):
+        """ Deletes the rotated segment, once its content has been included in a snapshot.
+
+        Extra arguments are ignored, so that this method can be used directly as a snapshot saved hook.
+        """
+        try:
+            os.remove(self.rotated_path)
+        except OSError:
+            pass
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
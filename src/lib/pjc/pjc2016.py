@@ -3,96 +3,69 @@
 """ Module gathering the specialized implementations for 2016 edition rules
 """
 
-from .tournament import RoboticsScore
+from .rules import RulesBasedScore, ScoringRules, Credit, Malus, Table
 
 __author__ = 'eric'
 
 
-class Round1Score(RoboticsScore):
+class Round1Score(RulesBasedScore):
     """ Concrete score sub-class for round 1.
 
     It counts:
       - the number of blocks successfully collected
       - the time bonus when mission fulfilled
-    """
-    items = RoboticsScore.items + ('collected',)
-    collected = 0
-
-    def __init__(self, total_time=0, collected=0):
-        super(Round1Score, self).__init__(total_time)
-        self.collected = collected
-
-    @classmethod
-    def max_action_credits(cls):
-        """ The max action credits corresponds to the number of blocks which
-        are collected at the end of a successful mission.
-        """
-        return 8
 
-    def evaluate_action_credits(self):
-        return self.collected
+    The max action credits corresponds to the number of blocks which
+    are collected at the end of a successful mission.
+    """
+    rules = ScoringRules(
+        items=('collected',),
+        credits=(Credit('collected'),),
+        max_credits=8
+    )
 
 
-class Round2Score(RoboticsScore):
+class Round2Score(RulesBasedScore):
     """ Concrete score sub-class for round 2.
 
     It counts:
       - the number of blocks successfully installed
-      - the number of empty areas at the end of the match
+      - the number of empty areas at the end of the match (penalized only if more than 4 blocks are installed)
       - the number of areas with same color blocks
       - the time bonus when mission fulfilled
+
+    The max action credits corresponds to :
+      - 8 valid blocks
+      - no empty area
+      - 3 homogeneous ares
     """
-    items = RoboticsScore.items + ('installed', 'empty_areas', 'homogeneous_areas')
-    installed = 0
-    empty_areas = 0
-    homogeneous_areas = 0
-
-    def __init__(self, total_time=0, installed=0, empty_areas=0, homogeneous_areas=0):
-        super(Round2Score, self).__init__(total_time)
-        self.installed = installed
-        self.empty_areas = empty_areas
-        self.homogeneous_areas = homogeneous_areas
-
-    @classmethod
-    def max_action_credits(cls):
-        """ The max action credits corresponds to :
-          - 8 valid blocks
-          - no empty area
-          - 3 homogeneous ares
-        """
-        return 11
-
-    def evaluate_action_credits(self):
-        malus = self.empty_areas if self.installed > 4 else 0
-        return self.installed - malus + self.homogeneous_areas
-
-
-class Round3Score(RoboticsScore):
+    rules = ScoringRules(
+        items=('installed', 'empty_areas', 'homogeneous_areas'),
+        credits=(
+            Credit('installed'),
+            Malus('empty_areas', when='installed > 4'),
+            Credit('homogeneous_areas'),
+        ),
+        max_credits=11
+    )
+
+
+class Round3Score(RulesBasedScore):
     """ Concrete score sub-class for round 3.
 
     It counts:
       - the installed block position WRT the line (fully inside, partly inside, outside)
       - the number of "cable" elements moved outside the line
       - the time bonus when mission fulfilled
-    """
-    items = RoboticsScore.items + ('position', 'moved')
 
+    The max action credits corresponds to the block fully inside the line, and no
+    surrounding block moved outside.
+    """
     OUTSIDE, PARTLY_INSIDE, FULLY_INSIDE = range(3)
-    placement_points = [0, 5, 10]
-
-    position = 0
-
-    def __init__(self, total_time=0, position=FULLY_INSIDE, moved=0):
-        super(Round3Score, self).__init__(total_time)
-        self.position = position
-        self.moved = moved
-
-    @classmethod
-    def max_action_credits(cls):
-        """ The max action credits corresponds to the block fully inside the line, and no
-        surrounding block moved outside.
-        """
-        return cls.placement_points[cls.FULLY_INSIDE]
+    placement_points = (0, 5, 10)
 
-    def evaluate_action_credits(self):
-        return self.placement_points[self.position] - self.moved
+    rules = ScoringRules(
+        items=(('position', FULLY_INSIDE), 'moved'),
+        credits=(Table('position', placement_points), Malus('moved')),
+        max_credits=placement_points[FULLY_INSIDE]
+    )
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+""" Array based ranking computation, for processing large score sets (what-if analysis, rules tuning,...).
+
+This module provides NumPy implementations of the ranking computations made by the tournament, producing
+identical results. It is not used by the tournament itself, which sticks to the pure Python implementation,
+so that NumPy is not required for running the server.
+
+Scores are represented by a `ScoreArrays` instance, gathering the round points of all the teams as arrays
+(see its documentation for details). It can be extracted from a tournament with `ScoreArrays.from_tournament()`,
+and then modified or generated for simulation purposes. The final ranking is then obtained with `final_ranking()`.
+
+If NumPy is not available, `HAS_NUMPY` is False, and the functions of this module fall back to their pure
+Python equivalent when there is one.
+"""
+
+from pjc.tournament import Tournament, get_ranking_points as py_get_ranking_points
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__author__ = 'eric'
+
+HAS_NUMPY = np is not None
+
+
+def rank_points(points, team_count):
+    """ Returns the ranking points corresponding to a set of score points.
+
+    This is the vectorized version of `pjc.tournament.get_ranking_points()`, which documents the computation rules :
+    teams sharing the same score points get the ranking points of the first of them.
+
+    :param points: the score points of the ranked teams, as a 1D array
+    :param int team_count: the count of teams for ranking points computation
+    :returns: the ranking points of the teams, as an array having the same order as the score points one
+    """
+    points = np.asarray(points)
+    count = len(points)
+    result = np.empty(count, dtype=np.int64)
+    if not count:
+        return result
+
+    # stable sort, so that ex-aequos keep their relative order
+    order = np.argsort(-points, kind='mergesort')
+    sorted_points = points[order]
+
+    # position of the first team of the ex-aequo group of each team
+    group_start = np.ones(count, dtype=bool)
+    group_start[1:] = sorted_points[1:] != sorted_points[:-1]
+    first_pos = np.maximum.accumulate(np.where(group_start, np.arange(count), 0))
+
+    result[order] = team_count - first_pos
+    return result
+
+
+def get_ranking_points(score_points, team_count):
+    """ Drop-in replacement of `pjc.tournament.get_ranking_points()`, returning the same result.
+
+    :param list score_points: a list of pairs, which first item is the team number and the second one the points
+    scored for the related round
+    :param int team_count: the count of teams for ranking points computation
+    :returns list: a list of pairs containing the team number and the ranking points, the best competitor being in
+    first position
+    """
+    if not HAS_NUMPY:
+        return py_get_ranking_points(score_points, team_count)
+
+    if not score_points:
+        return []
+    team_nums, points = zip(*score_points)
+    points = np.asarray(points)
+    order = np.argsort(-points, kind='mergesort')
+    ranks = rank_points(points, team_count)
+    return [(team_nums[i], int(ranks[i])) for i in order]
+
+
+class ScoreArrays(object):
+    """ The score points of a set of teams, as arrays.
+
+    All the per-team arrays are aligned with the `team_nums` one. Rounds not played by a team are identified by
+    the `*_played` boolean arrays, the corresponding points being ignored.
+
+    Attributes :
+        - team_nums : the team numbers (N)
+        - present : the presence status of the teams (N)
+        - team_count : the count of teams used for ranking points computation (ie the present teams count)
+        - robotics_points, robotics_played : the robotics round points (R x N)
+        - research_points, research_played : the research evaluation points (N)
+        - jury_points, jury_played : the jury evaluation points (N)
+        - bonus_points, bonus_played : the grade bonus points (N)
+    """
+    def __init__(self, team_nums, robotics_rounds=3):
+        """ Creates a score set for the given teams, all of them being present and having no score.
+
+        :param team_nums: the team numbers
+        :param int robotics_rounds: the count of robotics rounds
+        """
+        self.team_nums = np.asarray(team_nums, dtype=np.int64)
+        count = len(self.team_nums)
+        self.present = np.ones(count, dtype=bool)
+        self.team_count = count
+        self.robotics_points = np.zeros((robotics_rounds, count), dtype=np.int64)
+        self.robotics_played = np.zeros((robotics_rounds, count), dtype=bool)
+        for part in ('research', 'jury', 'bonus'):
+            setattr(self, part + '_points', np.zeros(count, dtype=np.int64))
+            setattr(self, part + '_played', np.zeros(count, dtype=bool))
+
+    @classmethod
+    def from_tournament(cls, tournament):
+        """ Extracts the score points of a tournament.
+
+        :param Tournament tournament: the tournament
+        :rtype: ScoreArrays
+        """
+        teams = tournament.teams(present_only=False)
+        rounds = tournament.get_robotics_rounds()
+        arrays = cls([team.num for team in teams], len(rounds))
+        arrays.present[:] = [team.present for team in teams]
+        arrays.team_count = tournament.team_count(present_only=True)
+
+        def extract(round_, points, played):
+            round_points = round_.points
+            for i, team_num in enumerate(arrays.team_nums):
+                if team_num in round_points:
+                    points[i] = round_points[team_num]
+                    played[i] = True
+
+        for round_num, round_ in enumerate(rounds):
+            extract(round_, arrays.robotics_points[round_num], arrays.robotics_played[round_num])
+        extract(tournament.research_evaluations, arrays.research_points, arrays.research_played)
+        extract(tournament.jury_evaluations, arrays.jury_points, arrays.jury_played)
+        extract(tournament.bonus, arrays.bonus_points, arrays.bonus_played)
+        return arrays
+
+    @property
+    def competing(self):
+        """ The mask of the competing teams, ie which have played at least one robotics round and have presented
+        their research work (see `Tournament.get_competing_teams()`).
+        """
+        return self.robotics_played.any(axis=0) & self.research_played
+
+
+def _round_rank_points(points, played, team_count):
+    result = np.zeros(len(points), dtype=np.int64)
+    idx = np.flatnonzero(played)
+    result[idx] = rank_points(points[idx], team_count)
+    return result
+
+
+def final_ranking(arrays, weights=None):
+    """ Computes the final ranking, in the same form as `Tournament.get_final_ranking()`.
+
+    :param ScoreArrays arrays: the score points
+    :param tuple weights: the weights of the robotics, research, jury and bonus parts. Defaults to the ones
+    defined by the `Tournament` class.
+    :returns: a list of tuples, containing each the rank and corresponding list of team numbers
+    """
+    if weights is None:
+        weights = (Tournament.WEIGHT_ROBOTICS, Tournament.WEIGHT_RESEARCH, Tournament.WEIGHT_JURY,
+                   Tournament.WEIGHT_BONUS)
+    w_robotics, w_research, w_jury, w_bonus = weights
+    team_count = arrays.team_count
+
+    # robotics ranking is based on the sum of the rounds ranking points, and is retained for present teams only
+    robotics_total = sum(
+        (
+            _round_rank_points(points, played, team_count)
+            for points, played in zip(arrays.robotics_points, arrays.robotics_played)
+        ),
+        np.zeros(len(arrays.team_nums), dtype=np.int64)
+    )
+    robotics = _round_rank_points(robotics_total, arrays.robotics_played.any(axis=0), team_count)
+    robotics[~arrays.present] = 0
+
+    # as done by `Round.get_results()`, the other parts results are retained for teams numbered up to the teams count
+    in_results = arrays.team_nums <= team_count
+    research, jury, bonus = (
+        np.where(in_results, _round_rank_points(points, played, team_count), 0)
+        for points, played in (
+            (arrays.research_points, arrays.research_played),
+            (arrays.jury_points, arrays.jury_played),
+            (arrays.bonus_points, arrays.bonus_played),
+        )
+    )
+
+    total = robotics * w_robotics + research * w_research + jury * w_jury + bonus * w_bonus
+
+    competing = np.flatnonzero(arrays.competing)
+    total = total[competing]
+    order = np.argsort(-total, kind='mergesort')
+
+    result = []
+    last_pts = None
+    rank_list = None
+    for rank, i in enumerate(order, start=1):
+        team_num = int(arrays.team_nums[competing[i]])
+        if total[i] == last_pts:
+            rank_list.append(team_num)
+        else:
+            rank_list = [team_num]
+            result.append((rank, rank_list))
+            last_pts = total[i]
+    return result
+
+
+def compute_final_ranking(tournament):
+    """ Returns the final ranking of a tournament, using the array based computation if available.
+
+    :param Tournament tournament: the tournament
+    :returns: the same result as `Tournament.get_final_ranking()`
+    """
+    if not HAS_NUMPY:
+        return tournament.get_final_ranking()
+    return final_ranking(ScoreArrays.from_tournament(tournament))
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+""" Declarative specification of the robotics rounds scoring rules.
+
+Instead of implementing `evaluate_action_credits()` and `max_action_credits()` by hand, the score classes of an
+edition can derive from `RulesBasedScore` and state their rules with a `rules` class attribute :
+
+    class Round2Score(RulesBasedScore):
+        rules = ScoringRules(
+            items=('installed', 'empty_areas', 'homogeneous_areas'),
+            credits=(
+                Credit('installed'),
+                Malus('empty_areas', when='installed > 4'),
+                Credit('homogeneous_areas'),
+            ),
+            max_credits=11
+        )
+
+When the class is created (ie when the edition module is imported), the rules are compiled into flat methods
+specialized for the score type : the constructor, `evaluate_action_credits()`, `max_action_credits()` and
+`evaluate()`, the later including the time bonus rule of `RoboticsScore.evaluate()`. Evaluating a score thus
+costs a single function call, without going through the class hierarchy.
+
+If the rules are defined with `memoize=True`, the evaluated points are memorized per score items values, and shared
+by all the instances of the score type. This is correct since scores are not modified once created.
+"""
+
+from .tournament import RoboticsScore, MATCH_DURATION
+
+__author__ = 'eric'
+
+
+class Credit(object):
+    """ Credits given by a score item, multiplied by a weight.
+
+    The credits can be conditional, the condition being a Python expression using the score items names
+    (ex: "installed > 4"). No credit is given if the condition is not met.
+    """
+    def __init__(self, item, weight=1, when=None):
+        self.item = item
+        self.weight = weight
+        self.when = when
+
+    def expression(self):
+        weight = abs(self.weight)
+        expr = self.item if weight == 1 else '%r * %s' % (weight, self.item)
+        if self.when:
+            expr = '(%s if %s else 0)' % (expr, self.when)
+        return '-' + expr if self.weight < 0 else expr
+
+
+class Malus(Credit):
+    """ Credits removed by a score item (penalties for instance), multiplied by a weight.
+    """
+    def __init__(self, item, weight=1, when=None):
+        super(Malus, self).__init__(item, -weight, when)
+
+
+class Table(object):
+    """ Credits given by a score item used as an index in a table of values.
+    """
+    def __init__(self, item, values):
+        self.item = item
+        self.values = tuple(values)
+
+    def expression(self):
+        return '%r[%s]' % (self.values, self.item)
+
+
+class ScoringRules(object):
+    """ The scoring rules of a robotics round.
+
+    The match total time is implicitly the first item of all the rounds, and thus must not be part of the
+    given items.
+    """
+    # maximum count of memorized evaluations per score type
+    MEMO_SIZE = 10000
+
+    # names used by the compiled methods, and which thus cannot be used for the items
+    RESERVED_NAMES = frozenset(('self', 'key', 'points', '_memo'))
+
+    def __init__(self, items, credits, max_credits, memoize=False):
+        """
+        :param tuple items: the round specific score items, as names or (name, default value) pairs. The
+        default value is 0 if not provided.
+        :param tuple credits: the terms of the action credits (see `Credit`, `Malus` and `Table`)
+        :param int max_credits: the action credits corresponding to a fulfilled mission
+        :param bool memoize: if True, the evaluated points are memorized per score items values
+        :raises ValueError: if the terms reference unknown items
+        """
+        self.items = (('total_time', 0),) + tuple(
+            item if isinstance(item, tuple) else (item, 0) for item in items
+        )
+        self.credits = tuple(credits)
+        self.max_credits = max_credits
+        self.memoize = memoize
+
+        names = set(self.names)
+        reserved = names & self.RESERVED_NAMES
+        if reserved:
+            raise ValueError('reserved item name(s) : %s' % ', '.join(sorted(reserved)))
+        for term in self.credits:
+            used = set(compile(term.expression(), '<rules>', 'eval').co_names)
+            if not used <= names:
+                raise ValueError('unknown score item(s) : %s' % ', '.join(sorted(used - names)))
+
+    @property
+    def names(self):
+        return tuple(name for name, _ in self.items)
+
+    def credits_expression(self):
+        expr = ''
+        for term in self.credits:
+            term_expr = term.expression()
+            if not expr:
+                expr = term_expr
+            elif term_expr.startswith('-'):
+                expr += ' - ' + term_expr[1:]
+            else:
+                expr += ' + ' + term_expr
+        return expr or '0'
+
+    def compile(self, class_name):
+        """ Returns the methods implementing the rules, as a dictionary keyed by the method names.
+        """
+        names = self.names
+        load = '    %s = %s\n' % (', '.join(names), ', '.join('self.' + name for name in names))
+        credits = self.credits_expression()
+        source = (
+            'def __init__(self, %(args)s):\n'
+            '    %(attrs)s = %(names)s\n'
+            '\n'
+            'def evaluate_action_credits(self):\n'
+            '%(load)s'
+            '    return %(credits)s\n'
+            '\n'
+            'def evaluate(self):\n'
+            '%(load)s'
+            '%(memo_get)s'
+            '    points = %(credits)s\n'
+            '    if points >= %(max_credits)r and total_time < %(duration)r:\n'
+            '        points += %(duration)r - total_time\n'
+            '%(memo_set)s'
+            '    return points\n'
+        ) % {
+            'args': ', '.join('%s=%r' % item for item in self.items),
+            'attrs': ', '.join('self.' + name for name in names),
+            'names': ', '.join(names),
+            'load': load,
+            'credits': credits,
+            'max_credits': self.max_credits,
+            'duration': MATCH_DURATION,
+            'memo_get': (
+                '    key = (%s,)\n'
+                '    if key in _memo:\n'
+                '        return _memo[key]\n' % ', '.join(names)
+            ) if self.memoize else '',
+            'memo_set': (
+                '    if len(_memo) >= %d:\n'
+                '        _memo.clear()\n'
+                '    _memo[key] = points\n' % self.MEMO_SIZE
+            ) if self.memoize else '',
+        }
+
+        namespace = {'_memo': {}}
+        exec compile(source, '<%s rules>' % class_name, 'exec') in namespace
+
+        max_credits = self.max_credits
+        return {
+            '__init__': namespace['__init__'],
+            'evaluate_action_credits': namespace['evaluate_action_credits'],
+            'evaluate': namespace['evaluate'],
+            'max_action_credits': classmethod(lambda cls: max_credits),
+        }
+
+
+class RulesCompiler(type):
+    """ Metaclass compiling the scoring rules of the score classes defining them.
+    """
+    def __new__(mcs, name, bases, attrs):
+        rules = attrs.get('rules')
+        if rules is not None:
+            attrs['items'] = rules.names
+            attrs.update(rules.items)
+            attrs.update(rules.compile(name))
+        return super(RulesCompiler, mcs).__new__(mcs, name, bases, attrs)
+
+
+class RulesBasedScore(RoboticsScore):
+    """ Root class of the robotics round scores which rules are defined by a `ScoringRules` instance.
+    """
+    __metaclass__ = RulesCompiler
+
+    # the scoring rules of the round, defined by concrete classes
+    rules = None
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+from tornado.ioloop import IOLoop
+
+from pjc.tournament import Tournament, Team, TeamPlanning, Grade, JuryEvaluationScore
+from pjc.current_edition import Round1Score, Round2Score, Round3Score
+from pjc.web.changes import ChangeFeed
+
+__author__ = 'eric'
+
+ROBOTICS_ROUND_TYPES = (Round1Score, Round2Score, Round3Score)
+
+
+class TestChangeFeed(TestCase):
+    def setUp(self):
+        self._tournament = Tournament(ROBOTICS_ROUND_TYPES)
+        for num in range(1, 4):
+            self._tournament.add_team(Team(
+                num, 'Team %d' % num, 'École %d' % num, Grade.SECONDE, 'Nice', '06', True,
+                planning=TeamPlanning([('14:00', 1), ('14:30', 2), ('15:00', 1), ('15:30', 2)])
+            ))
+        self._tournament.set_robotics_score(1, 1, Round1Score(100, 8))
+        self._feed = ChangeFeed(self._tournament, max_size=3)
+
+    def test_score_events(self):
+        self._tournament.set_robotics_score(1, 1, Round1Score(90, 8))
+        self._tournament.set_jury_evaluation(2, JuryEvaluationScore(12))
+        self._tournament.clear_robotics_score(1, 1)
+
+        events, lost = self._feed.get_events(0)
+        self.assertFalse(lost)
+        self.assertEqual([event['seq'] for event in events], [1, 2, 3])
+        self.assertEqual(events[0]['round'], 1)
+        self.assertEqual(events[0]['old'], Round1Score(100, 8).serialize())
+        self.assertEqual(events[0]['new'], Round1Score(90, 8).serialize())
+        self.assertEqual(events[1]['round'], 'jury')
+        self.assertIsNone(events[1]['old'])
+        self.assertEqual(events[1]['rank_points'], 3)
+        self.assertEqual(events[2]['op'], 'clear_robotics_score')
+        self.assertEqual(events[2]['old'], Round1Score(90, 8).serialize())
+        self.assertIsNone(events[2]['new'])
+        self.assertEqual(events[2]['rank_points'], 0)
+
+        self.assertEqual(self._feed.get_events(2), ([events[2]], False))
+
+    def test_unchanged_scores(self):
+        # records which do not change the scores, such as the ones replayed by a replica
+        self._feed._on_mutation([
+            {'op': 'set_robotics_score', 'team': 1, 'round': 1, 'score': Round1Score(100, 8).serialize()},
+            {'op': 'clear_jury_evaluation', 'team': 2},
+        ])
+        self.assertEqual(self._feed.seq, 0)
+        self.assertEqual(self._feed.get_events(0), ([], False))
+
+    def test_lost_events(self):
+        for points in range(1, 6):
+            self._tournament.set_jury_evaluation(1, JuryEvaluationScore(points))
+        self.assertEqual(self._feed.seq, 5)
+
+        events, lost = self._feed.get_events(1)
+        self.assertTrue(lost)
+        self.assertEqual([event['seq'] for event in events], [3, 4, 5])
+        self.assertFalse(self._feed.get_events(2)[1])
+        self.assertTrue(self._feed.get_events(6)[1])
+
+        self._feed.reset(10)
+        self.assertEqual(self._feed.get_events(10), ([], False))
+        self.assertTrue(self._feed.get_events(5)[1])
+
+    def test_wait_events(self):
+        io_loop = IOLoop()
+        self.addCleanup(io_loop.close)
+
+        events, lost = io_loop.run_sync(lambda: self._feed.wait_events(0, 0.05))
+        self.assertEqual((events, lost), ([], False))
+
+        io_loop.add_callback(self._tournament.set_jury_evaluation, 3, JuryEvaluationScore(5))
+        events, lost = io_loop.run_sync(lambda: self._feed.wait_events(0, 5))
+        self.assertEqual([event['team'] for event in events], [3])
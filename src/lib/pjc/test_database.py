@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+import datetime
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from pjc.database import TournamentDatabase
+from pjc.tournament import Tournament, Team, TeamPlanning, Grade, ResearchEvaluationScore, JuryEvaluationScore
+from pjc.current_edition import Round1Score, Round2Score, Round3Score
+
+__author__ = 'eric'
+
+ROBOTICS_ROUND_TYPES = (Round1Score, Round2Score, Round3Score)
+
+
+class TestTournamentDatabase(TestCase):
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'tournament.db')
+        self._database = TournamentDatabase(self._path, ROBOTICS_ROUND_TYPES)
+
+        self._tournament = Tournament(ROBOTICS_ROUND_TYPES)
+        for num in range(1, 4):
+            self._tournament.add_team(Team(
+                num, 'Team %d' % num, 'École %d' % num, Grade.SECONDE, 'Nice', '06', True,
+                planning=TeamPlanning([('14:00', 1), ('14:30', 2), ('15:00', 1), ('15:30', 2)])
+            ))
+        self._tournament.set_robotics_score(1, 1, Round1Score(100, 8))
+        self._tournament.set_research_evaluation(2, ResearchEvaluationScore(True, 15, 17, 12, 18))
+
+    def tearDown(self):
+        self._database.close()
+        shutil.rmtree(self._dir)
+
+    def _reloaded(self):
+        tournament = Tournament(ROBOTICS_ROUND_TYPES)
+        TournamentDatabase(self._path, ROBOTICS_ROUND_TYPES).load(tournament)
+        return tournament
+
+    def test_save_load(self):
+        self.assertTrue(self._database.is_empty())
+        self._database.save(self._tournament)
+        self.assertFalse(self._database.is_empty())
+
+        tournament = self._reloaded()
+        self.assertEqual(tournament.team_nums(), [1, 2, 3])
+        self.assertEqual(tournament.get_team(2).school, u'École 2')
+        self.assertEqual(tournament.get_team(3).planning.serialize(), self._tournament.get_team(3).planning.serialize())
+        self.assertEqual(tournament.get_robotics_round(1).serialize(), {1: Round1Score(100, 8).serialize()})
+        self.assertEqual(tournament.research_evaluations.serialize(), self._tournament.research_evaluations.serialize())
+
+    def test_mutations(self):
+        self._database.save(self._tournament)
+        self._tournament.add_mutation_listener(self._database.apply)
+
+        with self._tournament.transaction():
+            self._tournament.clear_robotics_score(1, 1)
+            self._tournament.set_robotics_score(2, 3, Round3Score(90, Round3Score.FULLY_INSIDE, 0))
+            self._tournament.set_jury_evaluation(3, JuryEvaluationScore(14))
+            self._tournament.set_team_presence(1, False)
+            self._tournament.planning = [datetime.time(14), datetime.time(15), datetime.time(16), datetime.time(17)]
+
+        # compared once JSON encoded, since strings are read back as unicode and planning entries as lists
+        tournament = self._reloaded()
+        self.assertEqual(
+            json.loads(json.dumps(tournament.serialize())), json.loads(json.dumps(self._tournament.serialize()))
+        )
+
+        # points are stored for external queries
+        cnx = sqlite3.connect(self._path)
+        rows = cnx.execute('SELECT round, team_num, points FROM scores WHERE team_num > 1 ORDER BY round').fetchall()
+        self.assertEqual(rows, [
+            ('jury', 3, JuryEvaluationScore(14).evaluate()),
+            ('research', 2, ResearchEvaluationScore(True, 15, 17, 12, 18).evaluate()),
+            ('rob3', 2, Round3Score(90, Round3Score.FULLY_INSIDE, 0).evaluate()),
+        ])
+        self.assertEqual(cnx.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        cnx.close()
+
+    def test_unknown_mutation(self):
+        self.assertRaises(ValueError, self._database.apply, [{'op': 'dance'}])
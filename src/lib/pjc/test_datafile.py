@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+import json
+import os
+import shutil
+import struct
+import tempfile
+
+from pjc import datafile
+from pjc.tournament import Tournament, Team, TeamPlanning, Grade, ResearchEvaluationScore, JuryEvaluationScore
+from pjc.current_edition import Round1Score, Round2Score, Round3Score
+
+__author__ = 'eric'
+
+ROBOTICS_ROUND_TYPES = (Round1Score, Round2Score, Round3Score)
+
+
+class TestDataFile(TestCase):
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'tournament.dat')
+
+        self._tournament = Tournament(ROBOTICS_ROUND_TYPES)
+        for num in range(1, 4):
+            self._tournament.add_team(Team(
+                num, 'Team %d' % num, 'École %d' % num, Grade('2nde'), 'Nice', '06', num != 2,
+                planning=TeamPlanning([('14:00', 1), ('14:30', 2), ('15:00', None), ('15:30', 2)])
+            ))
+        self._tournament.set_robotics_score(1, 1, Round1Score(100, 8))
+        self._tournament.set_robotics_score(3, 2, Round2Score(120, 5, 1, 2))
+        self._tournament.set_research_evaluation(2, ResearchEvaluationScore(True, 15, 17, 12, 18))
+        self._tournament.set_jury_evaluation(3, JuryEvaluationScore(14))
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _loaded(self, content):
+        with open(self._path, 'wb') as fp:
+            fp.write(content)
+        tournament = Tournament(ROBOTICS_ROUND_TYPES)
+        binary = datafile.load(self._path, tournament)
+        return tournament, binary
+
+    @staticmethod
+    def _normalized(tournament):
+        # compared once JSON encoded, since strings are read back as unicode and planning entries as lists
+        return json.loads(json.dumps(tournament.serialize()))
+
+    def test_round_trip(self):
+        tournament, binary = self._loaded(datafile.pack(self._tournament))
+        self.assertTrue(binary)
+        self.assertEqual(self._normalized(tournament), self._normalized(self._tournament))
+        self.assertEqual(tournament.get_team(1).grade.orig, u'2nde')
+        self.assertEqual(tournament.get_team(2).planning[2].table, None)
+        self.assertEqual(tournament.get_teams_bonus(), self._tournament.get_teams_bonus())
+        self.assertEqual(tournament.get_compiled_scores(), self._tournament.get_compiled_scores())
+
+        # the loaded tournament can be modified and saved again
+        tournament.set_robotics_score(2, 1, Round1Score(90, 3))
+        again, _ = self._loaded(datafile.pack(tournament))
+        self.assertEqual(again.get_robotics_round(1).points, {
+            1: Round1Score(100, 8).evaluate(), 2: Round1Score(90, 3).evaluate()
+        })
+
+    def test_lazy_decoding(self):
+        tournament, _ = self._loaded(datafile.pack(self._tournament))
+        scores = tournament.get_robotics_round(2).scores
+        self.assertIn('_decode', scores.__dict__)
+
+        # snapshots do not decode the scores either
+        snapshot = tournament.snapshot()
+        self.assertIn('_decode', scores.__dict__)
+
+        self.assertEqual(scores.keys(), [3])
+        self.assertNotIn('_decode', scores.__dict__)
+        self.assertEqual(scores[3].serialize(), Round2Score(120, 5, 1, 2).serialize())
+        self.assertEqual(snapshot.get_robotics_round(2).scores[3].serialize(), Round2Score(120, 5, 1, 2).serialize())
+
+    def test_changed_rules(self):
+        content = datafile.pack(self._tournament)
+
+        # the points of the loaded scores follow the scoring rules in force, not the ones used when saving
+        self.addCleanup(setattr, Round1Score, 'evaluate', Round1Score.__dict__['evaluate'])
+        Round1Score.evaluate = lambda score: score.collected * 100
+        tournament, _ = self._loaded(content)
+        self.assertEqual(tournament.get_robotics_round(1).points, {1: 800})
+        self.assertEqual(tournament.research_evaluations.points, {2: 15 + 17 + 12 + 18})
+
+    def test_json_fallback(self):
+        # JSON files written by former versions are still loaded
+        tournament, binary = self._loaded(datafile.dump_json(self._tournament))
+        self.assertFalse(binary)
+        self.assertEqual(self._normalized(tournament), self._normalized(self._tournament))
+
+        # tournaments which cannot be stored in the binary format are saved in JSON
+        self._tournament.set_jury_evaluation(1, JuryEvaluationScore(2 ** 40))
+        self.assertRaises(ValueError, datafile.pack, self._tournament)
+        tournament, binary = self._loaded(datafile.dump(self._tournament))
+        self.assertFalse(binary)
+        self.assertEqual(tournament.jury_evaluations.points[1], 2 ** 40)
+
+    def test_invalid_content(self):
+        content = datafile.pack(self._tournament)
+
+        newer = content[:4] + struct.pack('<H', datafile.FORMAT_VERSION + 1) + content[6:]
+        self.assertRaises(ValueError, self._loaded, newer)
+        self.assertRaises(ValueError, self._loaded, content[:len(content) // 2])
+
+        other_edition = Tournament(ROBOTICS_ROUND_TYPES[:2])
+        self.assertRaises(ValueError, datafile.unpack, content, other_edition)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+import os
+import tempfile
+import shutil
+
+from pjc.journal import Journal
+from pjc.tournament import Tournament, ResearchEvaluationScore, JuryEvaluationScore
+
+__author__ = 'eric'
+
+
+class RecordingTournament(object):
+    """ Tournament stand-in recording the applied mutations.
+    """
+    def __init__(self):
+        self.records = []
+
+    def apply_mutation(self, record):
+        self.records.append(record)
+
+
+class TestJournal(TestCase):
+    RECORDS = [
+        {'op': 'set_research_evaluation', 'team': 1,
+         'score': ResearchEvaluationScore(True, 15, 17, 12, 18).serialize()},
+        {'op': 'set_jury_evaluation', 'team': 2, 'score': JuryEvaluationScore(15).serialize()},
+        {'op': 'clear_research_evaluation', 'team': 1},
+    ]
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._journal = Journal(os.path.join(self._dir, 'test.journal'))
+
+    def tearDown(self):
+        self._journal.close()
+        shutil.rmtree(self._dir)
+
+    def test_append_replay(self):
+        self._journal.append(self.RECORDS[:2])
+        self._journal.append(self.RECORDS[2:])
+        self.assertEqual(self._journal.record_count, len(self.RECORDS))
+
+        tournament = RecordingTournament()
+        self.assertEqual(Journal(self._journal.path).replay(tournament), len(self.RECORDS))
+        self.assertEqual(tournament.records, self.RECORDS)
+
+    def test_truncated_record(self):
+        self._journal.append(self.RECORDS)
+        with open(self._journal.path, 'ab') as fp:
+            fp.write('{"op": "clear_jury_eval')
+
+        tournament = RecordingTournament()
+        self.assertEqual(Journal(self._journal.path).replay(tournament), len(self.RECORDS))
+
+    def test_reset(self):
+        self._journal.append(self.RECORDS)
+        self._journal.reset()
+        self.assertEqual(self._journal.record_count, 0)
+        self.assertEqual(os.path.getsize(self._journal.path), 0)
+
+        self._journal.append(self.RECORDS[:1])
+        tournament = RecordingTournament()
+        self.assertEqual(Journal(self._journal.path).replay(tournament), 1)
+
+    def test_rotation(self):
+        self._journal.append(self.RECORDS[:1])
+        self._journal.rotate()
+        self.assertEqual(self._journal.record_count, 0)
+        self._journal.append(self.RECORDS[1:2])
+        self._journal.rotate()
+        self._journal.append(self.RECORDS[2:])
+
+        # rotated segments are replayed first
+        tournament = RecordingTournament()
+        self.assertEqual(Journal(self._journal.path).replay(tournament), len(self.RECORDS))
+        self.assertEqual(tournament.records, self.RECORDS)
+
+        self._journal.discard_rotated()
+        tournament = RecordingTournament()
+        self.assertEqual(Journal(self._journal.path).replay(tournament), 1)
+        self.assertEqual(tournament.records, self.RECORDS[2:])
+
+    def test_missing_file(self):
+        self.assertEqual(self._journal.replay(RecordingTournament()), 0)
+
+    def test_tournament_listener(self):
+        tournament = Tournament()
+        tournament.add_mutation_listener(self._journal.append)
+        tournament.set_jury_evaluation(3, JuryEvaluationScore(12))
+
+        replayed = Tournament()
+        Journal(self._journal.path).replay(replayed)
+        self.assertEqual(replayed.get_jury_evaluation(3).serialize(), {'evaluation': 12})
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+
+from pjc.web.lib import LRUCache
+
+__author__ = 'eric'
+
+
+class TestLRUCache(TestCase):
+    def setUp(self):
+        self._cache = LRUCache(max_size=2)
+        self._computed = []
+
+    def _get(self, key):
+        def compute():
+            self._computed.append(key)
+            return key.upper()
+        return self._cache.get(key, compute)
+
+    def test_hits_and_misses(self):
+        self.assertEqual(self._get('a'), 'A')
+        self.assertEqual(self._get('a'), 'A')
+        self.assertEqual(self._get('b'), 'B')
+        self.assertEqual(self._computed, ['a', 'b'])
+        self.assertEqual(self._cache.stats, {'size': 2, 'max_size': 2, 'hits': 1, 'misses': 2})
+
+        self._cache.clear()
+        self.assertEqual(len(self._cache), 0)
+        self._get('a')
+        self.assertEqual(self._computed, ['a', 'b', 'a'])
+        self.assertEqual((self._cache.hits, self._cache.misses), (1, 3))
+
+    def test_eviction_order(self):
+        self._get('a')
+        self._get('b')
+        # using "a" makes "b" the least recently used entry
+        self._get('a')
+        self._get('c')
+        self.assertEqual(len(self._cache), 2)
+
+        del self._computed[:]
+        self._get('a')
+        self._get('c')
+        self.assertEqual(self._computed, [])
+        self._get('b')
+        self.assertEqual(self._computed, ['b'])
+
+        # "a" was then the least recently used entry
+        self._get('c')
+        self._get('a')
+        self.assertEqual(self._computed, ['b', 'a'])
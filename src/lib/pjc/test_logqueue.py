@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+import logging
+import threading
+import time
+
+from pjc.web.logqueue import AsyncLogHandler
+
+__author__ = 'eric'
+
+
+class CapturingHandler(logging.Handler):
+    """ Target handler keeping the messages of the written records.
+
+    The writing of the records can be suspended, for keeping the writer thread busy.
+    """
+    def __init__(self, delay=0):
+        logging.Handler.__init__(self)
+        self.delay = delay
+        self.messages = []
+        self.writing = threading.Event()
+        self.resumed = threading.Event()
+        self.resumed.set()
+
+    def emit(self, record):
+        self.writing.set()
+        self.resumed.wait(5)
+        time.sleep(self.delay)
+        self.messages.append(record.getMessage())
+
+
+def make_record(msg, name='test', level=logging.INFO):
+    return logging.makeLogRecord({'name': name, 'levelno': level, 'levelname': logging.getLevelName(level), 'msg': msg})
+
+
+class TestAsyncLogHandler(TestCase):
+    def _handler(self, target, **kwargs):
+        handler = AsyncLogHandler([target], **kwargs)
+        self.addCleanup(handler.close)
+        return handler
+
+    def test_queue_full(self):
+        target = CapturingHandler()
+        handler = self._handler(target, queue_size=2)
+
+        # the writer thread is blocked while writing the first record, so that the queue fills up
+        target.resumed.clear()
+        handler.handle(make_record('first'))
+        self.assertTrue(target.writing.wait(5))
+        for num in range(2, 6):
+            handler.handle(make_record('record %d' % num))
+        self.assertEqual(handler.dropped, 2)
+
+        target.resumed.set()
+        handler.stop()
+        self.assertEqual(target.messages, [
+            'first', 'record 2', 'record 3', '2 log record(s) dropped (queue full), 0 dropped by rate limiting'
+        ])
+
+        # the dropped records are reported once
+        handler.handle(make_record('last'))
+        handler.stop()
+        self.assertEqual(target.messages[-1], 'last')
+
+    def test_rate_limiting(self):
+        target = CapturingHandler()
+        handler = self._handler(target, rate_limits={'chatty': 2})
+        handler.RATE_PERIOD = 60
+
+        for num in range(5):
+            handler.handle(make_record('info %d' % num, 'chatty'))
+        for num in range(3):
+            handler.handle(make_record('warning %d' % num, 'chatty', logging.WARNING))
+        handler.handle(make_record('other', 'other'))
+        self.assertEqual(handler.rate_limited, 3)
+
+        handler.stop()
+        self.assertEqual(target.messages, [
+            'info 0', 'info 1', 'warning 0', 'warning 1', 'warning 2', 'other',
+            '0 log record(s) dropped (queue full), 3 dropped by rate limiting'
+        ])
+
+    def test_stop(self):
+        target = CapturingHandler(delay=0.001)
+        handler = self._handler(target)
+
+        for num in range(20):
+            handler.handle(make_record('record %d' % num))
+        handler.stop()
+        self.assertEqual(target.messages, ['record %d' % num for num in range(20)])
+
+        # the writer thread is started again by the next record
+        handler.handle(make_record('restarted'))
+        handler.stop()
+        self.assertEqual(target.messages[-1], 'restarted')
+
+    def test_flush(self):
+        target = CapturingHandler(delay=0.01)
+        handler = self._handler(target)
+
+        for num in range(5):
+            handler.handle(make_record('record %d' % num))
+        handler.flush()
+        # the last batch is written once the queue is empty
+        self.assertEqual(len(target.messages), 5)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+import re
+
+from pjc.web.metrics import Histogram, Metrics, _labels
+
+__author__ = 'eric'
+
+
+class StubRequest(object):
+    def __init__(self, duration):
+        self.duration = duration
+
+    def request_time(self):
+        return self.duration
+
+
+class StubHandler(object):
+    """ The parts of a request handler used by `Metrics.observe_request()`.
+    """
+    def __init__(self, duration, status=200, size=None):
+        self.request = StubRequest(duration)
+        self._status = status
+        self._headers = {'Content-Length': str(size)} if size is not None else {}
+
+    def get_status(self):
+        return self._status
+
+
+class TestHistogram(TestCase):
+    def test_buckets(self):
+        histogram = Histogram((1, 2, 5))
+        # a value equal to a bound is counted in the bucket it ends
+        for value in (1, 1.5, 2, 5, 7):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [1, 2, 1, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.sum, 16.5)
+        self.assertEqual(histogram.max, 7)
+
+    def test_quantile(self):
+        histogram = Histogram((1, 2, 5))
+        self.assertIsNone(histogram.quantile(0.5))
+        self.assertIsNone(histogram.summary().mean)
+
+        histogram.observe(0.5)
+        # the bound of the bucket is not returned if greater than the observed values
+        self.assertEqual(histogram.quantile(0.5), 0.5)
+
+        for value in (1.5, 4, 7):
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(0.25), 1)
+        self.assertEqual(histogram.quantile(0.5), 2)
+        self.assertEqual(histogram.quantile(0.75), 5)
+        # the values of the last bucket are only known by their maximum
+        self.assertEqual(histogram.quantile(0.95), 7)
+        self.assertEqual(histogram.summary(), (4, 13.0 / 4, 2, 7, 7))
+
+
+class TestMetrics(TestCase):
+    def test_labels(self):
+        self.assertEqual(_labels(), '')
+        self.assertEqual(_labels(status=200, handler='TVContent'), '{handler="TVContent",status="200"}')
+        self.assertEqual(_labels(le='+Inf', kind='journal'), '{kind="journal",le="+Inf"}')
+        self.assertEqual(_labels(handler='a"b'), '{handler="a\\"b"}')
+
+    def test_render_prometheus(self):
+        metrics = Metrics()
+        metrics.observe_request(StubHandler(0.003, size=120))
+        metrics.observe_request(StubHandler(0.2, status=404))
+        metrics.observe_persistence('journal', 0.002, 64)
+        metrics.set_stall_counter(lambda: 3)
+
+        content = metrics.render_prometheus()
+        self.assertTrue(content.endswith('\n'))
+        lines = content.splitlines()
+        for line in lines:
+            if line.startswith('#'):
+                self.assertRegexpMatches(line, r'^# (HELP|TYPE) pjc_\w+ ')
+            else:
+                self.assertRegexpMatches(line, r'^pjc_\w+(\{[^}]*\})? [0-9.e+-]+$')
+
+        for line in (
+                '# TYPE pjc_request_duration_seconds histogram',
+                'pjc_request_duration_seconds_bucket{handler="StubHandler",status="200",le="0.0025"} 0',
+                'pjc_request_duration_seconds_bucket{handler="StubHandler",status="200",le="0.005"} 1',
+                'pjc_request_duration_seconds_bucket{handler="StubHandler",status="200",le="+Inf"} 1',
+                'pjc_request_duration_seconds_count{handler="StubHandler",status="200"} 1',
+                'pjc_request_duration_seconds_bucket{handler="StubHandler",status="404",le="0.1"} 0',
+                'pjc_request_duration_seconds_bucket{handler="StubHandler",status="404",le="0.25"} 1',
+                'pjc_response_bytes_total{handler="StubHandler"} 120',
+                'pjc_persistence_write_seconds_count{kind="journal"} 1',
+                'pjc_persistence_write_bytes_total{kind="journal"} 64',
+                'pjc_persistence_last_write_bytes{kind="journal"} 64',
+                'pjc_ioloop_stalls_total 3',
+                'pjc_tv_clients{mode="push"} 0',
+                'pjc_tv_clients{mode="polling"} 0',
+        ):
+            self.assertIn(line, lines)
+
+        # cumulated bucket counts, the last one being the total count
+        buckets = [
+            int(line.rsplit(' ', 1)[1]) for line in lines
+            if re.match(r'pjc_request_duration_seconds_bucket\{handler="StubHandler",status="200"', line)
+        ]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], 1)
+
+        # the optional metrics are not rendered if not provided
+        self.assertNotIn('pjc_log_records_dropped_total', Metrics().render_prometheus())
+        self.assertNotIn('pjc_ioloop_stalls_total', Metrics().render_prometheus())
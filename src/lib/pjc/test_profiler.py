@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+import marshal
+import sys
+
+from pjc.web.profiler import RequestProfiler
+
+__author__ = 'eric'
+
+
+class StubRequest(object):
+    def __init__(self, path):
+        self.path = path
+
+
+class StubHandler(object):
+    """ The parts of a request handler used by the profiler.
+    """
+    def __init__(self, path='/tv/content'):
+        self.request = StubRequest(path)
+
+
+def profiled_work():
+    return sum(range(100))
+
+
+class TestRequestProfiler(TestCase):
+    def setUp(self):
+        self._profiler = RequestProfiler()
+        # a failed test must not leave the profile enabled
+        self.addCleanup(self._profiler.stop)
+
+    def _is_enabled(self):
+        return sys.getprofile() is self._profiler.session.profile
+
+    def test_prefix(self):
+        self._profiler.start('/tv/')
+        self.assertFalse(self._profiler.begin(StubHandler('/api/tournament/results')))
+        self.assertFalse(self._is_enabled())
+
+        handler = StubHandler('/tv/content')
+        self.assertTrue(self._profiler.begin(handler))
+        self._profiler.end(handler)
+        self.assertEqual(self._profiler.session.request_count, 1)
+        self.assertTrue(self._profiler.active)
+
+    def test_overlapping_requests(self):
+        self._profiler.start()
+        first, second = StubHandler(), StubHandler()
+        self._profiler.begin(first)
+        self._profiler.begin(second)
+        self.assertTrue(self._is_enabled())
+
+        # the profile stays enabled as long as a selected request is in progress
+        self._profiler.end(first)
+        self.assertTrue(self._is_enabled())
+        profiled_work()
+        self._profiler.end(second)
+        self.assertFalse(self._is_enabled())
+
+        self._profiler.stop()
+        session = self._profiler.session
+        self.assertTrue(session.finished)
+        self.assertEqual(session.request_count, 2)
+        self.assertIn('profiled_work', [name for _, _, name in session.stats.stats])
+        self.assertEqual(marshal.loads(session.dump()), session.stats.stats)
+
+    def test_max_requests(self):
+        self._profiler.start(max_requests=2)
+        first, second, third = StubHandler(), StubHandler(), StubHandler()
+        self.assertTrue(self._profiler.begin(first))
+        self.assertTrue(self._profiler.begin(second))
+        self.assertFalse(self._profiler.begin(third))
+
+        self._profiler.end(first)
+        self.assertTrue(self._profiler.active)
+        # the session is finished by the end of the last profiled request
+        self._profiler.end(second)
+        self.assertFalse(self._profiler.active)
+        self.assertTrue(self._profiler.session.finished)
+        self.assertFalse(self._is_enabled())
+        self._profiler.end(third)
+
+    def test_stop_in_flight(self):
+        self._profiler.start()
+        handler = StubHandler()
+        self._profiler.begin(handler)
+
+        self._profiler.stop()
+        self.assertFalse(self._is_enabled())
+        self.assertTrue(self._profiler.session.finished)
+        # the end of a request started before stopping is ignored
+        self._profiler.end(handler)
+        self.assertEqual(self._profiler.session.request_count, 1)
+        self.assertFalse(self._profiler.begin(StubHandler()))
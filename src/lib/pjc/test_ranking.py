@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from unittest import TestCase, skipUnless
+import random
+
+from pjc.tournament import *
+from pjc.current_edition import *
+from pjc import ranking
+
+__author__ = 'eric'
+
+
+def make_tournament(team_count, rnd, absent=0):
+    """ Creates a tournament with random scores, with a lot of ex-aequos.
+    """
+    planning = TeamPlanning([datetime.time(14), datetime.time(15), datetime.time(16), datetime.time(17)])
+    tournament = Tournament((Round1Score, Round2Score, Round3Score))
+    for num in range(1, team_count + 1):
+        tournament.add_team(Team(
+            num, 'Team %d' % num, 'School', rnd.randint(Grade.POST_BAC, Grade.CM1), 'Nice', 6, True,
+            planning=planning
+        ))
+    for num in rnd.sample(range(1, team_count + 1), absent):
+        tournament.set_team_presence(num, False)
+
+    for num in range(1, team_count + 1):
+        if rnd.random() < 0.9:
+            tournament.set_robotics_score(num, 1, Round1Score(rnd.randint(60, 150), rnd.randint(0, 8)))
+        if rnd.random() < 0.8:
+            tournament.set_robotics_score(num, 2, Round2Score(rnd.randint(60, 150), rnd.randint(0, 8), 0, 0))
+        if rnd.random() < 0.7:
+            tournament.set_robotics_score(num, 3, Round3Score(rnd.randint(60, 150), rnd.randint(0, 2), 0))
+        if rnd.random() < 0.8:
+            tournament.set_research_evaluation(num, ResearchEvaluationScore(True, *[rnd.randint(0, 3)] * 4))
+        if rnd.random() < 0.9:
+            tournament.set_jury_evaluation(num, JuryEvaluationScore(rnd.randint(0, 5)))
+    return tournament
+
+
+@skipUnless(ranking.HAS_NUMPY, 'NumPy not available')
+class TestRanking(TestCase):
+    def setUp(self):
+        self._rnd = random.Random(2016)
+
+    def test_get_ranking_points(self):
+        for count in (0, 1, 5, 50, 500):
+            score_points = [(num, self._rnd.randint(0, 10)) for num in range(1, count + 1)]
+            self.assertEqual(
+                ranking.get_ranking_points(score_points, count),
+                get_ranking_points(score_points, count)
+            )
+
+    def test_final_ranking(self):
+        for team_count, absent in ((5, 0), (20, 0), (20, 3), (200, 10)):
+            tournament = make_tournament(team_count, self._rnd, absent)
+            self.assertEqual(ranking.compute_final_ranking(tournament), tournament.get_final_ranking())
+
+    def test_what_if(self):
+        tournament = make_tournament(30, self._rnd)
+        arrays = ranking.ScoreArrays.from_tournament(tournament)
+
+        arrays.jury_points[:] = 0
+        arrays.jury_played[:] = True
+        with tournament.transaction():
+            for num in tournament.team_nums():
+                tournament.set_jury_evaluation(num, JuryEvaluationScore(0))
+        self.assertEqual(ranking.final_ranking(arrays), tournament.get_final_ranking())
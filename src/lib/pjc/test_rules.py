@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+import random
+
+from pjc.tournament import MATCH_DURATION
+from pjc.rules import *
+from pjc import pjc2014, pjc2015, pjc2016
+
+__author__ = 'eric'
+
+
+def reference_points(action_credits, max_action_credits, total_time):
+    """ The time bonus rule, as implemented by `RoboticsScore.evaluate()`.
+    """
+    if action_credits >= max_action_credits and total_time < MATCH_DURATION:
+        return action_credits + MATCH_DURATION - total_time
+    return action_credits
+
+
+class TestScoringRules(TestCase):
+    def setUp(self):
+        self._rnd = random.Random(2016)
+
+    def check_rules(self, score_type, credits, max_credits):
+        """ Compares the compiled evaluation of random scores with the hand-written formula of the rules.
+        """
+        self.assertEqual(score_type.max_action_credits(), max_credits)
+        for _ in range(200):
+            total_time = self._rnd.randint(60, 160)
+            values = [self._rnd.randint(0, 5) for _ in score_type.items[1:]]
+            score = score_type(total_time, *values)
+            self.assertEqual(score.as_tuple(), tuple([total_time] + values))
+            self.assertEqual(score.evaluate_action_credits(), credits(*values))
+            self.assertEqual(score.evaluate(), reference_points(credits(*values), max_credits, total_time))
+
+    def test_2014(self):
+        self.check_rules(pjc2014.Round1Score, lambda a, d, h: a + d - h, 10)
+        self.check_rules(pjc2014.Round2Score, lambda a, d, h, ok, ko: a + d - h + 5 * (ok - ko), 20)
+        self.check_rules(pjc2014.Round3Score, lambda ok, ko: ok - ko, 6)
+
+    def test_2015(self):
+        self.check_rules(pjc2015.Round1Score, lambda s: s, 12)
+        self.check_rules(pjc2015.Round2Score, lambda s: s, 12)
+        self.assertEqual(pjc2015.Round3Score(100, 7).evaluate(), 7)
+
+    def test_2016(self):
+        self.check_rules(pjc2016.Round1Score, lambda c: c, 8)
+        self.check_rules(pjc2016.Round2Score, lambda i, e, h: i - (e if i > 4 else 0) + h, 11)
+
+        score_type = pjc2016.Round3Score
+        self.assertEqual(score_type().position, score_type.FULLY_INSIDE)
+        for position, points in ((score_type.OUTSIDE, 0), (score_type.PARTLY_INSIDE, 5)):
+            self.assertEqual(score_type(100, position, 1).evaluate(), points - 1)
+        self.assertEqual(score_type(100, score_type.FULLY_INSIDE, 0).evaluate(), 10 + MATCH_DURATION - 100)
+
+    def test_memoize(self):
+        class MemoizedScore(RulesBasedScore):
+            rules = ScoringRules(
+                items=('done', 'failed'),
+                credits=(Credit('done', 2), Malus('failed', when='done < 3')),
+                max_credits=6,
+                memoize=True
+            )
+
+        self.assertEqual(MemoizedScore(100, 1, 1).evaluate(), 1)
+        self.assertEqual(MemoizedScore(100, 1, 1).evaluate(), 1)
+        self.assertEqual(MemoizedScore(100, 3, 1).evaluate(), 6 + MATCH_DURATION - 100)
+        self.assertEqual(MemoizedScore.items, ('total_time', 'done', 'failed'))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, ScoringRules, ('done',), (Credit('undone'),), 1)
+        self.assertRaises(ValueError, ScoringRules, ('done',), (Credit('done', when='total > 2'),), 1)
+        self.assertRaises(ValueError, ScoringRules, ('points',), (Credit('points'),), 1)
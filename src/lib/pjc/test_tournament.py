@@ -69,6 +69,25 @@ class TestRound3Score(TestCase):
         self.assertEqual(score.evaluate(), secs_saved(score) + 10)
 
 
+class TestScoreFromDict(TestCase):
+    def test_valid(self):
+        score = Round1Score.from_dict({'total_time': secs(2, 10), 'collected': 8})
+        self.assertEqual(score.as_tuple(), (secs(2, 10), 8))
+        score = ResearchEvaluationScore.from_dict({'shown': True, 'topic': 12})
+        self.assertEqual(score.as_tuple(), (True, 12, 0, 0, 0))
+
+    def test_invalid(self):
+        for data in (
+            [secs(2, 10), 8],
+            {'total_time': secs(2, 10), 'collect': 8},
+            {'total_time': '2:10'},
+            {'collected': True},
+        ):
+            self.assertRaises(ValueError, Round1Score.from_dict, data)
+        self.assertRaises(ValueError, ResearchEvaluationScore.from_dict, {'shown': 1})
+        self.assertRaises(ValueError, Round3Score.from_dict, {'position': 5})
+
+
 class TestRound(TestCase):
     SCORES = [
         Round1Score(secs(1, 30), 8),
@@ -94,6 +113,133 @@ class TestRound(TestCase):
     def test_get_completed_teams(self):
         self.assertEqual(self._round.get_completed_teams(), range(1, len(self.SCORES) + 1))
 
+    def test_results_update(self):
+        version = self._round.version
+        expected = RoundScorePoints(Round1Score(secs(1, 0), 8).evaluate(), 7)
+        self.assertEqual(self._round.get_results(len(self.SCORES))[5], expected)
+
+        self._round.add_team_score(4, Round1Score(secs(0, 50), 8))
+        self.assertGreater(self._round.version, version)
+        self.assertEqual(self._round.get_results(len(self.SCORES))[4].rank, 7)
+        self.assertEqual(self._round.get_results(len(self.SCORES))[5].rank, 6)
+
+        version = self._round.version
+        self._round.clear_team_score(4)
+        self.assertGreater(self._round.version, version)
+        self.assertEqual(self._round.get_results(len(self.SCORES))[4], RoundScorePoints(0, 0))
+        self.assertEqual(self._round.get_ranking_points(len(self.SCORES))[0], (5, 7))
+
+        version = self._round.version
+        self.assertFalse(self._round.clear_team_score(4))
+        self.assertEqual(self._round.version, version)
+
+        self.assertFalse(self._round.add_team_score(5, self.SCORES[4]))
+        self.assertEqual(self._round.version, version)
+        self.assertTrue(self._round.add_team_score(5, Round1Score(secs(2, 20), 7)))
+        self.assertGreater(self._round.version, version)
+
+    def test_columnar_storage(self):
+        self.assertEqual(self._round.get_team_score(2).as_tuple(), self.SCORES[1].as_tuple())
+        self.assertEqual(self._round.serialize()[7], self.SCORES[6].serialize())
+        self.assertEqual(len(self._round.scores), len(self.SCORES))
+
+        evaluations = Round(ResearchEvaluationScore)
+        evaluations.add_team_score(12, ResearchEvaluationScore(True, 15, 17, 12, 18))
+        evaluations.add_team_score(3, ResearchEvaluationScore(False))
+        self.assertEqual(evaluations.get_completed_teams(), [3, 12])
+        self.assertIs(evaluations.get_team_score(3).shown, False)
+        self.assertIs(evaluations.get_team_score(12).shown, True)
+        self.assertEqual(evaluations.points, {3: 0, 12: ResearchEvaluationScore(True, 15, 17, 12, 18).evaluate()})
+        self.assertRaises(KeyError, evaluations.get_team_score, 4)
+
+        # values not fitting in the compact columns are kept as is
+        evaluations.add_team_score(5, ResearchEvaluationScore(True, 2 ** 70))
+        self.assertEqual(evaluations.get_team_score(5).topic, 2 ** 70)
+        self.assertEqual(evaluations.serialize()[12]['topic'], 15)
+
+
+class TestTimeline(TestCase):
+    PLANNINGS = {
+        1: ['14:00', '14:20', '15:00', '16:00'],
+        2: ['14:00', '14:30', '15:00', '15:30'],
+        3: ['14:10', '14:30', '15:10', '15:30'],
+    }
+
+    def setUp(self):
+        self._tournament = Tournament((Round1Score, Round2Score, Round3Score))
+        for num, times in sorted(self.PLANNINGS.items()):
+            self._tournament.add_team(Team(
+                num, 'Team %d' % num, 'School', Grade.SECONDE, 'Nice', 6, True, planning=TeamPlanning(times)
+            ))
+
+    def test_next_appointments(self):
+        timeline = self._tournament.get_timeline()
+        self.assertEqual(len(timeline), 12)
+
+        appts = timeline.next_appointments(datetime.time(14, 30))
+        self.assertEqual(len(appts), 8)
+        self.assertEqual(appts[0], (datetime.time(14, 30), 2, 1))
+        self.assertEqual(appts[-1], (datetime.time(16, 0), 1, 3))
+
+        appts = timeline.next_appointments(datetime.time(14, 5), count=2)
+        self.assertEqual([(a.team_num, a.item) for a in appts], [(3, 0), (1, 1)])
+        appts = timeline.next_appointments(datetime.time(14, 5), count=3, complete_slot=True)
+        self.assertEqual([(a.team_num, a.item) for a in appts], [(3, 0), (1, 1), (2, 1), (3, 1)])
+        self.assertEqual(timeline.next_appointments(datetime.time(16, 1), count=3, complete_slot=True), [])
+
+        slots = Timeline.group_by_slot(timeline.next_appointments(datetime.time(15, 0), count=4))
+        self.assertEqual(
+            [(t, len(appts)) for t, appts in slots],
+            [(datetime.time(15, 0), 2), (datetime.time(15, 10), 1), (datetime.time(15, 30), 1)]
+        )
+
+    def test_invalidation(self):
+        timeline = self._tournament.get_timeline()
+        self._tournament.set_robotics_score(1, 1, Round1Score(secs(1, 30), 8))
+        self.assertIs(self._tournament.get_timeline(), timeline)
+
+        self._tournament.set_team_presence(2, False)
+        timeline = self._tournament.get_timeline()
+        self.assertEqual(len(timeline), 8)
+        self.assertNotIn(2, [a.team_num for a in timeline.next_appointments(datetime.time(0))])
+
+
+class TestPlanningIndex(TestCase):
+    PLANNINGS = {
+        1: [('14:00', 1), ('14:20', 1), ('15:00', 2), ('16:00', 1)],
+        2: [('14:00', 2), ('14:30', 1), ('15:05', 2), ('15:30', 1)],
+        3: [('14:10', 1), ('14:35', 2), ('15:10', 3), ('15:20', 1)],
+    }
+
+    def setUp(self):
+        self._tournament = Tournament((Round1Score, Round2Score, Round3Score))
+        for num, times in sorted(self.PLANNINGS.items()):
+            self._tournament.add_team(Team(
+                num, 'Team %d' % num, 'School', Grade.SECONDE, 'Nice', 6, True, planning=TeamPlanning(times)
+            ))
+
+    def test_occupants(self):
+        index = self._tournament.get_planning_index()
+        self.assertEqual(index.resources('table'), [('table', 1), ('table', 2), ('table', 3)])
+        self.assertEqual([s.team_num for s in index.occupants(('table', 1), datetime.time(14, 15))], [3])
+        self.assertEqual(index.occupants(('table', 1), datetime.time(14, 10))[0].start, 14 * 60 + 10)
+        self.assertEqual(index.occupants(('table', 3), datetime.time(14, 10)), [])
+        self.assertEqual([s.item for s in index.occupants(('team', 1), datetime.time(16, 29))], [3])
+        self.assertEqual(index.occupants(('jury', 1), datetime.time(15, 45)), index.get_slots(('jury', 1))[:2])
+
+    def test_conflicts(self):
+        conflicts = self._tournament.get_planning_conflicts()
+        self.assertEqual(
+            [(c.resource, c.first.team_num, c.second.team_num) for c in conflicts],
+            [(('jury', 1), 3, 2), (('table', 2), 1, 2)]
+        )
+
+        # juries assignment changes the plannings, and thus invalidates the index
+        index = self._tournament.get_planning_index()
+        self._tournament.assign_tables_and_juries()
+        self.assertIsNot(self._tournament.get_planning_index(), index)
+        self.assertEqual(len(self._tournament.get_planning_index().resources('jury')), 3)
+
 
 class TestTournament(TestCase):
     DUMMY_PLANNING = TeamPlanning([datetime.time(14), datetime.time(15), datetime.time(16), datetime.time(17)])
@@ -158,6 +304,8 @@ class TestTournament(TestCase):
         for team_num, score in self.JURY_EVALUATION:
             self._tournament.set_jury_evaluation(team_num, score)
 
+        self._saved_state = self._tournament.serialize()
+
     def test_get_teams(self):
         self.assertEqual(self._tournament.team_count(present_only=False), len(self.TEAMS))
 
@@ -170,6 +318,42 @@ class TestTournament(TestCase):
         self.assertFalse(status.robotics[2][4])
         self.assertTupleEqual(status.research, (True, False, True, True, True))
 
+    def test_team_registry(self):
+        tournament = self._tournament
+        self.assertTrue(tournament.has_team(3))
+        self.assertFalse(tournament.has_team(6))
+        self.assertEqual(tournament.team_nums(), [1, 2, 3, 4, 5])
+
+        tournament.set_team_presence(3, False)
+        self.addCleanup(tournament.set_team_presence, 3, True)
+        self.assertEqual(tournament.team_nums(present_only=True), [1, 2, 4, 5])
+        self.assertEqual([t.num for t in tournament.teams(present_only=True)], [1, 2, 4, 5])
+        self.assertEqual(tournament.team_count(present_only=True), 4)
+        self.assertEqual(tournament.team_count(present_only=False), 5)
+
+        tournament.set_team_presence(3, True)
+        self.assertEqual(tournament.team_nums(present_only=True), [1, 2, 3, 4, 5])
+
+        self.assertRaises(DuplicatedTeam, tournament.add_team, self.TEAMS[0])
+
+    def test_completion_index(self):
+        tournament = self._tournament
+        self.assertEqual(tournament.get_completion_counts(), ((5, 5, 3), 4, 5))
+        self.assertEqual(tournament.get_competing_teams(), [1, 3, 4, 5])
+        self.assertTrue(tournament.is_competing(1))
+        self.assertFalse(tournament.is_competing(2))
+
+        tournament.set_research_evaluation(2, ResearchEvaluationScore(True, 10, 10, 10, 10))
+        self.addCleanup(tournament.clear_research_evaluation, 2)
+        self.assertTrue(tournament.get_completion_status().research[1])
+        self.assertEqual(tournament.get_completion_counts().research, 5)
+        self.assertEqual(tournament.get_competing_teams(), [1, 2, 3, 4, 5])
+
+        tournament.clear_robotics_score(1, 3)
+        self.addCleanup(tournament.set_robotics_score, 1, 3, self.SCORES_ROBOTICS[2][0][1])
+        self.assertFalse(tournament.get_completion_status().robotics[2][0])
+        self.assertEqual(tournament.get_completion_counts().robotics, (5, 5, 2))
+
     def test_get_global_result(self):
         present_teams_count = self._tournament.team_count(present_only=True)
 
@@ -192,6 +376,118 @@ class TestTournament(TestCase):
         print(res)
         self.assertEqual(res, [(1, [1]), (2, [5]), (3, [4]), (4, [3])])
 
+    def test_final_ranking_update(self):
+        tournament = self._tournament
+        version = tournament.version
+        res = tournament.get_final_ranking()
+        self.assertIs(tournament.get_final_ranking(), res)
+        self.assertEqual(tournament.version, version)
+
+        new_score = Round3Score(secs(1, 00), Round3Score.FULLY_INSIDE, 0)
+        tournament.set_robotics_score(3, 3, new_score)
+        self.assertGreater(tournament.version, version)
+
+        # compare with the ranking computed from scratch by a fresh tournament
+        self.SCORES_ROBOTICS[2].append((3, new_score))
+        try:
+            self.setUp()
+        finally:
+            self.SCORES_ROBOTICS[2].pop()
+        self.assertNotEqual(tournament.get_final_ranking(), res)
+        self.assertEqual(tournament.get_final_ranking(), self._tournament.get_final_ranking())
+
+        tournament.clear_robotics_score(3, 3)
+        self.assertEqual(tournament.get_final_ranking(), res)
+
+        version = tournament.version
+        tournament.set_team_presence(2, False)
+        self.addCleanup(tournament.set_team_presence, 2, True)
+        self.assertGreater(tournament.version, version)
+        self.assertEqual(tournament.team_count(present_only=True), len(self.TEAMS) - 1)
+        self.assertNotIn(2, tournament.get_robotics_results())
+
+    def test_mutations_replay(self):
+        records = []
+        self._tournament.add_mutation_listener(records.extend)
+
+        self._tournament.set_robotics_score(3, 3, Round3Score(secs(1, 00), Round3Score.FULLY_INSIDE, 0))
+        self._tournament.clear_robotics_score(1, 2)
+        self._tournament.clear_research_evaluation(4)
+        self._tournament.set_jury_evaluation(2, JuryEvaluationScore(12))
+        self.assertEqual([r['op'] for r in records], [
+            'set_robotics_score', 'clear_robotics_score', 'clear_research_evaluation', 'set_jury_evaluation'
+        ])
+
+        t = Tournament(self._tournament._robotics_score_types)
+        t.deserialize(json.loads(json.dumps(self._saved_state)))
+        for record in json.loads(json.dumps(records)):
+            t.apply_mutation(record)
+        self.assertEqual(
+            json.dumps(t.serialize(), sort_keys=True),
+            json.dumps(self._tournament.serialize(), sort_keys=True)
+        )
+        self.assertEqual(t.get_final_ranking(), self._tournament.get_final_ranking())
+
+        self.assertRaises(ValueError, t.apply_mutation, {'op': 'no_such_op'})
+
+    def test_unchanged_scores(self):
+        records = []
+        self._tournament.add_mutation_listener(records.extend)
+
+        self._tournament.set_jury_evaluation(1, self._tournament.get_jury_evaluation(1))
+        self._tournament.set_research_evaluation(1, self._tournament.get_research_evaluation(1))
+        self._tournament.set_robotics_score(1, 1, self._tournament.get_robotics_round(1).get_team_score(1))
+        self._tournament.clear_jury_evaluation(1)
+        self._tournament.clear_jury_evaluation(1)
+        self.assertEqual([r['op'] for r in records], ['clear_jury_evaluation'])
+
+    def test_transaction(self):
+        notifications = []
+        self._tournament.add_mutation_listener(notifications.append)
+
+        with self._tournament.transaction():
+            self._tournament.set_jury_evaluation(2, JuryEvaluationScore(12))
+            with self._tournament.transaction():
+                self._tournament.clear_jury_evaluation(3)
+            self.assertEqual(notifications, [])
+            self._tournament.set_team_presence(5, True)
+        self.assertEqual(len(notifications), 1)
+        self.assertEqual([r['op'] for r in notifications[0]], ['set_jury_evaluation', 'clear_jury_evaluation'])
+
+        self._tournament.clear_jury_evaluation(2)
+        self.assertEqual(len(notifications), 2)
+
+    def test_snapshot(self):
+        snapshot = self._tournament.snapshot()
+        self.assertTrue(snapshot.read_only)
+        self.assertRaises(ReadOnlyError, snapshot.set_jury_evaluation, 2, JuryEvaluationScore(12))
+        self.assertRaises(ReadOnlyError, snapshot.set_team_presence, 5, True)
+
+        self._tournament.clear_jury_evaluation(2)
+        self.assertIn(2, snapshot.jury_evaluations.scores)
+
+        updated = self._tournament.snapshot(snapshot)
+        self.assertNotIn(2, updated.jury_evaluations.scores)
+        self.assertIsNot(updated.jury_evaluations, snapshot.jury_evaluations)
+        self.assertIs(updated.research_evaluations, snapshot.research_evaluations)
+        self.assertIs(updated._teams, snapshot._teams)
+
+        self._tournament.add_team(Team(6, 'Team 6', 'School 6', Grade.CINQUIEME, 'Antibes', 6, True))
+        self.assertIsNot(self._tournament.snapshot(updated)._teams, updated._teams)
+        self.assertNotIn(6, updated.team_nums())
+
+    def test_deserialize_replaces_content(self):
+        d = self._tournament.serialize()
+        self._tournament.clear_research_evaluation(1)
+        self._tournament.clear_jury_evaluation(2)
+
+        t = Tournament(self._tournament._robotics_score_types)
+        t.deserialize(d)
+        t.set_research_evaluation(2, ResearchEvaluationScore(True, 1, 1, 1, 1))
+        t.deserialize(self._tournament.serialize())
+        self.assertEqual(t.research_evaluations.serialize(), self._tournament.research_evaluations.serialize())
+        self.assertEqual(t.jury_evaluations.serialize(), self._tournament.jury_evaluations.serialize())
+
     def test_json_persistence(self):
         with file('/tmp/tournament.json', 'wt') as fp:
             json.dump(self._tournament.serialize(), fp, indent=4)
@@ -4,7 +4,12 @@ from datetime import datetime
 
 from operator import itemgetter
 from collections import namedtuple
+from contextlib import contextmanager
+from array import array
+import bisect
+import copy
 import datetime
+import itertools
 import csv
 
 __author__ = 'eric'
@@ -13,6 +18,20 @@ __author__ = 'eric'
 MATCH_DURATION = 150    # secs
 
 
+# Source of the modification stamps of the tournament components.
+#
+# It is shared by all of them, so that a stamp is never reused even when a component is replaced
+# by a new instance (as done by `Tournament.deserialize()` for instance). The version of a composite
+# can thus be obtained by taking the highest stamp of its parts.
+_stamps = itertools.count(1)
+
+
+def next_stamp():
+    """ Returns a new modification stamp, greater than all the previously issued ones.
+    """
+    return next(_stamps)
+
+
 class Score(object):
     """ Root class implementing a team score for the various parts of the competition.
 
@@ -57,6 +76,39 @@ class Score(object):
     def serialize(self):
         return dict([(item, getattr(self, item)) for item in self.items])
 
+    @classmethod
+    def from_dict(cls, data):
+        """ Creates a score from its items values, checking them first.
+
+        It is intended for scores received from the outside (API requests for instance). Values must have the
+        same type as the item defaults, and the resulting score must be evaluable.
+
+        :param dict data: the score items values, keyed by the item names. Missing items get their default value.
+        :raises ValueError: if the data are not valid
+        """
+        if not isinstance(data, dict):
+            raise ValueError('score data must be a dictionary')
+        unknown = set(data) - set(cls.items)
+        if unknown:
+            raise ValueError('unknown score item(s) : %s' % ', '.join(sorted(unknown)))
+
+        defaults = cls()
+        for item, value in data.iteritems():
+            default = getattr(defaults, item)
+            if isinstance(default, bool):
+                valid = isinstance(value, bool)
+            else:
+                valid = isinstance(value, (int, long)) and not isinstance(value, bool)
+            if not valid:
+                raise ValueError('invalid value for %s (%r)' % (item, value))
+
+        score = cls(**data)
+        try:
+            score.evaluate()
+        except Exception as e:
+            raise ValueError('score cannot be evaluated (%s)' % e)
+        return score
+
     def as_tuple(self):
         return tuple([getattr(self, attr) for attr in self.items])
 
@@ -140,40 +192,318 @@ class GradeEvaluationScore(Score):
 RoundScorePoints = namedtuple('RoundScorePoints', 'score rank')
 
 
+class ScoreColumns(object):
+    """ Columnar storage of the scores of a round.
+
+    Each score item is stored in its own column, indexed by the team number, together with a mask telling
+    which teams have a score, and a column containing the evaluated points of the scores. Columns are compact
+    arrays as long as the stored values are integers (or booleans), and turn into plain lists otherwise.
+
+    The scores are accessed as a read-only mapping keyed by the team number, which values are score instances
+    rebuilt from the columns. Scores must thus be modified through the owning round.
+    """
+    # array type codes used for integer and boolean values
+    INT_CODE, BOOL_CODE = 'l', 'b'
+
+    def __init__(self):
+        self._mask = bytearray()
+        self._types = []
+        self._columns = {}
+        self._points = array(self.INT_CODE)
+        self._count = 0
+
+    def _grow(self, size):
+        missing = size - len(self._mask)
+        if missing > 0:
+            self._mask.extend(b'\0' * missing)
+            self._types.extend([None] * missing)
+            for column in self._columns.itervalues():
+                column.extend([0] * missing)
+            self._points.extend([0] * missing)
+
+    def _value(self, name, index):
+        column = self._columns[name]
+        value = column[index]
+        if isinstance(column, array) and column.typecode == self.BOOL_CODE:
+            return bool(value)
+        return value
+
+    def _new_column(self, value):
+        if isinstance(value, bool):
+            column = array(self.BOOL_CODE)
+        elif isinstance(value, (int, long)):
+            column = array(self.INT_CODE)
+        else:
+            column = []
+        column.extend([0] * len(self._mask))
+        return column
+
+    @staticmethod
+    def _store(column, index, value):
+        """ Stores a value in a column, and returns the column to be used from now on (which is not the same
+        if the value is not supported by the original one).
+        """
+        if isinstance(column, array):
+            is_bool = column.typecode == ScoreColumns.BOOL_CODE
+            if isinstance(value, bool) == is_bool and isinstance(value, (int, long)):
+                try:
+                    column[index] = value
+                    return column
+                except OverflowError:
+                    pass
+            # the value does not fit in the array : switch to a list, preserving the stored values type
+            column = [bool(v) for v in column] if is_bool else column.tolist()
+        column[index] = value
+        return column
+
+    def set(self, team_num, score, points):
+        """ Stores the score of a team and its evaluated points.
+        """
+        self._grow(team_num + 1)
+        columns = self._columns
+        for name in score.items:
+            value = getattr(score, name)
+            column = columns.get(name)
+            if column is None:
+                column = columns[name] = self._new_column(value)
+            if type(column) is list:
+                column[team_num] = value
+            else:
+                columns[name] = self._store(column, team_num, value)
+        self._points = self._store(self._points, team_num, points)
+        self._types[team_num] = type(score)
+        if not self._mask[team_num]:
+            self._mask[team_num] = 1
+            self._count += 1
+
+    def holds(self, team_num, score):
+        """ Tells if the stored score of a team is the same as a given one.
+        """
+        if team_num not in self or self._types[team_num] is not type(score):
+            return False
+        return all(self._value(name, team_num) == getattr(score, name) for name in score.items)
+
+    def remove(self, team_num):
+        """ Removes the score of a team.
+
+        :returns bool: True if the team had a score
+        """
+        if team_num not in self:
+            return False
+        self._mask[team_num] = 0
+        self._types[team_num] = None
+        self._count -= 1
+        return True
+
+    def copy(self):
+        """ Returns an independent copy of the stored scores.
+        """
+        clone = ScoreColumns.__new__(ScoreColumns)
+        clone._mask = bytearray(self._mask)
+        clone._types = list(self._types)
+        clone._columns = dict((name, column[:]) for name, column in self._columns.iteritems())
+        clone._points = self._points[:]
+        clone._count = self._count
+        return clone
+
+    def export(self):
+        """ Returns the storage of the scores, as a (mask, types, columns, points) tuple, which content must not
+        be modified.
+        """
+        return self._mask, self._types, self._columns, self._points
+
+    def __contains__(self, team_num):
+        return isinstance(team_num, (int, long)) and 0 <= team_num < len(self._mask) and self._mask[team_num] == 1
+
+    def __len__(self):
+        return self._count
+
+    def iterkeys(self):
+        """ Iterates over the numbers of the teams having a score, in increasing order.
+        """
+        return iter([team_num for team_num, flag in enumerate(self._mask) if flag])
+
+    def get_mask(self, team_nums):
+        """ Returns a tuple containing a boolean per given team number, telling if the team has a score.
+        """
+        mask = self._mask
+        size = len(mask)
+        return tuple(0 <= team_num < size and mask[team_num] == 1 for team_num in team_nums)
+
+    __iter__ = iterkeys
+
+    def keys(self):
+        return [team_num for team_num, flag in enumerate(self._mask) if flag]
+
+    def __getitem__(self, team_num):
+        if team_num not in self:
+            raise KeyError(team_num)
+        score_type = self._types[team_num]
+        return score_type(**dict((name, self._value(name, team_num)) for name in score_type.items))
+
+    def get(self, team_num, default=None):
+        try:
+            return self[team_num]
+        except KeyError:
+            return default
+
+    def iteritems(self):
+        return ((team_num, self[team_num]) for team_num in self.iterkeys())
+
+    def items(self):
+        return list(self.iteritems())
+
+    def itervalues(self):
+        return (self[team_num] for team_num in self.iterkeys())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def get_points(self):
+        """ Returns the evaluated points of the stored scores, as a dictionary keyed by the team number.
+        """
+        points = self._points
+        return dict((team_num, points[team_num]) for team_num, flag in enumerate(self._mask) if flag)
+
+    def serialize(self):
+        """ Returns the scores items values as dictionaries keyed by the team number, without building score
+        instances.
+        """
+        return dict(
+            (team_num, dict((name, self._value(name, team_num)) for name in self._types[team_num].items))
+            for team_num in self.iterkeys()
+        )
+
+
+class LazyScoreColumns(ScoreColumns):
+    """ Score columns which content is decoded on first access.
+
+    Used when loading the tournament data file (see `pjc.datafile`), so that the scores of a round are decoded
+    only when needed. Once decoded, the columns behave exactly as `ScoreColumns`, without any overhead.
+    """
+    def __init__(self, decode):
+        """
+        :param callable decode: returns the content of the columns, as a (mask, types, columns, points) tuple
+        """
+        self._decode = decode
+
+    def __getattr__(self, name):
+        # only called while the content is not decoded, since the storage attributes are missing until then
+        decode = self.__dict__.pop('_decode', None)
+        if decode is None:
+            raise AttributeError(name)
+        self._mask, self._types, self._columns, self._points = decode()
+        self._count = self._mask.count(b'\x01')
+        return getattr(self, name)
+
+    def copy(self):
+        if '_decode' in self.__dict__:
+            # the copy decodes the same content by itself, if ever needed
+            return LazyScoreColumns(self._decode)
+        return super(LazyScoreColumns, self).copy()
+
+
 class Round(object):
     """ A round collects the scores of all participating teams
+
+    Scores are stored in columns (see `ScoreColumns`), the evaluated points being kept in a column too, so that
+    results requests do not have to evaluate all of them again. Ranking points and detailed results are cached
+    too, and reused as long as the round has not been modified since they were computed.
+
+    Since the points are evaluated once for all when a score is added, scores must not be modified after
+    having been added. Add a new score instance to change the score of a team.
     """
 
     # all teams detailed scores, keyed by the team number
     _scores = None
 
-    def __init__(self, score_type):
+    # set on round snapshots
+    _read_only = False
+
+    def __init__(self, score_type, scores=None):
+        """
+        :param type score_type: the type of the scores
+        :param ScoreColumns scores: the initial scores, if any (see `pjc.datafile`)
+        """
         if score_type is None:
             raise ValueError("score_type cannot be None")
 
-        self._scores = dict()
+        self._scores = scores if scores is not None else ScoreColumns()
         self._score_type = score_type
 
+        self._version = next_stamp()
+        self._points_cache = None
+        self._ranking_points_cache = None
+        self._results_cache = None
+
     def add_team_score(self, team_number, score):
+        """ Sets the score of a team.
+
+        :returns bool: True if the stored score has changed
+        """
         assert isinstance(team_number, int)
+        if self._read_only:
+            raise ReadOnlyError('round snapshots cannot be modified')
         if score:
             if not isinstance(score, self._score_type):
                 raise ValueError('argument is not a %s' % self.score_type.__name__)
-            self._scores[team_number] = score
+            if self._scores.holds(team_number, score):
+                return False
+            self._scores.set(team_number, score, score.evaluate())
+            self._version = next_stamp()
+            return True
         else:
             raise ValueError('score cannot be None')
 
     def clear_team_score(self, team_number):
+        """ Removes the score of a team.
+
+        :returns bool: True if the team had a score
+        """
         assert isinstance(team_number, int)
-        try:
-            del self._scores[team_number]
-        except KeyError:
-            pass
+        if self._read_only:
+            raise ReadOnlyError('round snapshots cannot be modified')
+        if self._scores.remove(team_number):
+            self._version = next_stamp()
+            return True
+        return False
+
+    @property
+    def version(self):
+        """ The modification stamp of the round, which changes each time a score is added or cleared.
+        """
+        return self._version
+
+    def snapshot(self):
+        """ Returns a read-only copy of the round, having the same version.
+
+        Cached results are shared with the round, since they are replaced rather than modified when the round
+        changes.
+        """
+        clone = copy.copy(self)
+        clone._scores = self._scores.copy()
+        clone._read_only = True
+        return clone
 
     @property
     def scores(self):
+        """ The scores of the teams which have played the round, as a read-only mapping keyed by the team number.
+
+        Score instances are rebuilt from the columnar storage each time they are accessed.
+        """
         return self._scores
 
+    @property
+    def points(self):
+        """ The evaluated points of the teams which have played the round, as a dictionary keyed by the team number.
+
+        It is built from the points column once per round version, and shared by all the callers until the round
+        is modified. It thus must not be modified.
+        """
+        if not self._points_cache or self._points_cache[0] != self._version:
+            self._points_cache = (self._version, self._scores.get_points())
+        return self._points_cache[1]
+
     @property
     def score_type(self):
         """
@@ -187,31 +517,56 @@ class Round(object):
 
         See get_ranking_points() for ranking points computation method.
         """
-        points = [(team_number, score.evaluate()) for team_number, score in self._scores.iteritems()]
-        return get_ranking_points(points, team_count)
+        key = (self._version, team_count)
+        if not self._ranking_points_cache or self._ranking_points_cache[0] != key:
+            self._ranking_points_cache = (key, get_ranking_points(self.points.items(), team_count))
+        return list(self._ranking_points_cache[1])
 
     def get_results(self, team_count):
         """ Returns the detailed round result as a dictionary keyed by the team number which values are pairs
          composed of the score points and the ranking points of the team.
 
+         The returned dictionary is shared by all the callers until the round is modified, and thus must not be
+         modified.
+
          :param int team_count: the total team count
          :returns dict: the detailed round results
         """
-        score_points = [(team_number, score.evaluate()) for team_number, score in self._scores.iteritems()]
-        ranking_points = dict(get_ranking_points(score_points, team_count))
-        score_points = dict(score_points)
-        res = dict([
-            (team_number, RoundScorePoints(score_points.get(team_number, 0), ranking_points.get(team_number, 0)))
-            for team_number in xrange(1, team_count + 1)
-        ])
-        return res
+        key = (self._version, team_count)
+        if not self._results_cache or self._results_cache[0] != key:
+            score_points = self.points
+            ranking_points = dict(self.get_ranking_points(team_count))
+            res = dict([
+                (team_number, RoundScorePoints(score_points.get(team_number, 0), ranking_points.get(team_number, 0)))
+                for team_number in xrange(1, team_count + 1)
+            ])
+            self._results_cache = (key, res)
+        return self._results_cache[1]
 
     def get_completed_teams(self):
         """ Returns the list of teams having already played the round.
 
         :returns list: sorted list of team numbers
         """
-        return sorted(self._scores.keys())
+        return self._scores.keys()
+
+    def is_completed(self, team_number):
+        """ Tells if a team has already played the round.
+        """
+        return team_number in self._scores
+
+    @property
+    def completed_count(self):
+        """ The count of teams having already played the round.
+        """
+        return len(self._scores)
+
+    def get_completion(self, team_numbers):
+        """ Returns the completion status of a list of teams, as a tuple containing a boolean per team.
+
+        :param list team_numbers: the team numbers
+        """
+        return self._scores.get_mask(team_numbers)
 
     def get_team_score(self, team_number):
         """ Returns the score of the team for this round, or raises a KeyError exception of not available.
@@ -219,7 +574,7 @@ class Round(object):
         return self._scores[team_number]
 
     def serialize(self):
-        return dict([(team_num, score.serialize()) for team_num, score in self._scores.iteritems()])
+        return self._scores.serialize()
 
 
 class GradePseudoRound(Round):
@@ -387,6 +742,11 @@ class TeamPlanning(object):
             else:
                 self.presentation = self.Presentation(time, assignment)
 
+    def copy(self):
+        return TeamPlanning(
+            [(m.time, m.table) for m in self.matches] + [(self.presentation.time, self.presentation.jury)]
+        )
+
     def __getitem__(self, item):
         if 0 <= item < 3:
             return self.matches[item]
@@ -464,6 +824,14 @@ class Team(object):
             'bonus': Grade.bonus_points(self.grade),
         })
 
+    def copy(self):
+        """ Returns a copy of the team, which planning can be modified independently.
+        """
+        clone = copy.copy(self)
+        if self.planning:
+            clone.planning = self.planning.copy()
+        return clone
+
     def __repr__(self):
         return "%d - %s" % (self.num, self.name)
 
@@ -479,8 +847,287 @@ class DuplicatedTeam(Exception):
     """
 
 
+class ReadOnlyError(Exception):
+    """ Raised when attempting to modify a tournament snapshot
+    """
+
+
+class TeamRegistry(object):
+    """ The teams registered to a tournament.
+
+    Teams are kept ordered by number, and the subset of present teams is maintained as their presence changes,
+    so that team lists and counts are available without filtering and sorting all the teams each time.
+
+    The presence of registered teams must thus be changed with `set_presence()` rather than directly on the
+    team, so that the present subset stays consistent.
+    """
+    # set on registry snapshots
+    _read_only = False
+
+    def __init__(self):
+        self._teams = {}
+        self._nums = []
+        self._present_nums = []
+        self._lists = {}
+
+    def _check_writable(self):
+        if self._read_only:
+            raise ReadOnlyError('team registry snapshots cannot be modified')
+
+    def snapshot(self):
+        """ Returns a read-only copy of the registry, containing copies of the teams.
+        """
+        clone = TeamRegistry()
+        clone._teams = dict((num, team.copy()) for num, team in self._teams.iteritems())
+        clone._nums = list(self._nums)
+        clone._present_nums = list(self._present_nums)
+        clone._read_only = True
+        return clone
+
+    def __contains__(self, team_num):
+        return team_num in self._teams
+
+    def __len__(self):
+        return len(self._teams)
+
+    def __getitem__(self, team_num):
+        return self._teams[team_num]
+
+    def itervalues(self):
+        return self._teams.itervalues()
+
+    def add(self, team):
+        """ Registers a team.
+
+        :param Team team: the team
+        :raises DuplicatedTeam: if the team number is already registered
+        """
+        self._check_writable()
+        if team.num in self._teams:
+            raise DuplicatedTeam(team)
+        self._teams[team.num] = team
+        bisect.insort(self._nums, team.num)
+        if team.present:
+            bisect.insort(self._present_nums, team.num)
+        self._lists.clear()
+
+    def clear(self):
+        self._check_writable()
+        self._teams.clear()
+        self._nums = []
+        self._present_nums = []
+        self._lists.clear()
+
+    def set_presence(self, team_num, present):
+        """ Changes the presence status of a team.
+
+        :returns bool: True if the status has been changed
+        :raises KeyError: if the team is not registered
+        """
+        self._check_writable()
+        team = self._teams[team_num]
+        if team.present == present:
+            return False
+
+        team.present = present
+        if present:
+            bisect.insort(self._present_nums, team_num)
+        else:
+            del self._present_nums[bisect.bisect_left(self._present_nums, team_num)]
+        self._lists.clear()
+        return True
+
+    def count(self, present_only=True):
+        return len(self._present_nums) if present_only else len(self._teams)
+
+    def nums(self, present_only=True):
+        """ Returns the list of team numbers, in increasing order.
+        """
+        return list(self._present_nums if present_only else self._nums)
+
+    def teams(self, present_only=True):
+        """ Returns the list of teams, ordered by number.
+        """
+        try:
+            teams = self._lists[present_only]
+        except KeyError:
+            teams = self._lists[present_only] = [
+                self._teams[num] for num in (self._present_nums if present_only else self._nums)
+            ]
+        return list(teams)
+
+
+class Timeline(object):
+    """ Time-ordered index of the teams appointments (robotics matches and research work presentation).
+
+    It is built once from the teams plannings, and answers the "next appointments" requests by bisection,
+    instead of collecting and sorting all the appointments each time.
+
+    Appointments are tuples containing the time, the team number and the index of the planning item (0 to 2 for
+    the robotics matches, 3 for the presentation). Appointments at the same time are ordered by team number.
+    """
+    Appointment = namedtuple('Appointment', 'time team_num item')
+
+    def __init__(self, teams):
+        """
+        :param teams: the teams which appointments are indexed. Teams without planning are ignored.
+        """
+        self._appointments = sorted(
+            self.Appointment(time, team.num, item)
+            for team in teams if team.planning
+            for item, time in enumerate(team.planning.times)
+        )
+        self._times = [appt.time for appt in self._appointments]
+
+    def __len__(self):
+        return len(self._appointments)
+
+    def next_appointments(self, now, count=None, complete_slot=False):
+        """ Returns the appointments scheduled at a given time or later.
+
+        :param datetime.time now: the reference time
+        :param int count: the maximum count of returned appointments (all of them if not provided)
+        :param bool complete_slot: if True, the result is extended with the appointments sharing the time slot
+        of the last one, so that the last slot is not truncated
+        :returns list: the appointments, in chronological order
+        """
+        start = bisect.bisect_left(self._times, now)
+        if count is None:
+            return self._appointments[start:]
+
+        end = min(start + count, len(self._times))
+        if complete_slot and end > start:
+            end = bisect.bisect_right(self._times, self._times[end - 1])
+        return self._appointments[start:end]
+
+    @staticmethod
+    def group_by_slot(appointments):
+        """ Groups chronologically ordered appointments by time slot.
+
+        :returns list: a list of (time, appointments) tuples
+        """
+        return [(time, list(appts)) for time, appts in itertools.groupby(appointments, key=itemgetter(0))]
+
+
+class PlanningIndex(object):
+    """ Interval index of the planning slots (robotics matches and research work presentations).
+
+    Each slot lasts the `SLOT_DURATION` of its kind, and occupies the involved team, plus the table of the match
+    or the jury of the presentation when assigned. Slots are indexed by resource, so that the occupation of a
+    resource at a given time and the overlapping slots (ie double-booked resources) can be obtained without
+    scanning the whole planning.
+
+    Resources are identified by tuples containing the kind of resource ("team", "table" or "jury") and its number.
+    Times are expressed in minutes since midnight.
+    """
+    Slot = namedtuple('Slot', 'start end team_num item')
+    Conflict = namedtuple('Conflict', 'resource first second')
+
+    RESOURCE_KINDS = ('team', 'table', 'jury')
+
+    def __init__(self, teams):
+        """
+        :param teams: the teams which plannings are indexed. Teams without planning are ignored.
+        """
+        durations = [
+            self.minutes(TeamPlanning.Match.SLOT_DURATION),
+            self.minutes(TeamPlanning.Presentation.SLOT_DURATION),
+        ]
+        self._max_duration = max(durations)
+
+        slots = {}
+        for team in teams:
+            if not team.planning:
+                continue
+            for item in range(4):
+                entry = team.planning[item]
+                start = self.minutes(entry.time)
+                if item < 3:
+                    slot, assignment = self.Slot(start, start + durations[0], team.num, item), ('table', entry.table)
+                else:
+                    slot, assignment = self.Slot(start, start + durations[1], team.num, item), ('jury', entry.jury)
+                slots.setdefault(('team', team.num), []).append(slot)
+                if assignment[1] is not None:
+                    slots.setdefault(assignment, []).append(slot)
+
+        for resource_slots in slots.itervalues():
+            resource_slots.sort()
+        self._slots = slots
+        self._starts = dict((resource, [slot.start for slot in resource_slots])
+                            for resource, resource_slots in slots.iteritems())
+
+    @staticmethod
+    def minutes(t):
+        """ Converts a time of the day or a duration to minutes.
+        """
+        if isinstance(t, datetime.timedelta):
+            return int(t.total_seconds()) // 60
+        return t.hour * 60 + t.minute
+
+    def resources(self, kind=None):
+        """ Returns the indexed resources, optionally restricted to a given kind, in sorted order.
+        """
+        return sorted(r for r in self._slots if kind is None or r[0] == kind)
+
+    def get_slots(self, resource):
+        """ Returns the slots occupying a resource, in chronological order.
+        """
+        return list(self._slots.get(resource, []))
+
+    def occupants(self, resource, when):
+        """ Returns the slots occupying a resource at a given time.
+
+        Since slots do not last more than the longest slot duration, only the ones starting in the preceding
+        time window are examined.
+
+        :param tuple resource: the resource (ex: ('table', 2))
+        :param when: the time, as a `datetime.time` or in minutes
+        :returns list: the slots in progress at this time, in chronological order
+        """
+        if isinstance(when, datetime.time):
+            when = self.minutes(when)
+        starts = self._starts.get(resource)
+        if not starts:
+            return []
+        first = bisect.bisect_right(starts, when - self._max_duration)
+        last = bisect.bisect_right(starts, when)
+        return [slot for slot in self._slots[resource][first:last] if slot.end > when]
+
+    def conflicts(self, kind=None):
+        """ Returns the pairs of slots overlapping on the same resource.
+
+        Each resource is swept in chronological order, keeping the slots still in progress, so that the cost is
+        O(n log n) plus the count of conflicts.
+
+        :param str kind: restricts the search to a kind of resource
+        :returns list: the conflicts, ordered by resource and time
+        """
+        result = []
+        for resource in self.resources(kind):
+            in_progress = []
+            for slot in self._slots[resource]:
+                in_progress = [other for other in in_progress if other.end > slot.start]
+                result.extend(self.Conflict(resource, other, slot) for other in in_progress)
+                in_progress.append(slot)
+        return result
+
+
 class Tournament(object):
     """ The global tournament
+
+    Results and ranking computations are cached, and reused as long as the tournament has not been
+    modified (see `version`). Since the rounds maintain their own evaluated points and ranking points,
+    modifying a round only implies recomputing the results of this round and their aggregation.
+
+    Modifications made during the event (scores, teams presence, planning,...) are notified to the registered
+    mutation listeners as records, which are dictionaries containing the name of the operation (`op` entry)
+    and its JSON serializable arguments. Applying these records with `apply_mutation()` on a tournament
+    reproduces the modifications, which is used for persisting them in a journal for instance.
+
+    Modifications made inside a `transaction()` block are notified all at once at the end of the block.
+
+    Read-only copies of the tournament can be obtained with `snapshot()`, for using it outside of the thread
+    modifying it.
     """
     ITEMS_DURATION = (10, 10, 10, 30)
 
@@ -491,7 +1138,7 @@ class Tournament(object):
 
     def __init__(self, robotics_score_types=None):
         self._robotics_score_types = robotics_score_types
-        self._teams = {}
+        self._teams = TeamRegistry()
         self._robotics_rounds = \
             [Round(score_type) for score_type in robotics_score_types] if robotics_score_types \
             else []
@@ -507,6 +1154,190 @@ class Tournament(object):
         ]
         self._start_time = datetime.time.min
 
+        self._stamp = next_stamp()
+        self._cache = {}
+        self._timeline = None
+        self._planning_index = None
+        self._mutation_listeners = []
+        self._transaction_depth = 0
+        self._transaction_records = []
+        self._read_only = False
+
+    @property
+    def read_only(self):
+        """ Tells if the tournament is a snapshot (see `snapshot()`).
+        """
+        return self._read_only
+
+    def snapshot(self, previous=None):
+        """ Returns a read-only copy of the tournament, reflecting its current state.
+
+        Snapshots are never modified, and thus can be used from any thread without locking. The parts of the
+        tournament which have not been modified since a previous snapshot are shared with it instead of being
+        copied : rounds with the same version, and teams if the tournament data stamp has not changed.
+
+        Modifying a snapshot raises a `ReadOnlyError`.
+
+        :param Tournament previous: a previous snapshot of this tournament
+        :rtype: Tournament
+        """
+        def share(round_, previous_round):
+            if previous_round is not None and previous_round.version == round_.version:
+                return previous_round
+            return round_.snapshot()
+
+        if previous is None:
+            previous_rounds = [None] * (len(self._robotics_rounds) + 3)
+        else:
+            previous_rounds = previous._robotics_rounds + [
+                previous._research_evaluations, previous._jury_evaluations, previous._bonus
+            ]
+
+        clone = copy.copy(self)
+        clone._read_only = True
+        clone._cache = {}
+        clone._mutation_listeners = []
+        clone._transaction_depth = 0
+        clone._transaction_records = []
+        clone._planning = list(self._planning)
+
+        rounds = [share(r, p) for r, p in zip(
+            self._robotics_rounds + [self._research_evaluations, self._jury_evaluations, self._bonus],
+            previous_rounds
+        )]
+        clone._robotics_rounds = rounds[:-3]
+        clone._research_evaluations, clone._jury_evaluations, clone._bonus = rounds[-3:]
+
+        if previous is not None and previous._stamp == self._stamp:
+            clone._teams = previous._teams
+        else:
+            clone._teams = self._teams.snapshot()
+        return clone
+
+    def add_mutation_listener(self, listener):
+        """ Registers a callable which will be invoked with the list of mutation records each time the
+        tournament is modified.
+        """
+        self._mutation_listeners.append(listener)
+
+    def remove_mutation_listener(self, listener):
+        self._mutation_listeners.remove(listener)
+
+    @contextmanager
+    def transaction(self):
+        """ Groups the modifications made inside the `with` block, so that they are notified to the
+        mutation listeners as a single list of records when leaving it.
+
+        Transactions can be nested, the notification being done at the end of the outermost one.
+        """
+        self._transaction_depth += 1
+        try:
+            yield self
+        finally:
+            self._transaction_depth -= 1
+            if not self._transaction_depth and self._transaction_records:
+                records, self._transaction_records = self._transaction_records, []
+                self._notify(records)
+
+    def _mutated(self, op, **kwargs):
+        """ Notifies the mutation listeners of a modification.
+
+        :param str op: the name of the operation, which is the one of the tournament method used to perform it
+        :param kwargs: the JSON serializable arguments of the operation
+        """
+        if self._read_only:
+            raise ReadOnlyError('tournament snapshots cannot be modified')
+        if self._mutation_listeners:
+            kwargs['op'] = op
+            if self._transaction_depth:
+                self._transaction_records.append(kwargs)
+            else:
+                self._notify([kwargs])
+
+    def _notify(self, records):
+        for listener in self._mutation_listeners:
+            listener(records)
+
+    def apply_mutation(self, record):
+        """ Applies a mutation record, as notified to the mutation listeners.
+
+        :param dict record: the mutation record
+        :raises ValueError: if the operation is unknown
+        """
+        replay = getattr(self, '_replay_' + record['op'], None)
+        if not replay:
+            raise ValueError('invalid mutation operation (%s)' % record['op'])
+        replay(record)
+
+    def _replay_set_robotics_score(self, record):
+        round_num = record['round']
+        score_type = self.get_robotics_round(round_num).score_type
+        self.set_robotics_score(record['team'], round_num, score_type(**record['score']))
+
+    def _replay_clear_robotics_score(self, record):
+        self.clear_robotics_score(record['team'], record['round'])
+
+    def _replay_set_research_evaluation(self, record):
+        self.set_research_evaluation(record['team'], ResearchEvaluationScore(**record['score']))
+
+    def _replay_clear_research_evaluation(self, record):
+        self.clear_research_evaluation(record['team'])
+
+    def _replay_set_jury_evaluation(self, record):
+        self.set_jury_evaluation(record['team'], JuryEvaluationScore(**record['score']))
+
+    def _replay_clear_jury_evaluation(self, record):
+        self.clear_jury_evaluation(record['team'])
+
+    def _replay_set_team_presence(self, record):
+        self.set_team_presence(record['team'], record['present'])
+
+    def _replay_set_planning(self, record):
+        self.planning = [datetime.datetime.strptime(s, "%H:%M").time() for s in record['planning']]
+
+    def _replay_set_start_time(self, record):
+        self.start_time = datetime.datetime.strptime(record['start_time'], "%H:%M").time()
+
+    def _replay_deserialize_teams(self, record):
+        self.deserialize_teams(record['teams'])
+
+    def _touch(self):
+        """ Records a modification of the tournament data not related to scores.
+        """
+        if self._read_only:
+            raise ReadOnlyError('tournament snapshots cannot be modified')
+        self._stamp = next_stamp()
+
+    @property
+    def version(self):
+        """ The current version of the tournament data.
+
+        It changes each time the tournament is modified, including scores added or cleared directly at
+        the rounds level.
+        """
+        return max(
+            [self._stamp, self._research_evaluations.version, self._jury_evaluations.version, self._bonus.version] +
+            [r.version for r in self._robotics_rounds]
+        )
+
+    def _cached(self, key, compute):
+        """ Returns a computed value from the results cache, or computes it if the cached one is outdated.
+
+        :param str key: the cache key
+        :param callable compute: the function computing the value if needed
+        """
+        version = self.version
+        try:
+            cached_version, value = self._cache[key]
+            if cached_version == version:
+                return value
+        except KeyError:
+            pass
+
+        value = compute()
+        self._cache[key] = (version, value)
+        return value
+
     @property
     def planning(self):
         return self._planning
@@ -514,6 +1345,8 @@ class Tournament(object):
     @planning.setter
     def planning(self, planning):
         self._planning = planning
+        self._touch()
+        self._mutated('set_planning', planning=[t.strftime('%H:%M') for t in planning])
 
     @property
     def start_time(self):
@@ -522,6 +1355,8 @@ class Tournament(object):
     @start_time.setter
     def start_time(self, start_time):
         self._start_time = start_time
+        self._touch()
+        self._mutated('set_start_time', start_time=start_time.strftime('%H:%M'))
 
     def load_teams_info(self, fp):
         fp.seek(0)
@@ -573,6 +1408,8 @@ class Tournament(object):
             elif in_teams:
                 break
 
+        self._touch()
+
     def consolidate_planning(self):
         earliest_start_time = datetime.time.max
         latest_start_times = [datetime.time() for _ in range(4)]
@@ -610,6 +1447,8 @@ class Tournament(object):
             team.planning.presentation.jury = num + 1
             num = (num + 1) % 3
 
+        self._touch()
+
     def add_team(self, team):
         """ Adds a team to participants.
 
@@ -621,18 +1460,18 @@ class Tournament(object):
         :raises DuplicatedTeam: if team already present
         :raises ValueError: if scholar grade is invalid
         """
-        if team.num in self._teams:
-            raise DuplicatedTeam(team)
-
-        self._teams[team.num] = team
+        self._teams.add(team)
 
         # add the fake score reflecting the team grade
         self._bonus.add_team_score(team.num, GradeEvaluationScore(team.grade))
+        self._touch()
 
         return self.team_count(present_only=False)
 
     def deserialize_teams(self, dct):
+        self._mutated('deserialize_teams', teams=dct)
         self._teams.clear()
+        self._touch()
         for num, details in dct.iteritems():
             planning = TeamPlanning(details['planning'])
             team = Team(
@@ -650,23 +1489,26 @@ class Tournament(object):
     def team_count(self, present_only=True):
         """ The teams count.
         """
-        if present_only:
-            return len(self.teams(present_only=True))
-        else:
-            return len(self._teams)
+        return self._teams.count(present_only)
 
     def teams(self, present_only=True):
         """ The team list sorted by team number.
 
         :param boolean present_only: if true the result contains present teams only
         """
-        if present_only:
-            return sorted([t for t in self._teams.itervalues() if t.present], key=lambda t : t.num)
-        else:
-            return sorted(self._teams.itervalues(), key=lambda t : t.num)
+        return self._teams.teams(present_only)
 
     def team_nums(self, present_only=False):
-        return sorted([team.num for team in self.teams(present_only=present_only)])
+        """ The team numbers list, in increasing order.
+
+        :param boolean present_only: if true the result contains present teams only
+        """
+        return self._teams.nums(present_only)
+
+    def has_team(self, team_num):
+        """ Tells if a team number is registered.
+        """
+        return team_num in self._teams
 
     @property
     def registered_teams(self):
@@ -675,8 +1517,51 @@ class Tournament(object):
     def get_team(self, team_num):
         return self._teams[team_num]
 
+    def set_team_presence(self, team_num, present):
+        """ Sets the presence status of a team.
+
+        Since the team count used for ranking points computation depends on the presence of the teams, the
+        presence must be changed using this method rather than directly on the team, so that cached results
+        are invalidated.
+
+        :param int team_num: the team number
+        :param bool present: the presence status
+        """
+        if self._teams.set_presence(team_num, present):
+            self._touch()
+            self._mutated('set_team_presence', team=team_num, present=present)
+
+    def get_timeline(self):
+        """ Returns the appointments index of the present teams (see `Timeline`).
+
+        It is built again only when the teams, their presence or their plannings have changed, which all
+        modify the tournament data stamp (but not the scores changes).
+
+        :rtype: Timeline
+        """
+        if not self._timeline or self._timeline[0] != self._stamp:
+            self._timeline = (self._stamp, Timeline(self.teams(present_only=True)))
+        return self._timeline[1]
+
+    def get_planning_index(self):
+        """ Returns the interval index of the registered teams plannings (see `PlanningIndex`).
+
+        As the timeline, it is built again only when the teams or their plannings have changed.
+
+        :rtype: PlanningIndex
+        """
+        if not self._planning_index or self._planning_index[0] != self._stamp:
+            self._planning_index = (self._stamp, PlanningIndex(self.teams(present_only=False)))
+        return self._planning_index[1]
+
+    def get_planning_conflicts(self):
+        """ Returns the double-booked teams, tables and juries (see `PlanningIndex.conflicts()`).
+        """
+        return self.get_planning_index().conflicts()
+
     def register_abandon(self, team_num):
         self._teams[team_num].abandon = True
+        self._touch()
 
     @property
     def research_evaluations(self):
@@ -686,6 +1571,12 @@ class Tournament(object):
     def jury_evaluations(self):
         return self._jury_evaluations
 
+    @property
+    def bonus(self):
+        """ The pseudo-round holding the grade bonuses of the teams.
+        """
+        return self._bonus
+
     def get_robotics_rounds(self):
         return self._robotics_rounds
 
@@ -703,11 +1594,13 @@ class Tournament(object):
         :param Score score: the score
         """
         assert round_num in range(1, len(self._robotics_rounds) + 1)
-        self._robotics_rounds[round_num - 1].add_team_score(team_num, score)
+        if self._robotics_rounds[round_num - 1].add_team_score(team_num, score):
+            self._mutated('set_robotics_score', team=team_num, round=round_num, score=score.serialize())
 
     def clear_robotics_score(self, team_num, round_num):
         assert round_num in range(1, len(self._robotics_rounds) + 1)
-        self._robotics_rounds[round_num - 1].clear_team_score(team_num)
+        if self._robotics_rounds[round_num - 1].clear_team_score(team_num):
+            self._mutated('clear_robotics_score', team=team_num, round=round_num)
 
     def get_research_evaluation(self, team_num):
         return self._research_evaluations.get_team_score(team_num)
@@ -718,10 +1611,12 @@ class Tournament(object):
         :param int team_num: the team number
         :param Score score: the score
         """
-        self._research_evaluations.add_team_score(team_num, score)
+        if self._research_evaluations.add_team_score(team_num, score):
+            self._mutated('set_research_evaluation', team=team_num, score=score.serialize())
 
     def clear_research_evaluation(self, team_num):
-        self._research_evaluations.clear_team_score(team_num)
+        if self._research_evaluations.clear_team_score(team_num):
+            self._mutated('clear_research_evaluation', team=team_num)
 
     def get_jury_evaluation(self, team_num):
         return self._jury_evaluations.get_team_score(team_num)
@@ -732,10 +1627,12 @@ class Tournament(object):
         :param int team_num: the team number
         :param Score score: the score
         """
-        self._jury_evaluations.add_team_score(team_num, score)
+        if self._jury_evaluations.add_team_score(team_num, score):
+            self._mutated('set_jury_evaluation', team=team_num, score=score.serialize())
 
     def clear_jury_evaluation(self, team_num):
-        self._jury_evaluations.clear_team_score(team_num)
+        if self._jury_evaluations.clear_team_score(team_num):
+            self._mutated('clear_jury_evaluation', team=team_num)
 
     Status = namedtuple('TournamentStatus', 'robotics research jury_eval')
 
@@ -751,24 +1648,44 @@ class Tournament(object):
 
         Each completion status is a tuple with one boolean per team, telling if the relevant round has been completed
         or not.
+
+        The result is computed once per tournament version, using the rounds completion index, and shared by all the
+        callers until the tournament is modified.
         """
-        robotics = []
-        all_team_nums = self.team_nums(present_only=False)
-        for round_num, _round in enumerate(self._robotics_rounds, start=1):
-            teams = _round.get_completed_teams()
-            robotics.append(tuple(n in teams for n in all_team_nums))
-        robotics = tuple(robotics)
+        return self._cached('completion_status', self._compute_completion_status)
 
-        research = tuple(n in self._research_evaluations.get_completed_teams() for n in all_team_nums)
-        jury_evaluation = tuple(n in self._jury_evaluations.get_completed_teams() for n in all_team_nums)
+    def _compute_completion_status(self):
+        all_team_nums = self.team_nums(present_only=False)
+        robotics = tuple(_round.get_completion(all_team_nums) for _round in self._robotics_rounds)
+        research = self._research_evaluations.get_completion(all_team_nums)
+        jury_evaluation = self._jury_evaluations.get_completion(all_team_nums)
 
         return Tournament.Status(robotics, research, jury_evaluation)
 
+    def get_completion_counts(self):
+        """ Returns the count of teams having completed each round, with the same structure as
+        `get_completion_status()`.
+        """
+        return Tournament.Status(
+            tuple(_round.completed_count for _round in self._robotics_rounds),
+            self._research_evaluations.completed_count,
+            self._jury_evaluations.completed_count
+        )
+
+    def is_competing(self, team_num):
+        """ Tells if a team is competing (see `get_competing_teams()`).
+        """
+        return self._research_evaluations.is_completed(team_num) and \
+            any(_round.is_completed(team_num) for _round in self._robotics_rounds)
+
     def get_robotics_results(self):
         """ Returns the consolidated robotics rounds results.
 
          It is returned as a dictionary of RoundScorePoints, keyed by the team number
         """
+        return self._cached('robotics', self._compute_robotics_results)
+
+    def _compute_robotics_results(self):
         total_points = {}
         teams_count = self.team_count(present_only=True)
         for _round in self._robotics_rounds:
@@ -790,26 +1707,32 @@ class Tournament(object):
 
         It is returned as a dictionary of RoundScorePoints, keyed by the team number
         """
-        return self._research_evaluations.get_results(self.team_count(present_only=True))
+        return self._cached(
+            'research', lambda: self._research_evaluations.get_results(self.team_count(present_only=True))
+        )
 
     def get_team_evaluation_results(self):
         """ Returns the team overall evaluation made by the jury.
 
         It is returned as a dictionary of RoundScorePoints, keyed by the team number
         """
-        return self._jury_evaluations.get_results(self.team_count(present_only=True))
+        return self._cached(
+            'jury', lambda: self._jury_evaluations.get_results(self.team_count(present_only=True))
+        )
 
     def get_teams_bonus(self):
         """ Returns the list of teams bonus.
         """
-        return [Grade.bonus_points(team.grade) for team in self._teams.values()]
+        return [Grade.bonus_points(team.grade) for team in self._teams.itervalues()]
 
     def get_team_bonus_results(self):
         """ Returns the team grade bonus as a round result.
 
         It is returned as a dictionary of RoundScorePoints, keyed by the team number
         """
-        return self._bonus.get_results(self.team_count(present_only=True))
+        return self._cached(
+            'bonus', lambda: self._bonus.get_results(self.team_count(present_only=True))
+        )
 
     CompiledScore = namedtuple('CompiledScore', 'rob1 rob2 rob3 research jury')
 
@@ -817,6 +1740,9 @@ class Tournament(object):
         """ Returns the compiled scores for all the present teams as a dictionary keyed by the team number which
           associated value is a CompiledScore named tuple.
         """
+        return self._cached('compiled_scores', self._compute_compiled_scores)
+
+    def _compute_compiled_scores(self):
         wrk = dict()
 
         def get_team_scores(team_num):
@@ -828,15 +1754,15 @@ class Tournament(object):
             return team_scores
 
         for round_num, round in enumerate(self._robotics_rounds, start=1):
-            for team_num, score in round.scores.iteritems():
+            for team_num, points in round.points.iteritems():
                 team_scores = get_team_scores(team_num)
-                team_scores['rob%d' % round_num] = score.evaluate()
-        for team_num, score in self._research_evaluations.scores.iteritems():
+                team_scores['rob%d' % round_num] = points
+        for team_num, points in self._research_evaluations.points.iteritems():
             team_scores = get_team_scores(team_num)
-            team_scores['research'] = score.evaluate()
-        for team_num, score in self._jury_evaluations.scores.iteritems():
+            team_scores['research'] = points
+        for team_num, points in self._jury_evaluations.points.iteritems():
             team_scores = get_team_scores(team_num)
-            team_scores['jury'] = score.evaluate()
+            team_scores['jury'] = points
 
         result = dict()
         for team_num in [team.num for team in self.teams(present_only=True)]:
@@ -861,12 +1787,13 @@ class Tournament(object):
 
         :returns: a list of team nums
         """
-        comp_rob, comp_research, comp_jury = self.get_completion_status()
-        comp_rob = zip(*comp_rob)   # transposes the matrix
+        return self._cached('competing_teams', self._compute_competing_teams)
+
+    def _compute_competing_teams(self):
+        # only teams having presented their research work are candidates
         return [
-            t for t, c in enumerate(
-                [all((any(r), s)) for r, s in zip(comp_rob, comp_research)], start=1
-            ) if c
+            team_num for team_num in self._research_evaluations.get_completed_teams()
+            if team_num in self._teams and any(_round.is_completed(team_num) for _round in self._robotics_rounds)
         ]
 
     def get_final_ranking(self):
@@ -874,8 +1801,14 @@ class Tournament(object):
         corresponding list of team numbers.
 
         Only competing teams are included in the final ranking result.
+
+        The result is computed once per tournament version, and shared by all the callers until the tournament
+        is modified. It thus must not be modified.
         """
-        competing_teams = self.get_competing_teams()
+        return self._cached('final_ranking', self._compute_final_ranking)
+
+    def _compute_final_ranking(self):
+        competing_teams = set(self.get_competing_teams())
 
         robotics = self.get_robotics_results()
         research = self.get_research_evaluation_results()
@@ -891,7 +1824,7 @@ class Tournament(object):
              jury.get(team_num, not_avail).rank * self.WEIGHT_JURY +
              bonus.get(team_num, not_avail).rank * self.WEIGHT_BONUS
              )
-            for team_num, team in self._teams.iteritems() if team_num in competing_teams
+            for team_num in self.team_nums() if team_num in competing_teams
         ], self.team_count(present_only=True))
 
         # rearrange it
@@ -914,7 +1847,7 @@ class Tournament(object):
     def serialize(self):
         d = dict()
 
-        d['teams'] = dict([(team.num, team.serialize()) for team in self._teams.values()])
+        d['teams'] = dict([(team.num, team.serialize()) for team in self._teams.itervalues()])
         d['planning'] = [t.strftime('%H:%M') for t in self._planning]
         d['start_time'] = self._start_time.strftime('%H:%M')
         d['robotics_rounds'] = [r.serialize() for r in self._robotics_rounds]
@@ -922,6 +1855,31 @@ class Tournament(object):
         d['jury_evaluations'] = self._jury_evaluations.serialize()
         return d
 
+    def restore(self, teams, planning, start_time, robotics_rounds, research_evaluations, jury_evaluations):
+        """ Replaces the whole content of the tournament by already built parts.
+
+        Used by the data file loaders which build the teams and the rounds by themselves (see `pjc.datafile`).
+        Contrary to `deserialize()`, no mutation is notified.
+
+        :param list teams: the teams
+        :param list planning: the time limits of the planning items, as `datetime.time` instances
+        :param datetime.time start_time: the start time
+        :param list robotics_rounds: the robotics rounds
+        :param Round research_evaluations: the research evaluations
+        :param Round jury_evaluations: the jury evaluations
+        """
+        self._teams.clear()
+        self._bonus = GradePseudoRound()
+        for team in teams:
+            self._teams.add(team)
+            self._bonus.add_team_score(team.num, GradeEvaluationScore(team.grade))
+        self._planning = list(planning)
+        self._start_time = start_time
+        self._robotics_rounds = list(robotics_rounds)
+        self._research_evaluations = research_evaluations
+        self._jury_evaluations = jury_evaluations
+        self._touch()
+
     def deserialize(self, d):
         self.deserialize_teams(d['teams'])
 
@@ -938,10 +1896,12 @@ class Tournament(object):
                 round_.add_team_score(int(team_num), score)
             self._robotics_rounds.append(round_)
 
+        self._research_evaluations = Round(ResearchEvaluationScore)
         for team_num, score_dict in d['research_evaluations'].iteritems():
             score = ResearchEvaluationScore(**score_dict)
             self._research_evaluations.add_team_score(int(team_num), score)
 
+        self._jury_evaluations = Round(JuryEvaluationScore)
         for team_num, score_dict in d['jury_evaluations'].iteritems():
             score = JuryEvaluationScore(**score_dict)
             self._jury_evaluations.add_team_score(int(team_num), score)
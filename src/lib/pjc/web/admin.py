@@ -4,11 +4,14 @@
 from collections import namedtuple
 from datetime import datetime, timedelta
 import subprocess
+from tornado import gen
 from tornado.web import HTTPError
 
 from pjc.web.ui import UIRequestHandler, PlanningDisplayHandler, ScoresDisplayHandler, \
     RankingDisplayHandler, NextSchedulesDisplayHandler
-from pjc.web.lib import parse_hhmm_time, format_hhmm_time
+from pjc.web.lib import AppRequestHandler, parse_hhmm_time, format_hhmm_time
+from pjc.web.profiler import RequestProfiler
+from pjc import commands
 from pjc.tournament import ResearchEvaluationScore, JuryEvaluationScore
 from pjc.web.tv import get_selectable_displays, SequencedDisplay
 from pjc.current_edition import Round1Score, Round2Score, Round3Score
@@ -69,19 +72,118 @@ class AdminArrivalsReport(AdminUIHandler):
         }
 
 
+class AdminMetricsReport(AdminUIHandler):
+    """ Dashboard of the application metrics (see `pjc.web.metrics`).
+    """
+    @property
+    def template_name(self):
+        return "metrics"
+
+    @property
+    def template_args(self):
+        return {
+            "metrics": self.application.metrics.summary(),
+            "persistence": self.application.persistence_status,
+            "watchdog": self.application.watchdog,
+            "tracer": self.application.tracer,
+        }
+
+
+class AdminStallsReport(AdminUIHandler):
+    """ Log of the last IO loop stalls (see `pjc.web.watchdog`).
+    """
+    @property
+    def template_name(self):
+        return "stalls"
+
+    @property
+    def template_args(self):
+        return {
+            "watchdog": self.application.watchdog,
+        }
+
+
+class AdminProfiler(AdminUIHandler):
+    """ Control of the request profiler (see `pjc.web.profiler`), and display of the last session results.
+    """
+    PROFILED = False
+
+    SORT_KEYS = ('cumulative', 'total')
+
+    @property
+    def template_name(self):
+        return "profiler"
+
+    @property
+    def template_args(self):
+        sort_key = self.get_argument('sort', self.SORT_KEYS[0])
+        if sort_key not in self.SORT_KEYS:
+            raise HTTPError(400, reason='invalid sort key (%s)' % sort_key)
+        profiler = self.application.profiler
+        session = profiler.session
+        return {
+            "profiler": profiler,
+            "session": session,
+            "prefixes": RequestProfiler.PREFIXES,
+            "sort_key": sort_key,
+            "top_functions": session.top_functions(sort_key) if session and session.finished else [],
+        }
+
+    def _get_limit(self, name, convert):
+        value = self.get_argument(name, '').strip()
+        if not value:
+            return None
+        try:
+            value = convert(value)
+        except ValueError:
+            value = 0
+        if value <= 0:
+            raise HTTPError(400, reason='invalid %s (%s)' % (name, self.get_argument(name)))
+        return value
+
+    def post(self):
+        profiler = self.application.profiler
+        if self.get_argument('action') == 'start':
+            prefix = self.get_argument('prefix', '/')
+            if prefix not in RequestProfiler.PREFIXES:
+                raise HTTPError(400, reason='invalid prefix (%s)' % prefix)
+            profiler.start(prefix, self._get_limit('requests', int), self._get_limit('duration', float))
+        else:
+            profiler.stop()
+        self.redirect(self.request.path, status=303)
+
+
+class AdminProfilerStats(AppRequestHandler):
+    """ Download of the last profiling session results, as a `pstats` file.
+    """
+    PROFILED = False
+
+    def get(self):
+        session = self.application.profiler.session
+        if session is None or session.stats is None:
+            raise HTTPError(404, reason='no profiling results available')
+        file_name = datetime.fromtimestamp(session.start_time).strftime('pjc-%Y%m%d-%H%M%S.pstats')
+        self.set_header('Content-Type', 'application/octet-stream')
+        self.set_header('Content-Disposition', 'attachment; filename="%s"' % file_name)
+        self.write(session.dump())
+
+
 class AdminArrivalsEditor(AdminArrivalsReport):
     @property
     def template_name(self):
         return "arrivals_editor"
 
+    @gen.coroutine
     def post(self):
         if self.request.body:
             checked_boxes = [arg.split('=')[0] for arg in self.request.body.split('&')]
             arrived_teams = [int(n.split('_')[1]) for n in checked_boxes]
         else:
             arrived_teams = []
-        for team_num in self.tournament.team_nums():
-            self.tournament.get_team(team_num).present = team_num in arrived_teams
+        yield self.application.execute([
+            commands.set_team_presence(team_num, team_num in arrived_teams)
+            for team_num in self.tournament.team_nums()
+        ])
         self.application.save_tournament()
 
 
@@ -101,11 +203,12 @@ class AdminPlanningEditor(AdminUIHandler):
             )
         )
 
+    @gen.coroutine
     def post(self):
         times = [
             parse_hhmm_time(self.get_argument(name)) for name in self.FORM_FIELDS
         ]
-        self.tournament.planning = times
+        yield self.application.execute([commands.set_planning(times)])
         self.application.save_tournament()
 
 
@@ -225,6 +328,27 @@ class ScoreEditorHandler(AdminUIHandler):
     def post(self):
         raise NotImplementedError()
 
+    @staticmethod
+    def is_changed(round_, team_num, score):
+        """ Tells if a submitted score differs from the stored one, so that only the modified scores are sent to
+        the tournament.
+
+        :param Round round_: the round of the score
+        :param int team_num: the team number
+        :param Score score: the submitted score, or None if cleared
+        """
+        if score is None:
+            return team_num in round_.scores
+        return not round_.scores.holds(team_num, score)
+
+    @gen.coroutine
+    def execute_score_commands(self, score_commands):
+        """ Executes the commands of the modified scores, if any, and saves the tournament.
+        """
+        if score_commands:
+            yield self.application.execute(score_commands)
+            self.application.save_tournament()
+
 
 class AdminRoboticsRoundScoreEditor(ScoreEditorHandler):
     """ Abstract root class for specific robotics round scores editors.
@@ -277,8 +401,10 @@ class AdminRoboticsRoundScoreEditor(ScoreEditorHandler):
             'scores': form_data
         }
 
+    @gen.coroutine
     def post(self):
         round_ = self.tournament.get_robotics_round(self.round_num)
+        score_commands = []
         for team_num in self.tournament.team_nums(present_only=True):
             total_time = MMSS_to_seconds(self.get_argument('total_time_%d' % team_num))
             if total_time:
@@ -287,10 +413,11 @@ class AdminRoboticsRoundScoreEditor(ScoreEditorHandler):
                         for arg in self.score_fields
                 ))
                 score = round_.score_type(total_time=total_time, **kwargs)
-                self.tournament.set_robotics_score(team_num, self.round_num, score)
-            else:
-                self.tournament.clear_robotics_score(team_num, self.round_num)
-        self.application.save_tournament()
+                if self.is_changed(round_, team_num, score):
+                    score_commands.append(commands.set_robotics_score(team_num, self.round_num, score))
+            elif self.is_changed(round_, team_num, None):
+                score_commands.append(commands.clear_robotics_score(team_num, self.round_num))
+        yield self.execute_score_commands(score_commands)
 
 
 @AdminRoboticsRoundScoreEditor.specs(score_data_type=Round1Score, round_num=1)
@@ -312,6 +439,16 @@ class EvaluationScoreEditor(ScoreEditorHandler):
     def get_evaluations(self):
         raise NotImplementedError()
 
+    def set_score_command(self, team_num, score):
+        """ Returns the command setting the evaluation of a team.
+        """
+        raise NotImplementedError()
+
+    def clear_score_command(self, team_num):
+        """ Returns the command clearing the evaluation of a team.
+        """
+        raise NotImplementedError()
+
     @property
     def template_args(self):
         evaluations = self.get_evaluations()
@@ -328,17 +465,20 @@ class EvaluationScoreEditor(ScoreEditorHandler):
             'scores': form_data
         }
 
+    @gen.coroutine
     def post(self):
         evaluations = self.get_evaluations()
-        for team_num in self.tournament.team_nums:
+        score_commands = []
+        for team_num in self.tournament.team_nums(present_only=True):
             score = evaluations.score_type(
                 **dict((
                     (arg, int(self.get_argument('%s_%d' % (arg, team_num))))
                     for arg in self.score_fields
                 ))
             )
-            evaluations.add_team_score(team_num, score)
-        self.application.save_tournament()
+            if self.is_changed(evaluations, team_num, score):
+                score_commands.append(self.set_score_command(team_num, score))
+        yield self.execute_score_commands(score_commands)
 
 
 @ScoreEditorHandler.specs(score_data_type=ResearchEvaluationScore, template_name="scores_editor/research")
@@ -346,11 +486,19 @@ class AdminResearchScoreEditor(EvaluationScoreEditor):
     def get_evaluations(self):
         return self.tournament.research_evaluations
 
+    def set_score_command(self, team_num, score):
+        return commands.set_research_evaluation(team_num, score)
+
+    def clear_score_command(self, team_num):
+        return commands.clear_research_evaluation(team_num)
+
+    @gen.coroutine
     def post(self):
         shown_fld = self.score_fields[0]
         evaluation_fields = self.score_fields[1:]
 
         evaluations = self.get_evaluations()
+        score_commands = []
         for team_num in self.tournament.team_nums(present_only=True):
             shown = self.get_argument('%s_%d' % (shown_fld, team_num), None) is not None
             if shown:
@@ -363,10 +511,11 @@ class AdminResearchScoreEditor(EvaluationScoreEditor):
                         ]
                     )
                 )
-                evaluations.add_team_score(team_num, score)
-            else:
-                evaluations.clear_team_score(team_num)
-        self.application.save_tournament()
+                if self.is_changed(evaluations, team_num, score):
+                    score_commands.append(self.set_score_command(team_num, score))
+            elif self.is_changed(evaluations, team_num, None):
+                score_commands.append(self.clear_score_command(team_num))
+        yield self.execute_score_commands(score_commands)
 
 
 @ScoreEditorHandler.specs(score_data_type=JuryEvaluationScore, template_name="scores_editor/jury")
@@ -374,6 +523,12 @@ class AdminJuryScoreEditor(EvaluationScoreEditor):
     def get_evaluations(self):
         return self.tournament.jury_evaluations
 
+    def set_score_command(self, team_num, score):
+        return commands.set_jury_evaluation(team_num, score)
+
+    def clear_score_command(self, team_num):
+        return commands.clear_jury_evaluation(team_num)
+
 
 handlers = [
     (r"/", AdminHome),
@@ -382,6 +537,10 @@ handlers = [
     (r"/admin/report/scores", AdminScoresReport),
     (r"/admin/report/ranking", AdminRankingReport),
     (r"/admin/report/arrivals", AdminArrivalsReport),
+    (r"/admin/report/metrics", AdminMetricsReport),
+    (r"/admin/report/stalls", AdminStallsReport),
+    (r"/admin/profiler", AdminProfiler),
+    (r"/admin/profiler/stats", AdminProfilerStats),
     (r"/admin/settings/planning", AdminPlanningEditor),
     (r"/admin/settings/tv_display", TVDisplaySettingsEditor),
     (r"/admin/settings/system", SystemSettingsEditor),
@@ -1,19 +1,29 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import datetime
 import httplib
 import json
+import time
 
-from pjc.tournament import ResearchEvaluationScore, JuryEvaluationScore
-from pjc.web.lib import AppRequestHandler, parse_hhmm_time
+from pjc import commands
+from pjc.tournament import ResearchEvaluationScore, JuryEvaluationScore, Timeline, PlanningIndex
+from tornado import gen
+from tornado.web import HTTPError
+
+from pjc.web.lib import AppRequestHandler, parse_hhmm_time, format_hhmm_time
 
 
 __author__ = 'eric'
 
+# identifiers of the planning items, in the planning order
+PLANNING_ITEMS = ('rob1', 'rob2', 'rob3', 'research')
+
 
 class WSHTeams(AppRequestHandler):
+    @gen.coroutine
     def put(self):
-        self.tournament.deserialize_teams(json.loads(self.request.body))
+        yield self.application.execute([commands.deserialize_teams(json.loads(self.request.body))])
         self.application.save_tournament()
 
     def get(self):
@@ -48,11 +58,12 @@ class WSHRoboticsScore(WSHTeamBaseHandler):
         except KeyError:
             self.set_status(httplib.NOT_FOUND, 'Round not found (%d) for team (%d)' % (round_num, team_num))
 
+    @gen.coroutine
     def put(self, team_num, round_num):
         score_data = json.loads(self.request.body)
         score_type = self.tournament.get_robotics_round(round_num).score_type
         score = score_type(**score_data)
-        self.tournament.set_robotics_score(team_num, round_num, score)
+        yield self.application.execute([commands.set_robotics_score(team_num, round_num, score)])
 
         self.application.save_tournament()
 
@@ -66,10 +77,11 @@ class WSHResearchScore(WSHTeamBaseHandler):
         except KeyError:
             self.set_status(httplib.NOT_FOUND, 'Score not found for team (%d)' % team_num)
 
+    @gen.coroutine
     def put(self, team_num):
         score_data = json.loads(self.request.body)
         score = ResearchEvaluationScore(**score_data)
-        self.tournament.set_research_evaluation(team_num, score)
+        yield self.application.execute([commands.set_research_evaluation(team_num, score)])
         self.application.save_tournament()
 
 
@@ -82,38 +94,194 @@ class WSHJuryScore(WSHTeamBaseHandler):
         except KeyError:
             self.set_status(httplib.NOT_FOUND, 'Score not found for team (%d)' % team_num)
 
+    @gen.coroutine
     def put(self, team_num):
         score_data = json.loads(self.request.body)
         score = JuryEvaluationScore(**score_data)
-        self.tournament.set_jury_evaluation(team_num, score)
+        yield self.application.execute([commands.set_jury_evaluation(team_num, score)])
         self.application.save_tournament()
 
 
-class WSHTournamentStatus(AppRequestHandler):
-    def get(self):
+class WSHBulkScoresHandler(AppRequestHandler):
+    """ Base class for handlers updating the scores of several teams at once.
+
+    The request body is a JSON list of entries, each one being a dictionary containing :
+        - team : the team number
+        - score : the score items as a dictionary (see `Score.from_dict()`), or null for clearing the score
+
+    All the entries are checked before modifying anything. If some of them are invalid, the request is rejected
+    as a whole with a "Bad request" status. Otherwise the scores are applied in a single tournament transaction,
+    and the tournament is saved once.
+
+    In both cases, the reply contains the per-team results as a list of dictionaries containing :
+        - team : the team number
+        - status : "set", "cleared", "error", or "valid" for the correct entries of a rejected request
+        - error : the error message (erroneous entries only)
+        - points, rank_points : the points scored in the round and the resulting ranking points (for "set" entries)
+
+    Subclasses must implement `get_round()`, `set_score_command()` and `clear_score_command()`, which receive the
+    path arguments of the request.
+    """
+    def get_round(self, **kwargs):
+        """ Returns the round which scores are updated.
+        """
+        raise NotImplementedError()
+
+    def set_score_command(self, team_num, score, **kwargs):
+        """ Returns the command setting the score of a team (see `pjc.commands`).
+        """
+        raise NotImplementedError()
+
+    def clear_score_command(self, team_num, **kwargs):
+        raise NotImplementedError()
+
+    def _check_entries(self, entries, score_type):
+        """ Checks the request entries, and returns the list of (team_num, score) pairs and the list of
+        per-team results.
+        """
+        updates, results, seen = [], [], set()
+        for entry in entries:
+            team_num = entry.get('team') if isinstance(entry, dict) else None
+            result = {'team': team_num}
+            try:
+                if not isinstance(entry, dict):
+                    raise ValueError('entry must be a dictionary')
+                if not isinstance(team_num, (int, long)) or not self.tournament.has_team(team_num):
+                    raise ValueError('team not found')
+                if team_num in seen:
+                    raise ValueError('duplicated team')
+                seen.add(team_num)
+
+                score_data = entry.get('score')
+                score = score_type.from_dict(score_data) if score_data is not None else None
+            except ValueError as e:
+                result.update(status='error', error=str(e))
+            else:
+                updates.append((team_num, score))
+            results.append(result)
+        return updates, results
+
+    @gen.coroutine
+    def put(self, **kwargs):
+        try:
+            entries = json.loads(self.request.body)
+        except ValueError:
+            raise HTTPError(httplib.BAD_REQUEST, 'invalid JSON content')
+        if not isinstance(entries, list):
+            raise HTTPError(httplib.BAD_REQUEST, 'a list of scores is expected')
+
+        round_ = self.get_round(**kwargs)
+        updates, results = self._check_entries(entries, round_.score_type)
+        if len(updates) != len(entries):
+            for result in results:
+                result.setdefault('status', 'valid')
+            self.set_status(httplib.BAD_REQUEST)
+            self.write({'results': results})
+            return
+
+        yield self.application.execute([
+            self.set_score_command(team_num, score, **kwargs) if score else self.clear_score_command(team_num, **kwargs)
+            for team_num, score in updates
+        ])
+        self.application.save_tournament()
+
+        round_ = self.get_round(**kwargs)
+        points = round_.points
+        rank_points = dict(round_.get_ranking_points(self.tournament.team_count(present_only=True)))
+        for result, (team_num, score) in zip(results, updates):
+            if score:
+                result.update(status='set', points=points[team_num], rank_points=rank_points.get(team_num, 0))
+            else:
+                result.update(status='cleared')
+        self.write({'results': results})
+
+
+class WSHRoboticsScores(WSHBulkScoresHandler):
+    PATH_ARGS = ['round_num']
+
+    def get_round(self, round_num):
+        return self.tournament.get_robotics_round(round_num)
+
+    def set_score_command(self, team_num, score, round_num):
+        return commands.set_robotics_score(team_num, round_num, score)
+
+    def clear_score_command(self, team_num, round_num):
+        return commands.clear_robotics_score(team_num, round_num)
+
+
+class WSHResearchScores(WSHBulkScoresHandler):
+    def get_round(self):
+        return self.tournament.research_evaluations
+
+    def set_score_command(self, team_num, score):
+        return commands.set_research_evaluation(team_num, score)
+
+    def clear_score_command(self, team_num):
+        return commands.clear_research_evaluation(team_num)
+
+
+class WSHJuryScores(WSHBulkScoresHandler):
+    def get_round(self):
+        return self.tournament.jury_evaluations
+
+    def set_score_command(self, team_num, score):
+        return commands.set_jury_evaluation(team_num, score)
+
+    def clear_score_command(self, team_num):
+        return commands.clear_jury_evaluation(team_num)
+
+
+class WSHTournamentDataHandler(AppRequestHandler):
+    """ Base class for handlers returning data computed from the tournament.
+
+    Replies carry an ETag derived from the tournament data tag, which is the same in all the serving processes.
+    Conditional requests are thus answered with a "Not modified" status when the tournament has not changed
+    since the data were sent to the client, whatever the process which sent them, without computing them again.
+
+    Subclasses must implement `get_data()` for providing the reply content.
+    """
+    def get_data(self, *args, **kwargs):
+        """ Returns the reply content, as a dictionary.
+
+        Receives the path arguments of the request.
+        """
+        raise NotImplementedError()
+
+    def get(self, *args, **kwargs):
+        self.set_header('Etag', '"%s"' % self.application.data_tag)
+        if self.check_etag_header():
+            self.set_status(httplib.NOT_MODIFIED)
+            return
+
+        with self.trace.span('get_data', args={'handler': self.__class__.__name__}):
+            data = self.get_data(*args, **kwargs)
+        with self.trace.span('json_encode'):
+            self.write(data)
+        self.finish()
+
+
+class WSHTournamentStatus(WSHTournamentDataHandler):
+    def get_data(self):
         status = self.tournament.get_completion_status()
         sections = ('robotics', 'research', 'jury')
-        self.write({'status': dict(zip(sections, status))})
-        self.finish()
+        return {'status': dict(zip(sections, status))}
 
 
-class WSHRoboticsRoundResults(AppRequestHandler):
+class WSHRoboticsRoundResults(WSHTournamentDataHandler):
     PATH_ARGS = ['round_num']
 
-    def get(self, round_num):
+    def get_data(self, round_num):
         _round = self.tournament.get_robotics_round(round_num)
-        res = _round.get_results()
-        self.write({'results': res})
-        self.finish()
+        res = _round.get_results(self.tournament.team_count(present_only=True))
+        return {'results': res}
 
 
-class WSHSingleResultsHandler(AppRequestHandler):
+class WSHSingleResultsHandler(WSHTournamentDataHandler):
     def _get_results(self):
         raise NotImplementedError()
 
-    def get(self):
-        self.write({'results': self._get_results()})
-        self.finish()
+    def get_data(self):
+        return {'results': self._get_results()}
 
 
 class WSHRoboticsResults(WSHSingleResultsHandler):
@@ -137,22 +305,190 @@ class WSHFinalResults(WSHSingleResultsHandler):
 
 
 class WSHTournament(AppRequestHandler):
+    @gen.coroutine
     def delete(self, *args, **kwargs):
-        self.application.reset_tournament()
+        yield self.application.reset_tournament()
+
+
+class WSHTournamentChanges(AppRequestHandler):
+    """ Long-polling feed of the tournament changes (see `pjc.web.changes.ChangeFeed`).
+
+    The request gives the sequence number of the last event known by the client with the `since` argument, and
+    optionally the maximum wait time (in seconds) with the `timeout` one. The reply is sent as soon as events
+    following the given one are available, or when the timeout is reached.
+
+    It contains the list of events, the sequence number to be used for the next request, and a flag telling
+    if some events have been lost, in which case the client should get the full data again.
+    """
+    DEFAULT_TIMEOUT = 30
+    MAX_TIMEOUT = 120
+
+    # waiting requests would keep the profiler enabled for the whole wait
+    PROFILED = False
+
+    @gen.coroutine
+    def get(self):
+        try:
+            since = int(self.get_argument('since', '0'))
+            timeout = min(float(self.get_argument('timeout', self.DEFAULT_TIMEOUT)), self.MAX_TIMEOUT)
+        except ValueError:
+            raise HTTPError(httplib.BAD_REQUEST, 'invalid argument')
+
+        feed = self.application.change_feed
+        events, lost = yield feed.wait_events(since, timeout)
+        self.write({
+            'seq': feed.seq,
+            'lost': lost,
+            'events': events,
+        })
 
 
 class WSHPlanning(AppRequestHandler):
+    @gen.coroutine
     def put(self):
         data = json.loads(self.request.body)
-        self.tournament.planning = [
+        yield self.application.execute([commands.set_planning([
             parse_hhmm_time(hhmm) for hhmm in data
-        ]
+        ])])
         self.application.save_tournament()
 
     def get(self):
         self.write(json.dumps([t.strftime("%H:%M") for t in self.tournament.planning]))
 
 
+class WSHNextSchedules(AppRequestHandler):
+    """ Next appointments of the present teams, grouped by time slot.
+
+    The reference time is the current one, unless provided as "HH:MM" with the `time` argument. The `count`
+    argument limits the result to the given count of appointments, the last slot being completed if needed.
+    """
+    def get(self):
+        try:
+            now = self.get_argument('time', None)
+            now = parse_hhmm_time(now) if now else datetime.datetime.now().time()
+            count = self.get_argument('count', None)
+            count = int(count) if count else None
+        except ValueError:
+            raise HTTPError(httplib.BAD_REQUEST, 'invalid argument')
+
+        timeline = self.tournament.get_timeline()
+        appointments = timeline.next_appointments(now, count=count, complete_slot=True)
+        slots = []
+        for slot_time, slot_appointments in Timeline.group_by_slot(appointments):
+            slots.append({
+                'time': format_hhmm_time(slot_time),
+                'appointments': [
+                    {
+                        'team': team_num,
+                        'item': PLANNING_ITEMS[item],
+                        'location': self._get_location(team_num, item),
+                    }
+                    for _, team_num, item in slot_appointments
+                ]
+            })
+        self.write({'slots': slots})
+        self.finish()
+
+    def _get_location(self, team_num, item):
+        """ Returns the table of a match or the jury of the presentation, or None if not yet assigned.
+        """
+        entry = self.tournament.get_team(team_num).planning[item]
+        return entry.table if item < 3 else entry.jury
+
+
+def _planning_slot_as_dict(slot):
+    return {
+        'team': slot.team_num,
+        'item': PLANNING_ITEMS[slot.item],
+        'start': '%02d:%02d' % divmod(slot.start, 60),
+        'end': '%02d:%02d' % divmod(slot.end, 60),
+    }
+
+
+class WSHPlanningOccupancy(AppRequestHandler):
+    """ Slots occupying a team, a table or a jury at a given time (the current one if not provided as "HH:MM"
+    with the `time` argument).
+    """
+    def get(self, kind, num):
+        try:
+            when = self.get_argument('time', None)
+            when = parse_hhmm_time(when) if when else datetime.datetime.now().time()
+        except ValueError:
+            raise HTTPError(httplib.BAD_REQUEST, 'invalid argument')
+
+        slots = self.tournament.get_planning_index().occupants((kind, int(num)), when)
+        self.write({'slots': [_planning_slot_as_dict(slot) for slot in slots]})
+        self.finish()
+
+
+class WSHPlanningConflicts(AppRequestHandler):
+    """ Overlapping slots of the teams, tables and juries, optionally restricted to a kind of resource with
+    the `kind` argument.
+    """
+    def get(self):
+        kind = self.get_argument('kind', None)
+        if kind is not None and kind not in PlanningIndex.RESOURCE_KINDS:
+            raise HTTPError(httplib.BAD_REQUEST, 'invalid argument')
+
+        conflicts = self.tournament.get_planning_index().conflicts(kind)
+        self.write({
+            'conflicts': [
+                {
+                    'kind': conflict.resource[0],
+                    'num': conflict.resource[1],
+                    'slots': [_planning_slot_as_dict(conflict.first), _planning_slot_as_dict(conflict.second)],
+                }
+                for conflict in conflicts
+            ]
+        })
+        self.finish()
+
+
+class WSHPersistenceStatus(AppRequestHandler):
+    def get(self):
+        self.write({'persistence': self.application.persistence_status})
+        self.finish()
+
+
+class WSHRenderCacheStatus(AppRequestHandler):
+    def get(self):
+        self.write({'render_cache': self.application.render_cache_stats})
+        self.finish()
+
+
+class WSHMetrics(AppRequestHandler):
+    """ Exports the application metrics in the Prometheus text format.
+    """
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.write(self.application.metrics.render_prometheus())
+        self.finish()
+
+
+class WSHTrace(AppRequestHandler):
+    """ Access to the requests processing traces (see `pjc.web.tracing`).
+
+    The recorded spans are returned in the Chrome trace event format, to be loaded in chrome://tracing or
+    Perfetto. The sampling rate can be changed with a PUT request (``{"sampling": 0.1}``), and the recorded spans
+    are cleared with a DELETE one.
+    """
+    def get(self):
+        file_name = time.strftime('pjc-trace-%Y%m%d-%H%M%S.json')
+        self.set_header('Content-Type', 'application/json; charset=UTF-8')
+        self.set_header('Content-Disposition', 'attachment; filename="%s"' % file_name)
+        self.write(json.dumps(self.application.tracer.export()))
+
+    def put(self):
+        try:
+            self.application.tracer.sample_rate = json.loads(self.request.body)['sampling']
+        except (ValueError, KeyError, TypeError):
+            raise HTTPError(httplib.BAD_REQUEST, 'invalid sampling rate')
+        self.write({'sampling': self.application.tracer.sample_rate})
+
+    def delete(self):
+        self.application.tracer.clear()
+
+
 class WSHDisplaySequence(AppRequestHandler):
     def put(self):
         self.application.display_sequence = json.loads(self.request.body)
@@ -163,17 +499,28 @@ class WSHDisplaySequence(AppRequestHandler):
 
 handlers = [
     (r"/api/tv/sequence", WSHDisplaySequence),
+    (r"/api/tv/render_cache", WSHRenderCacheStatus),
+    (r"/api/metrics", WSHMetrics),
+    (r"/api/trace", WSHTrace),
     (r"/api/tournament/teams", WSHTeams),
-    (r"/api/tournament/team/(?P<team_num>\d)+/rob/(?P<round_num>\d)+", WSHRoboticsScore),
-    (r"/api/tournament/team/(?P<team_num>\d)+/research", WSHResearchScore),
-    (r"/api/tournament/team/(?P<team_num>\d)+/jury", WSHJuryScore),
-    (r"/api/tournament/team/(?P<team_num>\d)+", WSHTeam),
-    (r"/api/tournament/results/rob/(?P<round_num>\d)+", WSHRoboticsRoundResults),
+    (r"/api/tournament/team/(?P<team_num>\d+)/rob/(?P<round_num>\d+)", WSHRoboticsScore),
+    (r"/api/tournament/team/(?P<team_num>\d+)/research", WSHResearchScore),
+    (r"/api/tournament/team/(?P<team_num>\d+)/jury", WSHJuryScore),
+    (r"/api/tournament/team/(?P<team_num>\d+)", WSHTeam),
+    (r"/api/tournament/rob/(?P<round_num>\d+)/scores", WSHRoboticsScores),
+    (r"/api/tournament/research/scores", WSHResearchScores),
+    (r"/api/tournament/jury/scores", WSHJuryScores),
+    (r"/api/tournament/results/rob/(?P<round_num>\d+)", WSHRoboticsRoundResults),
     (r"/api/tournament/results/rob", WSHRoboticsResults),
     (r"/api/tournament/results/research", WSHResearchResults),
     (r"/api/tournament/results/jury", WSHJuryResults),
     (r"/api/tournament/results", WSHFinalResults),
     (r"/api/tournament/status", WSHTournamentStatus),
+    (r"/api/tournament/changes", WSHTournamentChanges),
     (r"/api/tournament/planning", WSHPlanning),
+    (r"/api/tournament/planning/(?P<kind>team|table|jury)/(?P<num>\d+)", WSHPlanningOccupancy),
+    (r"/api/tournament/planning/conflicts", WSHPlanningConflicts),
+    (r"/api/tournament/next_schedules", WSHNextSchedules),
+    (r"/api/tournament/persistence", WSHPersistenceStatus),
     (r"/api/tournament[/]?", WSHTournament),
 ]
\ No newline at end of file
@@ -3,15 +3,33 @@
 import json
 import logging
 import os
+import sys
 import threading
 import signal
+import time
 
+import tornado.httpserver
 import tornado.ioloop
+import tornado.netutil
+import tornado.process
 import tornado.web
+from tornado.concurrent import Future
 
+from pjc import datafile
 from pjc.current_edition import Round1Score, Round2Score, Round3Score
 from pjc.tournament import Tournament
-from pjc.web import admin, api, tv, uimodules
+from pjc.database import TournamentDatabase
+from pjc.journal import Journal
+from pjc.web import admin, api, logqueue, tv, uimodules
+from pjc.web.changes import ChangeFeed
+from pjc.web.lib import LRUCache
+from pjc.web.metrics import Metrics
+from pjc.web.persistence import SnapshotWriter
+from pjc.web.profiler import RequestProfiler
+from pjc.web.replication import ReplicationServer, ReplicaClient
+from pjc.web.tracing import Tracer, NULL_TRACE
+from pjc.web.watchdog import StallWatchdog
+from pjc.web.writer import TournamentWriter
 
 __author__ = 'Eric Pascual'
 
@@ -20,8 +38,30 @@ class PJCWebApp(tornado.web.Application):
     """ The Web application
     """
     TOURNAMENT_DATA_FILE = 'tournament.dat'
+    TOURNAMENT_JOURNAL_FILE = 'tournament.journal'
+    TOURNAMENT_DATABASE_FILE = 'tournament.db'
     VERSION_FILE = 'version.txt'
 
+    # tournament storage modes :
+    # - json : the whole tournament is saved in the data file each time it is modified
+    # - journal : modifications are appended to a journal, and the data file is rewritten only to compact it
+    # - sqlite : the tournament is stored in a SQLite database, which rows are updated as modifications are done
+    STORAGE_JSON, STORAGE_JOURNAL, STORAGE_SQLITE = 'json', 'journal', 'sqlite'
+    STORAGE_MODES = (STORAGE_JSON, STORAGE_JOURNAL, STORAGE_SQLITE)
+
+    # formats of the tournament data file (see `pjc.datafile`) :
+    # - binary : compact binary form, loaded lazily (the JSON form is used if the tournament cannot be stored in it)
+    # - json : JSON form, as produced by `Tournament.serialize()`
+    # Both are read whatever the configured one.
+    DATA_FORMAT_BINARY, DATA_FORMAT_JSON = 'binary', 'json'
+    DATA_FORMATS = (DATA_FORMAT_BINARY, DATA_FORMAT_JSON)
+
+    # default count of journal records triggering a compaction
+    JOURNAL_COMPACTION_THRESHOLD = 500
+
+    # default delay (in seconds) during which save requests are coalesced
+    SAVE_DELAY = 1.0
+
     TEAMS_DATA_FILE = 'teams.csv'
     PLANNING_DATA_FILE = 'planning.csv'
 
@@ -30,6 +70,31 @@ class PJCWebApp(tornado.web.Application):
     # how many teams per TV display page
     TV_PAGE_SIZE = 10
 
+    # default maximum count of rendered TV display pages kept in cache
+    RENDER_CACHE_SIZE = 64
+
+    # default count of events kept by the tournament change feed
+    CHANGE_FEED_SIZE = 1000
+
+    # TV displays which content depends on the current time, in addition to the tournament data
+    TIME_DEPENDENT_DISPLAYS = ('planning', 'next_schedules')
+
+    # roles of the process in the multi-process serving mode (see `pjc.web.replication`) :
+    # - single : the only process (the default)
+    # - writer : the process owning the tournament, applying and saving its modifications
+    # - replica : a process serving requests from a copy of the tournament, and forwarding modifications
+    ROLE_SINGLE, ROLE_WRITER, ROLE_REPLICA = 'single', 'writer', 'replica'
+    ROLES = (ROLE_SINGLE, ROLE_WRITER, ROLE_REPLICA)
+
+    # the Unix socket connecting the processes, in the data home
+    REPLICATION_SOCKET = 'replication.sock'
+
+    # period (in seconds) of the check done by the worker processes for terminating with their parent
+    PARENT_CHECK_PERIOD = 1.0
+
+    # the logger of the TV displays sequencing, which is very chatty in debug mode
+    SEQUENCING_LOG_NAME = 'PJCWebApp.sequencing'
+
     _data_home = None
 
     class WSHHelp(tornado.web.RequestHandler):
@@ -45,6 +110,7 @@ class PJCWebApp(tornado.web.Application):
     def __init__(self, root, settings_override):
         self.log = logging.getLogger(self.__class__.__name__)
         self.log.setLevel(logging.INFO)
+        self.sequencing_log = logging.getLogger(self.SEQUENCING_LOG_NAME)
 
         self.log.info('starting')
 
@@ -86,7 +152,7 @@ class PJCWebApp(tornado.web.Application):
             self._version = self._get_version()
             self.log.info('version: %s', self._version)
 
-            checker_path = os.path.join(self._data_home, '$$tmp')
+            checker_path = os.path.join(self._data_home, '$$tmp.%d' % os.getpid())
             try:
                 with file(checker_path, 'wt') as fp:
                     fp.write('test')
@@ -103,9 +169,79 @@ class PJCWebApp(tornado.web.Application):
         self._display_sequence = json.loads(settings['display_sequence'])
         self._client_sequences = {}
         self._tv_message = None
+        self._tv_message_version = 0
+        self._render_cache = LRUCache(settings.get('render_cache_size', self.RENDER_CACHE_SIZE))
+        self._tv_channels = set()
+        self._tv_refresh_scheduled = False
+
+        self._metrics = Metrics()
+        self._metrics.set_tv_channel_counter(lambda: len(self._tv_channels))
+
+        # the IO loop stall detection is disabled with a null threshold
+        stall_threshold = settings.get('stall_threshold', StallWatchdog.THRESHOLD)
+        self._watchdog = StallWatchdog(stall_threshold) if stall_threshold > 0 else None
+        if self._watchdog:
+            self._metrics.set_stall_counter(lambda: self._watchdog.stall_count)
+
+        log_handler = logqueue.installed_handler()
+        if log_handler:
+            self._metrics.set_log_drop_counter(lambda: (log_handler.dropped, log_handler.rate_limited))
+
+        self._profiler = RequestProfiler()
+        self._tracer = Tracer(settings.get('trace_sampling', 0.0))
+
+        self._storage = settings.get('storage', self.STORAGE_JSON)
+        if self._storage not in self.STORAGE_MODES:
+            raise ValueError('invalid storage mode (%s)' % self._storage)
+        self.log.info("storage mode: %s", self._storage)
+        self._journal_compaction = settings.get('journal_compaction', self.JOURNAL_COMPACTION_THRESHOLD)
+        self._journal = None
+        self._database = None
+        data_format = settings.get('data_format', self.DATA_FORMAT_BINARY)
+        if data_format not in self.DATA_FORMATS:
+            raise ValueError('invalid data format (%s)' % data_format)
+        self._snapshot_writer = SnapshotWriter(
+            self._tournament_file_path, delay=settings.get('save_delay', self.SAVE_DELAY),
+            encode=datafile.dump if data_format == self.DATA_FORMAT_BINARY else datafile.dump_json,
+            on_written=lambda duration, size: self._metrics.observe_persistence('datafile', duration, size),
+            tracer=self._tracer
+        )
+
+        self._role = settings.get('role', self.ROLE_SINGLE)
+        if self._role not in self.ROLES:
+            raise ValueError('invalid process role (%s)' % self._role)
+        self._replication = self._replica = None
 
         self._tournament = Tournament(self.ROBOTICS_ROUND_TYPES)
 
+        if self._role == self.ROLE_REPLICA:
+            # the tournament is received from the writer process, which is in charge of its persistence
+            self._replica = ReplicaClient(self, self._replication_socket_path)
+        else:
+            self._load_or_initialize_tournament()
+
+        # identifies the tournament data instance, the change feed sequence numbers being meaningful only inside
+        # it (see `data_tag`). Replicas get the one of the writer process.
+        self._data_epoch = self._new_data_epoch()
+
+        self._tournament.add_mutation_listener(self._schedule_tv_refresh)
+        self._change_feed = ChangeFeed(self._tournament, settings.get('change_feed_size', self.CHANGE_FEED_SIZE))
+
+        if self._role == self.ROLE_WRITER:
+            self._replication = ReplicationServer(self, self._replication_socket_path)
+            self._tournament.add_mutation_listener(self._replication.broadcast_mutations)
+
+        # from now on, the tournament is modified by the writer only, and the other parts of the application
+        # use the snapshots it publishes
+        self._writer = TournamentWriter(self._tournament)
+
+        super(PJCWebApp, self).__init__(self._handlers, **settings)
+
+    def _load_or_initialize_tournament(self):
+        if self._storage == self.STORAGE_SQLITE:
+            self._open_database()
+            return
+
         # try to load a previously saved tournament if any, or create a new one otherwise
         # (we check first that it is not from an older version of the event, based on the
         # teams file)
@@ -122,7 +258,8 @@ class PJCWebApp(tornado.web.Application):
             self._initialize_tournament(self._tournament)
         self.log.info('tournament data initialized')
 
-        super(PJCWebApp, self).__init__(self._handlers, **settings)
+        if self._storage == self.STORAGE_JOURNAL:
+            self._open_journal()
 
     @property
     def version(self):
@@ -163,8 +300,10 @@ class PJCWebApp(tornado.web.Application):
 
             self.log.info('... initialization complete')
 
-            self.save_tournament()
-
+            if self._database:
+                self._database.save(tournament)
+            else:
+                self._snapshot_writer.save_now(tournament)
 
         else:
             self.log.warn('no planning file found in %s' % self._data_home)
@@ -173,38 +312,169 @@ class PJCWebApp(tornado.web.Application):
     def _tournament_file_path(self):
         return os.path.join(self._data_home, self.TOURNAMENT_DATA_FILE)
 
+    @property
+    def _journal_file_path(self):
+        return os.path.join(self._data_home, self.TOURNAMENT_JOURNAL_FILE)
+
+    @property
+    def _database_file_path(self):
+        return os.path.join(self._data_home, self.TOURNAMENT_DATABASE_FILE)
+
+    @property
+    def _replication_socket_path(self):
+        return os.path.join(self._data_home, self.REPLICATION_SOCKET)
+
+    @property
+    def role(self):
+        return self._role
+
     def _load_tournament(self, tournament, silent=False):
         teams_file = os.path.join(self._data_home, self.TEAMS_DATA_FILE)
         team_file_mtime = os.stat(teams_file).st_mtime
 
         self.log.info('loading tournament from %s', self._tournament_file_path)
-        with file(self._tournament_file_path, 'rb') as fp:
-            tournament.deserialize(json.load(fp))
+        start = time.time()
+        binary = datafile.load(self._tournament_file_path, tournament)
+        self.log.info('... %s data file loaded in %.3fs', 'binary' if binary else 'JSON', time.time() - start)
+        self._snapshot_writer.mark_saved(tournament.version)
+
+        if self._storage == self.STORAGE_JOURNAL:
+            Journal(self._journal_file_path).replay(tournament)
+
+    def _open_journal(self):
+        """ Starts journaling the tournament modifications.
+
+        The journal content has been replayed when loading the tournament, so we start with a fresh
+        snapshot (if the tournament is initialized) and an empty journal.
+        """
+        self._journal = Journal(self._journal_file_path)
+
+        # the journal is rotated when a snapshot content is captured, and the records it contained are
+        # discarded once the snapshot is written
+        self._snapshot_writer.on_capture = self._journal.rotate
+        self._snapshot_writer.on_saved = self._journal.discard_rotated
+
+        if os.path.exists(self._tournament_file_path):
+            self._snapshot_writer.save_now(self._tournament)
+        else:
+            self._journal.reset()
+        self._tournament.add_mutation_listener(self._metrics.timed_persistence(
+            'journal', self._tracer.traced('journal.append', self._journal.append)
+        ))
+
+    def _open_database(self):
+        """ Loads the tournament from the database (sqlite storage mode), and starts storing its modifications.
+
+        If the database does not exist yet, it is created from the tournament data file if any (migration of a
+        tournament started with another storage mode), or with a new tournament otherwise.
+        """
+        self._database = TournamentDatabase(self._database_file_path, self.ROBOTICS_ROUND_TYPES)
+        teams_file = os.path.join(self._data_home, self.TEAMS_DATA_FILE)
+
+        if not self._database.is_empty():
+            if os.path.exists(teams_file) and os.stat(teams_file).st_mtime > self._database.mtime:
+                self.log.warn('found a tournament database, but is older than teams => creating a new one')
+                self._initialize_tournament(self._tournament)
+            else:
+                self.log.info('loading tournament from %s', self._database_file_path)
+                self._database.load(self._tournament)
+        elif os.path.exists(self._tournament_file_path):
+            self.log.info('migrating tournament data file to %s', self._database_file_path)
+            self._load_tournament(self._tournament)
+            self._database.save(self._tournament)
+        else:
+            self.log.warn('... no previous tournament data found => creating a new one')
+            self._initialize_tournament(self._tournament)
+        self.log.info('tournament data initialized')
+
+        self._tournament.add_mutation_listener(self._metrics.timed_persistence(
+            'database', self._tracer.traced('database.apply', self._database.apply)
+        ))
 
     def save_tournament(self):
         """ Saves the tournament to disk.
+
+        The data file is written in the background, and the save requests issued within the save delay are
+        coalesced into a single write.
+
+        In journal storage mode, modifications have already been journaled when performed, and the data file
+        is rewritten only when the journal needs to be compacted.
+
+        In sqlite storage mode and in replica processes, there is nothing to do : modifications have already been
+        stored in the database when performed, or are saved by the writer process.
         """
-        with file(self._tournament_file_path, 'wb') as fp:
-            json.dump(self._tournament.serialize(), fp, indent=4)
-            self.log.info('tournament saved to %s' % self._tournament_file_path)
+        if self._role == self.ROLE_REPLICA or self._database:
+            return
+        if self._journal is None:
+            self._snapshot_writer.save(self._get_snapshot)
+        elif self._journal.record_count >= self._journal_compaction:
+            self.log.info('compacting journal (%d records)', self._journal.record_count)
+            self._snapshot_writer.save(self._get_snapshot)
+
+    @property
+    def persistence_status(self):
+        """ The persistence status of the tournament, as a dictionary containing :
+
+            - storage : the storage mode
+            - version : the current version of the tournament
+            - saved_version : the version of the tournament contained in the data file
+            - dirty : True if some modifications are not saved to disk yet
+            - last_save : the time of the last data file write (as a timestamp), or None if not written yet
+            - role : the role of the process (see `ROLES`)
+
+        Replica processes do not know the persistence status, and report no saved version.
+        """
+        version = self._tournament.version
+        saved_version = self._snapshot_writer.saved_version
+        if self._role == self.ROLE_REPLICA:
+            dirty = False
+        elif self._database:
+            # modifications are synchronously stored
+            saved_version, dirty = version, False
+        elif self._journal is None:
+            dirty = self._snapshot_writer.pending or saved_version != version
+        else:
+            # modifications are synchronously journaled
+            dirty = False
+        return {
+            'storage': self._storage,
+            'version': version,
+            'saved_version': saved_version,
+            'dirty': dirty,
+            'last_save': self._snapshot_writer.last_save_time,
+            'role': self._role,
+        }
 
     def reset_tournament(self):
         """ Deletes the saved tournament and restarts with a new one
+
+        :returns Future: resolved once done
         """
+        if self._replica:
+            return self._replica.reset_tournament()
+
         try:
             os.remove(self.TOURNAMENT_DATA_FILE)
         except OSError:
             pass
         self._initialize_tournament(self._tournament)
+        self._data_epoch = self._new_data_epoch()
+        self._writer.publish()
+        if self._replication:
+            self._replication.broadcast_state()
         self.log.info('tournament cleared')
 
+        future = Future()
+        future.set_result(None)
+        return future
+
     def client_is_known(self, client):
         return client in self._client_sequences
 
     def get_client_sequence(self, client):
         with self._lock:
             if self.debug:
-                self.log.debug('sequences=%s', self._client_sequences)
+                self.sequencing_log.debug('sequences=%s', self._client_sequences)
             key = str(client)
             try:
                 sequence = self._client_sequences[key]
@@ -215,12 +485,44 @@ class PJCWebApp(tornado.web.Application):
                 self._client_sequences[key] = sequence
         return sequence
 
+    def next_tv_display(self, client, current_display, current_page, trace=NULL_TRACE):
+        """ Returns the display and the page to be shown next by a polling TV client (see `pjc.web.tv.TVContent`).
+
+        Replica processes forward the request to the writer process, so that the successive requests of a client
+        follow the same sequence whatever the process serving them.
+
+        :param str client: the client identification
+        :param str current_display: the name of the display currently shown by the client, if any
+        :param int current_page: the page of the display currently shown by the client
+        :param Trace trace: the trace of the request (see `pjc.web.tracing`)
+        :returns Future: resolved with a (known, next display) tuple. `known` tells if the client was known, the
+        current display reported by an unknown one (after a restart of the server) being ignored. The next display
+        is a (display name, page number) tuple, or None if the display sequence is empty.
+        """
+        if self._replica:
+            return self._replica.next_tv_display(client, current_display, current_page)
+
+        future = Future()
+        try:
+            known = self.client_is_known(client)
+            if not known:
+                current_display, current_page = None, 0
+            next_ = tv.SequencedDisplay.sequence_next_display(self, client, current_display, current_page, trace)
+            future.set_result((known, next_))
+        except Exception:
+            future.set_exc_info(sys.exc_info())
+        return future
+
     @property
     def display_sequence(self):
         return self._display_sequence
 
     @display_sequence.setter
     def display_sequence(self, sequence):
+        self._set_display_sequence(sequence)
+        self._share_settings()
+
+    def _set_display_sequence(self, sequence):
         with self._lock:
             self._display_sequence = sequence[:]
             self.log.info("display sequence changed to : %s", self._display_sequence)
@@ -244,37 +546,299 @@ class PJCWebApp(tornado.web.Application):
 
     @tv_message.setter
     def tv_message(self, msg):
-        self._tv_message = msg
+        if self._set_tv_message(msg):
+            self._share_settings()
 
     @tv_message.deleter
     def tv_message(self):
-        self._tv_message = None
+        if self._set_tv_message(None):
+            self._share_settings()
+
+    def _set_tv_message(self, msg):
+        if msg == self._tv_message:
+            return False
+        self._tv_message = msg
+        self._tv_message_version += 1
+        self._schedule_tv_refresh()
+        return True
+
+    @property
+    def shared_settings(self):
+        """ The settings shared by the processes in the multi-process serving mode, as a JSON serializable
+        dictionary.
+        """
+        return {
+            'tv_message': self._tv_message,
+            'display_sequence': self._display_sequence,
+        }
+
+    def apply_shared_settings(self, settings):
+        """ Applies the shared settings received from another process.
+        """
+        tv_message = settings['tv_message']
+        self._set_tv_message(tuple(tv_message) if tv_message else None)
+        if settings['display_sequence'] != self._display_sequence:
+            self._set_display_sequence(settings['display_sequence'])
+
+    def _share_settings(self):
+        if self._replication:
+            self._replication.broadcast_settings()
+        elif self._replica:
+            self._replica.send_settings(self.shared_settings)
+
+    @property
+    def display_data_version(self):
+        """ The version of the data shown by TV displays, changing each time the tournament or the TV message
+        are modified.
+        """
+        return self.tournament.version, self._tv_message_version
+
+    def get_rendered_display(self, display_name, page_num, render):
+        """ Returns the rendered content of a TV display page, shared by all the clients showing it.
+
+        Rendered pages are cached, based on the display data version. Pages of time dependent displays
+        are rendered again each minute.
+
+        :param str display_name: the name of the display
+        :param int page_num: the page number
+        :param callable render: the callable invoked with the display name and the page number for rendering
+        the page when not available in cache
+        :returns: the rendered content
+        """
+        key = (display_name, page_num, self.display_data_version)
+        if display_name in self.TIME_DEPENDENT_DISPLAYS:
+            key += (int(time.time() // 60),)
+        return self._render_cache.get(key, lambda: render(display_name, page_num))
+
+    @property
+    def render_cache_stats(self):
+        return self._render_cache.stats
+
+    def register_tv_channel(self, channel):
+        """ Registers a TV display push channel (see `pjc.web.tv.TVChannel`).
+        """
+        self._tv_channels.add(channel)
+        self.log.info('TV channel opened for %s (%d channel(s))', channel.client, len(self._tv_channels))
+
+    def unregister_tv_channel(self, channel):
+        self._tv_channels.discard(channel)
+        self.log.info('TV channel closed for %s (%d channel(s))', channel.client, len(self._tv_channels))
+
+    def _schedule_tv_refresh(self, *args):
+        """ Schedules the refresh of the displays shown by TV push channels.
+
+        The refresh is done once the current request processing is complete, so that all the modifications
+        it made are taken in account at once. Extra arguments are ignored, so that this method can be used as
+        a tournament mutation listener.
+        """
+        if self._tv_channels and not self._tv_refresh_scheduled:
+            self._tv_refresh_scheduled = True
+            tornado.ioloop.IOLoop.current().add_callback(self._refresh_tv_channels)
+
+    def _refresh_tv_channels(self):
+        self._tv_refresh_scheduled = False
+        for channel in list(self._tv_channels):
+            try:
+                channel.refresh()
+            except Exception:
+                self.log.exception('cannot refresh TV channel of %s', channel.client)
 
     @property
     def tournament(self):
-        return self._tournament
+        """ The current snapshot of the tournament.
+
+        It is read-only : modifications must be done with `execute()`.
+        """
+        return self._writer.snapshot
+
+    def _get_snapshot(self):
+        return self._writer.snapshot
+
+    @property
+    def writer(self):
+        return self._writer
 
-    def start(self, port=8080):
+    def execute(self, commands):
+        """ Applies a list of tournament modification commands (see `pjc.commands`).
+
+        Replica processes forward the commands to the writer process, the modifications being thus applied
+        asynchronously.
+
+        :returns Future: resolved with the resulting tournament snapshot
+        """
+        if self._replica:
+            return self._replica.execute(commands)
+
+        future = Future()
+        try:
+            future.set_result(self._writer.execute(commands))
+        except Exception:
+            future.set_exc_info(sys.exc_info())
+        return future
+
+    def load_replicated_state(self, data, epoch, seq, settings):
+        """ Replaces the tournament of a replica process by the one received from the writer process.
+
+        :param dict data: the serialized tournament
+        :param str epoch: the data epoch of the writer (see `data_tag`)
+        :param int seq: the sequence number of the writer change feed
+        :param dict settings: the shared settings
+        """
+        self._tournament.deserialize(data)
+        self._data_epoch = epoch
+        self._writer.publish()
+        self._change_feed.reset(seq)
+        self.apply_shared_settings(settings)
+        self.log.info('tournament received from writer')
+
+    def apply_replicated_mutations(self, records):
+        """ Applies to the tournament of a replica process the mutations done by the writer process.
+        """
+        self._writer.execute(records)
+
+    @property
+    def change_feed(self):
+        return self._change_feed
+
+    @staticmethod
+    def _new_data_epoch():
+        return '%x.%x' % (int(time.time() * 1000), os.getpid())
+
+    @property
+    def data_epoch(self):
+        return self._data_epoch
+
+    @property
+    def data_tag(self):
+        """ A tag identifying the current content of the tournament, which is the same in all the processes of
+        the multi-process serving mode.
+
+        It is made of the data epoch, which is changed when the writer process starts or resets the tournament, and
+        of the sequence number of the change feed, which is increased by each modification.
+        """
+        return '%s-%d' % (self._data_epoch, self._change_feed.seq)
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    @property
+    def watchdog(self):
+        """ The IO loop stall watchdog, or None if disabled.
+        """
+        return self._watchdog
+
+    @property
+    def profiler(self):
+        """ The on-demand request profiler (see `pjc.web.profiler`).
+        """
+        return self._profiler
+
+    @property
+    def tracer(self):
+        """ The tracer of the requests processing stages (see `pjc.web.tracing`).
+        """
+        return self._tracer
+
+    def log_request(self, handler):
+        super(PJCWebApp, self).log_request(handler)
+        self._metrics.observe_request(handler)
+
+    def start(self, port=8080, sockets=None):
         """ Starts the application
+
+        :param int port: the HTTP port
+        :param list sockets: already bound HTTP sockets (multi-process mode), used instead of the port
         """
-        self.listen(port)
+        io_loop = tornado.ioloop.IOLoop.current()
+        if sockets is None:
+            self.listen(port)
+        else:
+            server = tornado.httpserver.HTTPServer(self)
+            if self._replica:
+                # requests are served once the tournament is received from the writer
+                io_loop.add_future(self._replica.ready, lambda f: server.add_sockets(sockets))
+                io_loop.add_callback(self._replica.run)
+            else:
+                server.add_sockets(sockets)
+
+            if self._replication:
+                self._replication.start()
+
+            # the worker processes stop when the parent one is terminated
+            self._parent_pid = os.getppid()
+            self._parent_check = tornado.ioloop.PeriodicCallback(self._check_parent, self.PARENT_CHECK_PERIOD * 1000)
+            self._parent_check.start()
+
+        self._metrics.start_lag_sampling()
+        if self._watchdog:
+            self._watchdog.start()
 
         signal.signal(signal.SIGTERM, self.signals_handler)
         signal.signal(signal.SIGINT, self.signals_handler)
 
-        self.log.info("server IO loop started")
-        tornado.ioloop.IOLoop.current().start()
+        self.log.info("server IO loop started (%s process)", self._role)
+        io_loop.start()
         self.log.info("server IO loop terminated")
 
+    def _check_parent(self):
+        if os.getppid() != self._parent_pid:
+            self.log.info('parent process terminated')
+            self._parent_check.stop()
+            self.shutdown()
+
     def signals_handler(self, sig, frame):
         self.log.info('Caught signal: %s', sig)
         tornado.ioloop.IOLoop.instance().add_callback(self.shutdown)
 
     def shutdown(self):
+        if self._watchdog:
+            self._watchdog.stop()
+        if self._role != self.ROLE_REPLICA:
+            self.log.info('saving pending tournament modifications...')
+            self._snapshot_writer.flush()
+        if self._journal:
+            self._journal.close()
+        if self._database:
+            self._database.close()
+
         self.log.info('stopping server IOloop...')
         tornado.ioloop.IOLoop.instance().stop()
 
 
+def serve(root, settings, port=8080, processes=1):
+    """ Runs the Web application.
+
+    With several processes, the first one is the writer, and the others are replicas (see `pjc.web.replication`).
+    The processes are forked before creating the application, and are restarted by the parent process if they
+    die unexpectedly. A restarted writer loads the tournament from the data file, as done at startup, and the
+    replicas receive it again.
+
+    :param str root: the Web resources root directory
+    :param dict settings: the application settings
+    :param int port: the HTTP port
+    :param int processes: the count of serving processes, 0 meaning one per CPU core
+    """
+    if processes == 1:
+        PJCWebApp(root, settings).start(port)
+        return
+
+    sockets = tornado.netutil.bind_sockets(port)
+
+    # no thread must be running when forking
+    log_handler = logqueue.installed_handler()
+    if log_handler:
+        log_handler.stop()
+
+    # the parent process only waits for the workers, which terminate when it does
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *args: sys.exit(0))
+    task_id = tornado.process.fork_processes(processes)
+
+    role = PJCWebApp.ROLE_WRITER if task_id == 0 else PJCWebApp.ROLE_REPLICA
+    PJCWebApp(root, dict(settings, role=role)).start(sockets=sockets)
+
+
 class Version(object):
     def __init__(self, fp=None):
         if fp:
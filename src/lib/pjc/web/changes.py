@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+""" Feed of the tournament changes, for clients mirroring the tournament data.
+"""
+
+from collections import deque
+import datetime
+import logging
+
+from tornado import gen
+from tornado.concurrent import Future
+
+__author__ = 'eric'
+
+
+class ChangeFeed(object):
+    """ Bounded in-memory log of the tournament changes, which clients can wait on.
+
+    The feed listens to the tournament mutations (see `Tournament.add_mutation_listener()`) and turns each
+    mutation record into an event, numbered by a sequence number increasing by one for each event. The last
+    events are kept in a ring buffer, so that clients can get the events they missed since the last one
+    they received, and wait for new ones if there is none.
+
+    Events are dictionaries containing :
+        - seq : the sequence number of the event
+        - op : the name of the tournament modification (see the mutation records)
+        - team : the number of the involved team, if any
+
+    plus the following entries for score modifications :
+        - round : the round number for robotics rounds, or "research" or "jury" for evaluations
+        - old, new : the previous and new scores of the team (as dictionaries), or None if not set
+        - rank_points : the new ranking points of the team in the round
+
+    To be able to provide the previous scores, the feed keeps snapshots of the rounds taken when loading the
+    tournament, and the scores modified since then. Since round snapshots share the lazily decoded content of
+    the rounds loaded from the data file (see `pjc.datafile`), this does not force decoding them.
+    """
+    # score operations, and the corresponding round identification
+    SCORE_OPS = {
+        'set_robotics_score': None,
+        'clear_robotics_score': None,
+        'set_research_evaluation': 'research',
+        'clear_research_evaluation': 'research',
+        'set_jury_evaluation': 'jury',
+        'clear_jury_evaluation': 'jury',
+    }
+
+    def __init__(self, tournament, max_size=1000):
+        """
+        :param Tournament tournament: the tournament
+        :param int max_size: the maximum count of events kept in the feed
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._tournament = tournament
+        self._events = deque(maxlen=max_size)
+        self._seq = 0
+        self._waiters = set()
+        self._rounds = {}
+        self._scores = {}
+        self._load_scores()
+
+        tournament.add_mutation_listener(self._on_mutation)
+
+    @property
+    def seq(self):
+        """ The sequence number of the last event, or 0 if none yet.
+        """
+        return self._seq
+
+    def reset(self, seq):
+        """ Restarts the feed from a given sequence number, discarding the kept events.
+
+        Used when the tournament content is replaced as a whole, so that the feed numbers its events as
+        the one of the process it comes from (see `pjc.web.replication`). Waiting clients are woken up, and
+        are told that events are lost.
+
+        :param int seq: the sequence number of the last event of the replaced content
+        """
+        self._events.clear()
+        self._seq = seq
+        self._load_scores()
+        self._wake_up_waiters()
+
+    def _load_scores(self):
+        tournament = self._tournament
+        rounds = [
+            (round_num, round_) for round_num, round_ in enumerate(tournament.get_robotics_rounds(), start=1)
+        ] + [
+            ('research', tournament.research_evaluations),
+            ('jury', tournament.jury_evaluations),
+        ]
+        self._rounds = dict((round_id, round_.snapshot()) for round_id, round_ in rounds)
+        self._scores = {}
+
+    def _get_score(self, key):
+        """ Returns the current score of a team (as a dictionary), or None if not set.
+        """
+        if key in self._scores:
+            return self._scores[key]
+        round_id, team_num = key
+        score = self._rounds[round_id].scores.get(team_num)
+        return score.serialize() if score is not None else None
+
+    def _get_round(self, round_id):
+        if round_id == 'research':
+            return self._tournament.research_evaluations
+        elif round_id == 'jury':
+            return self._tournament.jury_evaluations
+        else:
+            return self._tournament.get_robotics_round(round_id)
+
+    def _on_mutation(self, records):
+        events = []
+        for record in records:
+            event = {'op': record['op'], 'team': record.get('team')}
+            op = record['op']
+            if op in self.SCORE_OPS:
+                round_id = self.SCORE_OPS[op] or record['round']
+                key = (round_id, record['team'])
+                old_score, new_score = self._get_score(key), record.get('score')
+                if old_score == new_score:
+                    # the score is set again or cleared while not set : nothing changed for the clients
+                    continue
+                event.update(round=round_id, old=old_score, new=new_score)
+                self._scores[key] = new_score
+            elif op == 'deserialize_teams':
+                self._load_scores()
+            events.append(event)
+        if not events:
+            return
+
+        # ranking points are computed once all the changes are applied (they are cached by the rounds, so
+        # this is done only once per modified round)
+        team_count = self._tournament.team_count(present_only=True)
+        ranking_points = {}
+        for event in events:
+            if 'round' in event:
+                round_id = event['round']
+                if round_id not in ranking_points:
+                    ranking_points[round_id] = dict(self._get_round(round_id).get_ranking_points(team_count))
+                event['rank_points'] = ranking_points[round_id].get(event['team'], 0)
+
+            self._seq += 1
+            event['seq'] = self._seq
+            self._events.append(event)
+
+        self._wake_up_waiters()
+
+    def _wake_up_waiters(self):
+        waiters, self._waiters = self._waiters, set()
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def get_events(self, since):
+        """ Returns the events following a given one.
+
+        :param int since: the sequence number of the last event known by the client
+        :returns: a tuple containing the list of events, and a boolean telling if events have been lost, because
+        they are not available in the feed anymore (or the sequence number is unknown, which is the case if the
+        server has been restarted). Clients should then get the full data again.
+        """
+        if since > self._seq:
+            return [], True
+        first_seq = self._events[0]['seq'] if self._events else self._seq + 1
+        lost = since < first_seq - 1
+        return [event for event in self._events if event['seq'] > since], lost
+
+    @gen.coroutine
+    def wait_events(self, since, timeout):
+        """ Coroutine returning the events following a given one, waiting for new events if there is none yet.
+
+        :param int since: the sequence number of the last event known by the client
+        :param float timeout: the maximum wait time (in seconds)
+        :returns: the same as `get_events()`, the list of events being empty if the timeout is reached
+        """
+        if since == self._seq:
+            waiter = Future()
+            self._waiters.add(waiter)
+            try:
+                yield gen.with_timeout(datetime.timedelta(seconds=timeout), waiter)
+            except gen.TimeoutError:
+                pass
+            finally:
+                self._waiters.discard(waiter)
+        raise gen.Return(self.get_events(since))
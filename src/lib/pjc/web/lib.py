@@ -3,29 +3,68 @@
 
 import httplib
 import datetime
+from collections import OrderedDict
+import threading
+import time
 
 import tornado.web
 from tornado.web import HTTPError
 
+from pjc.web.tracing import NULL_TRACE
+
 __author__ = 'eric'
 
 
 class AppRequestHandler(tornado.web.RequestHandler):
     PATH_ARGS = []
-    tournament = None
+
+    # tells if the requests can be selected by the request profiler (see `pjc.web.profiler`)
+    PROFILED = True
+
+    _profiled = False
+
+    #: the trace of the request, if sampled (see `pjc.web.tracing`)
+    trace = NULL_TRACE
 
     def initialize(self):
-        self.tournament = self.application.tournament
+        pass
+
+    @property
+    def tournament(self):
+        """ The current tournament snapshot, which is read-only.
+
+        Modifications are done by executing commands with the application `execute()` method.
+        """
+        return self.application.tournament
 
     def prepare(self):
+        profiler = self.application.profiler
+        if profiler.active and self.PROFILED:
+            self._profiled = profiler.begin(self)
+        self.trace = self.application.tracer.trace('%s %s' % (self.request.method, self.request.path))
+
         for arg_name in self.PATH_ARGS:
             checker = getattr(self, 'check_' + arg_name, None)
             if checker and callable(checker):
                 self.path_kwargs[arg_name] = checker(self.path_kwargs[arg_name])
 
+    def on_finish(self):
+        if self._profiled:
+            self.application.profiler.end(self)
+        if self.trace.sampled:
+            # the root span of the trace covers the whole request processing
+            self.trace.finish(
+                time.time() - self.request.request_time(),
+                {'handler': self.__class__.__name__, 'status': self.get_status()}
+            )
+
+    def on_connection_close(self):
+        if self._profiled:
+            self.application.profiler.end(self)
+
     def check_team_num(self, value):
         team_num = int(value)
-        if team_num in self.tournament.team_nums:
+        if self.tournament.has_team(team_num):
             return team_num
         else:
             raise HTTPError(httplib.NOT_FOUND, 'Team not found (%d)' % team_num)
@@ -43,4 +82,67 @@ def parse_hhmm_time(s):
 
 
 def format_hhmm_time(t):
-    return t.strftime("%H:%M")
\ No newline at end of file
+    return t.strftime("%H:%M")
+
+
+class LRUCache(object):
+    """ Bounded cache, evicting the least recently used entries when full.
+
+    Hits and misses are counted, for monitoring its efficiency.
+    """
+    def __init__(self, max_size=64):
+        """
+        :param int max_size: the maximum count of entries
+        """
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    def get(self, key, compute):
+        """ Returns the value cached for a key, computing and storing it if not available.
+
+        :param key: the key of the entry (must be hashable)
+        :param callable compute: the callable (without parameter) returning the value when it is not cached
+        """
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                pass
+            else:
+                self._entries[key] = value
+                self.hits += 1
+                return value
+
+        # compute outside of the lock, so that a long computation does not block other accesses
+        value = compute()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = value
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self):
+        """ The cache statistics, as a dictionary containing the entries count, the maximum size and the hits and
+        misses counts.
+        """
+        return {
+            'size': len(self._entries),
+            'max_size': self._max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+""" Asynchronous logging.
+
+The log records are written by the handlers configured for the root logger (console, file, syslog,...), which
+can block the IO loop when the output is slow (SD card, remote syslog,...). Once `install()` is called, these
+handlers are replaced by an `AsyncLogHandler`, which puts the records in a bounded queue, emptied by a background
+thread passing them to the original handlers.
+
+The IO loop never waits for the logs : when the queue is full, the records are dropped and counted, and the count
+of dropped records is logged along with the next written records. The records of the chatty loggers (such as the
+TV displays sequencing in debug mode) can also be rate limited.
+"""
+
+import logging
+import os
+import Queue
+import threading
+import time
+
+__author__ = 'eric'
+
+# the handler installed by `install()`, if any
+_installed = None
+
+
+class AsyncLogHandler(logging.Handler):
+    """ Handler queuing the records for being written by a background thread.
+
+    The records are processed by the writer thread in batches, the target handlers being flushed once per batch.
+
+    A writer thread is started by each process, so that the handler can be installed before forking the serving
+    processes.
+    """
+    # default maximum count of records waiting in the queue
+    QUEUE_SIZE = 10000
+
+    # maximum count of records processed by the writer thread before flushing the target handlers
+    BATCH_SIZE = 200
+
+    # period (in seconds) of the rate limiting
+    RATE_PERIOD = 1.0
+
+    def __init__(self, handlers, queue_size=QUEUE_SIZE, rate_limits=None):
+        """
+        :param list handlers: the handlers writing the records
+        :param int queue_size: the maximum count of records waiting in the queue
+        :param dict rate_limits: the maximum count of records logged per second, keyed by logger name. Only the
+        records below the WARNING level are limited.
+        """
+        logging.Handler.__init__(self)
+        self._handlers = handlers
+        self._queue_size = queue_size
+        self._rate_limits = dict(rate_limits or {})
+        # current period start and count of records, keyed by logger name
+        self._rate_counts = {}
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        #: count of records dropped because the queue was full
+        self.dropped = 0
+        #: count of records dropped by the rate limiting
+        self.rate_limited = 0
+        self._reported = (0, 0)
+
+    def _start(self):
+        self._pid = os.getpid()
+        self._queue = Queue.Queue(self._queue_size)
+        self._thread = threading.Thread(target=self._run, args=(self._queue,), name=self.__class__.__name__)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _is_rate_limited(self, record):
+        limit = self._rate_limits.get(record.name)
+        if limit is None or record.levelno >= logging.WARNING:
+            return False
+        now = time.time()
+        period_start, count = self._rate_counts.get(record.name, (now, 0))
+        if now - period_start >= self.RATE_PERIOD:
+            period_start, count = now, 0
+        self._rate_counts[record.name] = (period_start, count + 1)
+        return count >= limit
+
+    @staticmethod
+    def _prepare(record):
+        # the message is built now, since its arguments could be modified before the record is written, and
+        # the traceback is formatted for not keeping the frames alive
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging._defaultFormatter.formatException(record.exc_info)
+            record.exc_info = None
+
+    def emit(self, record):
+        # called with the handler lock acquired
+        if self._rate_limits and self._is_rate_limited(record):
+            self.rate_limited += 1
+            return
+        try:
+            self._prepare(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(record)
+        except Queue.Full:
+            self.dropped += 1
+
+    def _run(self, queue):
+        while True:
+            batch = [queue.get()]
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(queue.get_nowait())
+                except Queue.Empty:
+                    break
+
+            stopped = None in batch
+            try:
+                self._write([record for record in batch if record is not None])
+            finally:
+                for _ in batch:
+                    queue.task_done()
+            if stopped:
+                return
+
+    def _write(self, records):
+        dropped, rate_limited = self.dropped, self.rate_limited
+        if (dropped, rate_limited) != self._reported:
+            reported_dropped, reported_rate_limited = self._reported
+            self._reported = (dropped, rate_limited)
+            records.append(logging.LogRecord(
+                self.__class__.__name__, logging.WARNING, __file__, 0,
+                '%d log record(s) dropped (queue full), %d dropped by rate limiting',
+                (dropped - reported_dropped, rate_limited - reported_rate_limited), None
+            ))
+
+        for record in records:
+            for handler in self._handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+        for handler in self._handlers:
+            try:
+                handler.flush()
+            except Exception:
+                pass
+
+    def flush(self):
+        """ Waits for the queued records to be written, including the batch being written by the writer thread.
+        """
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._queue.join()
+
+    def stop(self):
+        """ Writes the queued records and stops the writer thread, which is started again by the next record.
+
+        Must be called before forking, since the threads running at that time would leave the forked process in
+        an inconsistent state.
+        """
+        if self._pid == os.getpid() and self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=5)
+            except Queue.Full:
+                pass
+            self._thread.join(5)
+        self._pid = None
+
+    def close(self):
+        self.stop()
+        logging.Handler.close(self)
+
+
+def install(queue_size=AsyncLogHandler.QUEUE_SIZE, rate_limits=None):
+    """ Replaces the handlers of the root logger by an `AsyncLogHandler` writing the records with them.
+
+    :returns: the installed handler
+    :rtype: AsyncLogHandler
+    """
+    global _installed
+
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    for handler in handlers:
+        root.removeHandler(handler)
+    _installed = AsyncLogHandler(handlers, queue_size, rate_limits)
+    root.addHandler(_installed)
+    return _installed
+
+
+def installed_handler():
+    """ Returns the handler installed by `install()`, or None if the logging is synchronous.
+    """
+    return _installed
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+
+""" Instrumentation of the Web application.
+
+The application records in a `Metrics` instance :
+
+    - the duration of the requests, as histograms keyed by the handler class name and the response status
+    - the count of bytes sent, by handler class
+    - the count of active TV clients (push channels, and polling clients seen recently)
+    - the lag of the IO loop, i.e. the delay after which a callback is run once scheduled, sampled periodically
+    - the duration and size of the persistence writes, by kind (data file, journal, database)
+    - the count of log records dropped by the asynchronous logging, if used
+
+The metrics can be exported in the Prometheus text format (see `Metrics.render_prometheus()`), and are shown by
+the administration dashboard.
+
+In the multi-process serving mode, each process has its own metrics.
+"""
+
+from collections import namedtuple
+import bisect
+import threading
+import time
+
+import tornado.ioloop
+
+__author__ = 'eric'
+
+# upper bounds (in seconds) of the duration histograms buckets
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# summary of a histogram, as shown by the dashboard
+HistogramSummary = namedtuple('HistogramSummary', 'count mean p50 p95 max')
+
+
+class Histogram(object):
+    """ Counts of observed values, by ranges defined by the upper bounds of the buckets.
+
+    The values greater than the last bound are counted in an additional bucket.
+    """
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """ Returns an estimation of a quantile of the observed values, as the upper bound of the bucket
+        containing it (or the maximum value for the last bucket), or None if no value has been observed.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return HistogramSummary(
+            self.count, self.sum / self.count if self.count else None, self.quantile(0.5), self.quantile(0.95),
+            self.max
+        )
+
+
+def _labels(le=None, **labels):
+    """ Returns the labels part of a metric sample, the bucket bound of histograms (if any) being the last one.
+    """
+    pairs = sorted(labels.iteritems()) + ([('le', le)] if le is not None else [])
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('"', '\\"')) for name, value in pairs)
+
+
+class Metrics(object):
+    """ The metrics of the Web application.
+
+    Metrics can be recorded from any thread.
+    """
+    # delay (in seconds) during which a polling TV client is considered active after its last request
+    TV_CLIENT_ACTIVITY_DELAY = 30
+
+    # default period (in seconds) of the IO loop lag sampling
+    LAG_SAMPLING_PERIOD = 1.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start_time = time.time()
+        self._requests = {}
+        self._bytes_sent = {}
+        self._tv_clients = {}
+        self._tv_channel_count = lambda: 0
+        self._stall_count = None
+        self._log_drop_counts = None
+        self._lag = Histogram()
+        self._last_lag = None
+        self._persistence = {}
+        self._persistence_bytes = {}
+        self._last_write_size = {}
+        self._io_loop = None
+        self._lag_period = self._lag_deadline = self._lag_timeout = None
+
+    # Recording
+
+    def observe_request(self, handler):
+        """ Records a completed request.
+
+        :param tornado.web.RequestHandler handler: the handler of the request
+        """
+        name = handler.__class__.__name__
+        duration = handler.request.request_time()
+        # the content length is known once the request is finished, except for streamed responses
+        size = int(handler._headers.get('Content-Length', 0))
+        key = (name, handler.get_status())
+        with self._lock:
+            histogram = self._requests.get(key)
+            if histogram is None:
+                histogram = self._requests[key] = Histogram()
+            histogram.observe(duration)
+            self._bytes_sent[name] = self._bytes_sent.get(name, 0) + size
+
+    def observe_tv_client(self, client):
+        """ Records the activity of a polling TV client.
+        """
+        with self._lock:
+            self._tv_clients[client] = time.time()
+
+    def set_tv_channel_counter(self, counter):
+        """ Defines the callable returning the count of open TV push channels.
+        """
+        self._tv_channel_count = counter
+
+    def set_stall_counter(self, counter):
+        """ Defines the callable returning the count of IO loop stalls (see `pjc.web.watchdog`).
+        """
+        self._stall_count = counter
+
+    def set_log_drop_counter(self, counter):
+        """ Defines the callable returning the counts of log records dropped by the asynchronous logging (see
+        `pjc.web.logqueue`), as a (queue full, rate limited) tuple.
+        """
+        self._log_drop_counts = counter
+
+    def observe_persistence(self, kind, duration, size=None):
+        """ Records a persistence write.
+
+        :param str kind: the kind of write (data file, journal, database)
+        :param float duration: the duration of the write (in seconds)
+        :param int size: the count of bytes written, if known
+        """
+        with self._lock:
+            histogram = self._persistence.get(kind)
+            if histogram is None:
+                histogram = self._persistence[kind] = Histogram()
+            histogram.observe(duration)
+            if size is not None:
+                self._persistence_bytes[kind] = self._persistence_bytes.get(kind, 0) + size
+                self._last_write_size[kind] = size
+
+    def timed_persistence(self, kind, write):
+        """ Returns a wrapper of a persistence write function, recording its duration.
+
+        If the function returns an integer, it is recorded as the count of bytes written. The wrapper can be used
+        as a tournament mutation listener if the wrapped function is one.
+        """
+        def timed(*args, **kwargs):
+            start = time.time()
+            result = write(*args, **kwargs)
+            self.observe_persistence(kind, time.time() - start, result if isinstance(result, (int, long)) else None)
+            return result
+        return timed
+
+    # IO loop lag sampling
+
+    def start_lag_sampling(self, period=LAG_SAMPLING_PERIOD):
+        """ Starts sampling the IO loop lag, on the current IO loop.
+
+        A timeout is scheduled at each sampling period, and the delay between its deadline and the time it is
+        actually run is recorded. This delay includes the time spent by the IO loop in the callback running when
+        the deadline is reached.
+        """
+        if self._io_loop is not None:
+            return
+        self._io_loop = tornado.ioloop.IOLoop.current()
+        self._lag_period = period
+        self._schedule_lag_sample()
+
+    def stop_lag_sampling(self):
+        if self._io_loop is not None:
+            self._io_loop.remove_timeout(self._lag_timeout)
+            self._io_loop = None
+
+    def _schedule_lag_sample(self):
+        self._lag_deadline = self._io_loop.time() + self._lag_period
+        self._lag_timeout = self._io_loop.call_at(self._lag_deadline, self._sample_lag)
+
+    def _sample_lag(self):
+        lag = max(self._io_loop.time() - self._lag_deadline, 0)
+        with self._lock:
+            self._lag.observe(lag)
+            self._last_lag = lag
+        self._schedule_lag_sample()
+
+    # Reporting
+
+    @property
+    def tv_client_counts(self):
+        """ The counts of active TV clients, as a (push, polling) tuple.
+        """
+        limit = time.time() - self.TV_CLIENT_ACTIVITY_DELAY
+        with self._lock:
+            for client in [c for c, last_seen in self._tv_clients.iteritems() if last_seen < limit]:
+                del self._tv_clients[client]
+            polling = len(self._tv_clients)
+        return self._tv_channel_count(), polling
+
+    def summary(self):
+        """ Returns the metrics summary shown by the dashboard, as a dictionary containing :
+
+            - uptime : the time elapsed since the metrics creation (in seconds)
+            - requests : a list of (handler, status, summary, bytes sent) tuples, sorted by handler and status
+            - tv_clients : the counts of active TV clients, as a (push, polling) tuple
+            - ioloop_lag : the summary of the IO loop lag, and the last sampled value
+            - persistence : a list of (kind, summary, bytes written, last write size) tuples
+
+        Summaries are `HistogramSummary` instances.
+        """
+        with self._lock:
+            requests = [
+                (name, status, histogram.summary(), self._bytes_sent.get(name, 0))
+                for (name, status), histogram in sorted(self._requests.iteritems())
+            ]
+            persistence = [
+                (kind, histogram.summary(), self._persistence_bytes.get(kind), self._last_write_size.get(kind))
+                for kind, histogram in sorted(self._persistence.iteritems())
+            ]
+            lag = (self._lag.summary(), self._last_lag)
+        return {
+            'uptime': time.time() - self._start_time,
+            'requests': requests,
+            'tv_clients': self.tv_client_counts,
+            'ioloop_lag': lag,
+            'persistence': persistence,
+        }
+
+    @staticmethod
+    def _render_histogram(lines, name, histogram, **labels):
+        total = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            total += count
+            lines.append('%s_bucket%s %d' % (name, _labels(le=repr(bound), **labels), total))
+        lines.append('%s_bucket%s %d' % (name, _labels(le='+Inf', **labels), histogram.count))
+        lines.append('%s_sum%s %r' % (name, _labels(**labels), histogram.sum))
+        lines.append('%s_count%s %d' % (name, _labels(**labels), histogram.count))
+
+    def render_prometheus(self):
+        """ Returns the metrics in the Prometheus text exposition format.
+        """
+        push, polling = self.tv_client_counts
+        lines = []
+        with self._lock:
+            lines += [
+                '# HELP pjc_request_duration_seconds Duration of the HTTP requests.',
+                '# TYPE pjc_request_duration_seconds histogram',
+            ]
+            for (name, status), histogram in sorted(self._requests.iteritems()):
+                self._render_histogram(lines, 'pjc_request_duration_seconds', histogram, handler=name, status=status)
+
+            lines += [
+                '# HELP pjc_response_bytes_total Bytes sent in HTTP responses.',
+                '# TYPE pjc_response_bytes_total counter',
+            ]
+            for name, size in sorted(self._bytes_sent.iteritems()):
+                lines.append('pjc_response_bytes_total%s %d' % (_labels(handler=name), size))
+
+            lines += [
+                '# HELP pjc_ioloop_lag_seconds Delay before a scheduled IO loop callback is run.',
+                '# TYPE pjc_ioloop_lag_seconds histogram',
+            ]
+            self._render_histogram(lines, 'pjc_ioloop_lag_seconds', self._lag)
+
+            if self._stall_count is not None:
+                lines += [
+                    '# HELP pjc_ioloop_stalls_total IO loop stalls detected by the watchdog.',
+                    '# TYPE pjc_ioloop_stalls_total counter',
+                    'pjc_ioloop_stalls_total %d' % self._stall_count(),
+                ]
+
+            lines += [
+                '# HELP pjc_persistence_write_seconds Duration of the tournament persistence writes.',
+                '# TYPE pjc_persistence_write_seconds histogram',
+            ]
+            for kind, histogram in sorted(self._persistence.iteritems()):
+                self._render_histogram(lines, 'pjc_persistence_write_seconds', histogram, kind=kind)
+
+            lines += [
+                '# HELP pjc_persistence_write_bytes_total Bytes written by the tournament persistence.',
+                '# TYPE pjc_persistence_write_bytes_total counter',
+            ]
+            for kind, size in sorted(self._persistence_bytes.iteritems()):
+                lines.append('pjc_persistence_write_bytes_total%s %d' % (_labels(kind=kind), size))
+
+            lines += [
+                '# HELP pjc_persistence_last_write_bytes Size of the last tournament persistence write.',
+                '# TYPE pjc_persistence_last_write_bytes gauge',
+            ]
+            for kind, size in sorted(self._last_write_size.iteritems()):
+                lines.append('pjc_persistence_last_write_bytes%s %d' % (_labels(kind=kind), size))
+
+        if self._log_drop_counts is not None:
+            overload, rate_limit = self._log_drop_counts()
+            lines += [
+                '# HELP pjc_log_records_dropped_total Log records dropped by the asynchronous logging.',
+                '# TYPE pjc_log_records_dropped_total counter',
+                'pjc_log_records_dropped_total%s %d' % (_labels(reason='overload'), overload),
+                'pjc_log_records_dropped_total%s %d' % (_labels(reason='rate_limit'), rate_limit),
+            ]
+
+        lines += [
+            '# HELP pjc_tv_clients Active TV display clients.',
+            '# TYPE pjc_tv_clients gauge',
+            'pjc_tv_clients%s %d' % (_labels(mode='push'), push),
+            'pjc_tv_clients%s %d' % (_labels(mode='polling'), polling),
+        ]
+        return '\n'.join(lines) + '\n'
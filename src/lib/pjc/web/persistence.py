@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+""" Background persistence of the tournament snapshots.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import tornado.ioloop
+
+from pjc import datafile
+from pjc.web.tracing import Tracer
+
+__author__ = 'eric'
+
+
+class SnapshotWriter(object):
+    """ Writes the tournament data file without blocking the IO loop.
+
+    Save requests are coalesced : the first request starts a delay, at the end of which the tournament
+    content is captured (on the IO loop thread, so that it is consistent) and handed to a background thread
+    in charge of encoding and writing it. All the requests received during the delay are thus satisfied by
+    a single write. The captured content is a read-only snapshot of the tournament (see `Tournament.snapshot()`),
+    which is encoded by the background thread.
+
+    The content is written in a temporary file which is then renamed, so that the data file is never left
+    partially written.
+
+    Hooks can be provided for being notified when the content is captured (on the IO loop thread) and when
+    it has been saved (called on the IO loop thread too, except for synchronous saves). The `on_written` hook
+    is called by the thread writing the file, with the duration (encoding included) and the size of the write.
+
+    The capture, encoding and write of the content are recorded as spans by the tracer if any (see
+    `pjc.web.tracing`).
+    """
+    def __init__(self, path, delay=1.0, on_capture=None, on_saved=None, encode=None, on_written=None, tracer=None):
+        """
+        :param str path: the path of the data file
+        :param float delay: the coalescing delay (in seconds)
+        :param callable on_capture: optional callable invoked when the content to be saved is captured
+        :param callable on_saved: optional callable invoked with the saved version once the file is written
+        :param callable encode: optional callable returning the content of the data file for a given tournament
+        (JSON by default, see `pjc.datafile`)
+        :param callable on_written: optional callable invoked with the duration and the size of each write
+        :param Tracer tracer: optional tracer recording the spans
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._path = path
+        self._delay = delay
+        self.on_capture = on_capture
+        self.on_saved = on_saved
+        self._encode = encode or datafile.dump_json
+        self.on_written = on_written
+        self._tracer = tracer or Tracer()
+
+        self._io_loop = None
+        self._timeout = None
+        self._tournament = None
+
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._pending = None
+        self._busy = False
+        self._thread = None
+
+        self._saved_version = None
+        self.last_save_time = None
+        self.last_save_duration = None
+        self.last_save_size = None
+
+    @property
+    def saved_version(self):
+        """ The version of the tournament contained in the data file, or None if not known.
+        """
+        return self._saved_version
+
+    def mark_saved(self, version):
+        """ Declares the version of the tournament contained in the data file (when it has been loaded from it).
+        """
+        self._saved_version = version
+
+    @property
+    def pending(self):
+        """ Tells if a save has been requested but is not completed yet.
+        """
+        with self._cond:
+            return self._timeout is not None or self._pending is not None or self._busy
+
+    def save(self, tournament):
+        """ Requests the tournament to be saved.
+
+        Must be called from the IO loop thread.
+
+        :param tournament: the tournament, or a callable returning it when the content is captured (for
+        saving the snapshot current at that time)
+        """
+        self._tournament = tournament
+        if self._timeout is None:
+            self._io_loop = tornado.ioloop.IOLoop.current()
+            self._timeout = self._io_loop.call_later(self._delay, self._capture)
+
+    def save_now(self, tournament):
+        """ Saves the tournament synchronously.
+
+        Used when the IO loop is not running yet, or for operations requiring the file to be written
+        before going further.
+        """
+        self._cancel_timeout()
+        if self.on_capture:
+            self.on_capture()
+        version = tournament.version
+        self._write(version, tournament)
+        if self.on_saved:
+            self.on_saved(version)
+
+    def flush(self):
+        """ Completes the pending save if any, and waits for the data file to be written.
+
+        Must be called from the IO loop thread.
+        """
+        if self._cancel_timeout():
+            self._capture()
+        with self._cond:
+            while self._pending is not None or self._busy:
+                self._cond.wait()
+
+    def _cancel_timeout(self):
+        if self._timeout is None:
+            return False
+        self._io_loop.remove_timeout(self._timeout)
+        self._timeout = None
+        return True
+
+    def _capture(self):
+        self._timeout = None
+        if self.on_capture:
+            self.on_capture()
+
+        tournament = self._tournament() if callable(self._tournament) else self._tournament
+        version = tournament.version
+        # snapshots are never modified, and thus can be encoded in the writer thread
+        if not tournament.read_only:
+            with self._tracer.span('datafile.snapshot', 'persistence'):
+                tournament = tournament.snapshot()
+
+        with self._cond:
+            self._pending = (version, tournament, self._io_loop)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.__class__.__name__)
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                version, tournament, io_loop = self._pending
+                self._pending = None
+                self._busy = True
+
+            try:
+                self._write(version, tournament)
+            except Exception:
+                self.log.exception('cannot save tournament to %s', self._path)
+            else:
+                if self.on_saved:
+                    io_loop.add_callback(self.on_saved, version)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _write(self, version, tournament):
+        with self._write_lock:
+            start = time.time()
+            with self._tracer.span('datafile.encode', 'persistence'):
+                content = self._encode(tournament)
+            with self._tracer.span('datafile.write', 'persistence', {'size': len(content)}):
+                tmp_path = self._path + '.tmp'
+                with open(tmp_path, 'wb') as fp:
+                    fp.write(content)
+                    fp.flush()
+                    os.fsync(fp.fileno())
+                os.rename(tmp_path, self._path)
+
+            self._saved_version = version
+            self.last_save_time = time.time()
+            self.last_save_duration = self.last_save_time - start
+            self.last_save_size = len(content)
+            if self.on_written:
+                self.on_written(self.last_save_duration, self.last_save_size)
+        self.log.info('tournament saved to %s (%d bytes in %.3fs)', self._path, len(content), self.last_save_duration)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+""" On-demand profiling of the requests.
+
+A profiling session is started from the administration UI, for a given count of requests or a given duration,
+and only for the requests whose path starts with a given prefix (`/tv/`, `/api/`,...). The selected requests are
+run under `cProfile`, and their statistics are aggregated in a single profile, which can be downloaded as a
+`pstats` file or shown as a table of the top functions.
+
+When no session is active, the only cost for a request is a test of the `active` flag of the profiler.
+
+Since everything runs on the IO loop thread, the callbacks run while a selected request waits for an asynchronous
+operation (a tournament modification for instance) are included in its profile.
+"""
+
+from collections import namedtuple
+import cProfile
+import logging
+import marshal
+import os
+import pstats
+import time
+
+import tornado.ioloop
+
+__author__ = 'eric'
+
+# a line of the top functions table
+FunctionStats = namedtuple('FunctionStats', 'function calls primitive_calls total_time cumulative_time')
+
+
+class ProfilingSession(object):
+    """ A profiling session, and its results once finished.
+    """
+    def __init__(self, prefix, max_requests=None, duration=None):
+        """
+        :param str prefix: the prefix of the paths of the profiled requests
+        :param int max_requests: the count of requests to be profiled, None for no limit
+        :param float duration: the duration of the session (in seconds), None for no limit
+        """
+        self.prefix = prefix
+        self.max_requests = max_requests
+        self.duration = duration
+        self.start_time = time.time()
+        self.end_time = None
+        #: the count of requests profiled so far
+        self.request_count = 0
+        self.profile = cProfile.Profile()
+        self._stats = None
+
+    @property
+    def finished(self):
+        return self.end_time is not None
+
+    @property
+    def full(self):
+        """ Tells if the requested count of requests has been reached.
+        """
+        return self.max_requests is not None and self.request_count >= self.max_requests
+
+    @property
+    def stats(self):
+        """ The aggregated statistics of the profiled requests, as a `pstats.Stats` instance, or None if no request
+        has been profiled.
+        """
+        if self._stats is None and self.finished and self.request_count:
+            self._stats = pstats.Stats(self.profile)
+        return self._stats
+
+    def dump(self):
+        """ Returns the content of the `pstats` file of the session (as written by `pstats.Stats.dump_stats()`).
+        """
+        return marshal.dumps(self.stats.stats)
+
+    def top_functions(self, sort_key='cumulative', count=40):
+        """ Returns the functions taking the most time.
+
+        :param str sort_key: 'cumulative' for sorting by time spent in the function and its callees, 'total' for
+        sorting by time spent in the function itself
+        :param int count: the count of returned functions
+        :rtype: list of FunctionStats
+        """
+        stats = self.stats
+        if stats is None:
+            return []
+        index = 3 if sort_key == 'cumulative' else 2
+        result = []
+        for (path, line, name), values in sorted(stats.stats.iteritems(), key=lambda e: -e[1][index])[:count]:
+            primitive_calls, calls, total_time, cumulative_time = values[:4]
+            if path == '~':
+                # built-in function
+                function = name
+            else:
+                function = '%s:%d(%s)' % (os.path.join(*path.split(os.sep)[-2:]), line, name)
+            result.append(FunctionStats(function, calls, primitive_calls, total_time, cumulative_time))
+        return result
+
+
+class RequestProfiler(object):
+    """ Profiler of the requests served by the application.
+
+    The handlers call `begin()` when a request starts to be processed, and `end()` once it is finished (see
+    `pjc.web.lib.AppRequestHandler`), but only if the profiler is `active`. The profile is enabled while at least
+    one of the selected requests is being processed.
+
+    Must be used from the IO loop thread.
+    """
+    # prefixes proposed by the administration UI
+    PREFIXES = ('/', '/tv/', '/api/', '/admin/')
+
+    def __init__(self):
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._session = None
+        self._in_flight = set()
+        self._timeout = None
+        #: tells if a session is in progress (tested for each request, and thus a plain attribute)
+        self.active = False
+
+    @property
+    def session(self):
+        """ The current session, or the last one if finished, None if no session has been started.
+        """
+        return self._session
+
+    def start(self, prefix='/', max_requests=None, duration=None):
+        """ Starts a profiling session, replacing the previous one if any.
+
+        Without limit, the session lasts until it is stopped.
+
+        :param str prefix: the prefix of the paths of the profiled requests
+        :param int max_requests: the count of requests to be profiled, None for no limit
+        :param float duration: the duration of the session (in seconds), None for no limit
+        """
+        if self.active:
+            self.stop()
+        self._session = ProfilingSession(prefix, max_requests, duration)
+        self._in_flight.clear()
+        if duration:
+            self._timeout = tornado.ioloop.IOLoop.current().call_later(duration, self.stop)
+        self.active = True
+        self.log.info(
+            'profiling session started (prefix: %s, requests: %s, duration: %s)', prefix, max_requests, duration
+        )
+
+    def stop(self):
+        """ Stops the current session.
+
+        The requests in progress are included in the results up to this point.
+        """
+        if not self.active:
+            return
+        if self._timeout is not None:
+            tornado.ioloop.IOLoop.current().remove_timeout(self._timeout)
+            self._timeout = None
+        if self._in_flight:
+            self._session.profile.disable()
+            self._in_flight.clear()
+        self._session.end_time = time.time()
+        self.active = False
+        self.log.info('profiling session finished (%d requests profiled)', self._session.request_count)
+
+    def begin(self, handler):
+        """ Starts profiling a request if it is selected by the current session.
+
+        :param tornado.web.RequestHandler handler: the handler of the request
+        :return: True if the request is profiled
+        """
+        session = self._session
+        if not self.active or session.full or not handler.request.path.startswith(session.prefix):
+            return False
+        session.request_count += 1
+        if not self._in_flight:
+            session.profile.enable()
+        self._in_flight.add(handler)
+        return True
+
+    def end(self, handler):
+        """ Stops profiling a request, and finishes the session once the requested count of requests is reached.
+        """
+        if handler not in self._in_flight:
+            # the session has been stopped in the meantime
+            return
+        self._in_flight.discard(handler)
+        if not self._in_flight:
+            self._session.profile.disable()
+            if self._session.full:
+                self.stop()
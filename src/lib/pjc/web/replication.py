@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+
+""" Replication of the tournament between the processes of the multi-process serving mode.
+
+In this mode, HTTP requests are served by several processes sharing the same listening socket. One of them, the
+writer, owns the authoritative tournament : it is the only one applying modifications and saving them. The others
+are replicas, serving the requests from a local copy of the tournament, and forwarding the modification commands
+(see `pjc.commands`) to the writer.
+
+Processes are connected by a Unix socket, on which newline delimited JSON messages are exchanged. Each one is a
+dictionary, which `type` entry is :
+
+    - from the writer to the replicas :
+        - state : the whole tournament data, with its data epoch and change feed sequence number, sent when a
+          replica connects and when the tournament is reset
+        - mutations : the mutation records of a batch of modifications, sent to all the replicas
+        - result : the outcome of a request issued by a replica, and its value if any
+        - settings : the application settings shared by the processes (TV message and display sequence)
+    - from a replica to the writer :
+        - commands : modification commands to be applied
+        - tv_display : the next display of a polling TV client is requested (the displays sequencing state is
+          kept by the writer)
+        - reset : the tournament must be reset
+        - settings : modified shared settings
+
+Since messages are delivered in order, a replica receives the mutations resulting from the commands it forwarded
+before the result of the request, so that its local tournament already reflects them when the request completes.
+"""
+
+import json
+import logging
+import socket
+
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.iostream import IOStream, StreamClosedError
+from tornado.netutil import bind_unix_socket
+from tornado.tcpserver import TCPServer
+
+__author__ = 'eric'
+
+
+class ReplicationError(Exception):
+    """ Raised when a request forwarded to the writer fails for other reasons than invalid commands.
+    """
+
+
+def _encode(message):
+    return json.dumps(message, separators=(',', ':')) + '\n'
+
+
+@gen.coroutine
+def _read_message(stream):
+    line = yield stream.read_until('\n')
+    raise gen.Return(json.loads(line))
+
+
+class ReplicationServer(TCPServer):
+    """ Writer side of the replication, sending the tournament changes to the connected replicas and applying
+    the requests they forward.
+
+    The application must register `broadcast_mutations()` as a mutation listener of its tournament.
+    """
+    def __init__(self, application, path):
+        """
+        :param PJCWebApp application: the application of the writer process
+        :param str path: the path of the Unix socket
+        """
+        super(ReplicationServer, self).__init__()
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._application = application
+        self._path = path
+        self._streams = set()
+
+    def start(self):
+        """ Starts accepting replica connections.
+        """
+        self.add_socket(bind_unix_socket(self._path))
+        self.log.info('replication socket: %s', self._path)
+
+    @property
+    def replica_count(self):
+        return len(self._streams)
+
+    def _state_message(self):
+        application = self._application
+        return {
+            'type': 'state',
+            'tournament': application.tournament.serialize(),
+            'epoch': application.data_epoch,
+            'seq': application.change_feed.seq,
+            'settings': application.shared_settings,
+        }
+
+    def _send(self, stream, message):
+        try:
+            stream.write(_encode(message))
+        except StreamClosedError:
+            self._streams.discard(stream)
+
+    def _broadcast(self, message):
+        data = _encode(message)
+        for stream in list(self._streams):
+            try:
+                stream.write(data)
+            except StreamClosedError:
+                self._streams.discard(stream)
+
+    def broadcast_mutations(self, records):
+        """ Sends a batch of mutation records to the replicas.
+
+        Signature compatible with the tournament mutation listeners.
+        """
+        if self._streams:
+            self._broadcast({'type': 'mutations', 'records': records})
+
+    def broadcast_state(self):
+        """ Sends the whole tournament data to the replicas.
+        """
+        if self._streams:
+            self._broadcast(self._state_message())
+
+    def broadcast_settings(self):
+        """ Sends the shared settings to the replicas.
+        """
+        if self._streams:
+            self._broadcast({'type': 'settings', 'settings': self._application.shared_settings})
+
+    @gen.coroutine
+    def handle_stream(self, stream, address):
+        self._streams.add(stream)
+        self.log.info('replica connected (%d replica(s))', len(self._streams))
+        try:
+            self._send(stream, self._state_message())
+            while True:
+                message = yield _read_message(stream)
+                yield self._handle_message(stream, message)
+        except StreamClosedError:
+            pass
+        except Exception:
+            self.log.exception('replication failure - closing connection')
+            stream.close()
+        finally:
+            self._streams.discard(stream)
+            self.log.info('replica disconnected (%d replica(s))', len(self._streams))
+
+    @gen.coroutine
+    def _handle_message(self, stream, message):
+        kind = message['type']
+        if kind == 'settings':
+            self._application.apply_shared_settings(message['settings'])
+            self.broadcast_settings()
+            return
+
+        error = value = None
+        try:
+            if kind == 'commands':
+                yield self._application.execute(message['commands'])
+                self._application.save_tournament()
+            elif kind == 'reset':
+                yield self._application.reset_tournament()
+            elif kind == 'tv_display':
+                value = yield self._application.next_tv_display(
+                    message['client'], message['current_display'], message['current_page']
+                )
+            else:
+                raise ReplicationError('unexpected message type (%s)' % kind)
+        except Exception as e:
+            error = {'invalid': isinstance(e, ValueError), 'message': str(e)}
+        self._send(stream, {'type': 'result', 'id': message['id'], 'error': error, 'value': value})
+
+
+class ReplicaClient(object):
+    """ Replica side of the replication, keeping the local tournament in sync with the one of the writer, and
+    forwarding the requests modifying it.
+
+    The connection is established again if lost (when the writer process is restarted for instance), the replica
+    receiving then the whole tournament data.
+    """
+    # delay (in seconds) between connection attempts
+    RETRY_DELAY = 0.5
+
+    def __init__(self, application, path):
+        """
+        :param PJCWebApp application: the application of the replica process
+        :param str path: the path of the Unix socket
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._application = application
+        self._path = path
+        self._stream = None
+        self._requests = {}
+        self._last_id = 0
+        self._ready = Future()
+
+    @property
+    def ready(self):
+        """ A future resolved once the tournament data have been received from the writer.
+        """
+        return self._ready
+
+    @property
+    def connected(self):
+        return self._stream is not None
+
+    @gen.coroutine
+    def run(self):
+        """ Coroutine connecting to the writer and processing its messages, forever.
+        """
+        while True:
+            stream = IOStream(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM))
+            try:
+                yield stream.connect(self._path)
+            except StreamClosedError:
+                yield gen.sleep(self.RETRY_DELAY)
+                continue
+
+            self.log.info('connected to writer')
+            self._stream = stream
+            try:
+                while True:
+                    message = yield _read_message(stream)
+                    self._handle_message(message)
+            except StreamClosedError:
+                self.log.warning('connection to writer lost')
+            except Exception:
+                self.log.exception('replication failure - reconnecting')
+                stream.close()
+            finally:
+                self._stream = None
+                self._fail_requests(ReplicationError('connection to writer lost'))
+            yield gen.sleep(self.RETRY_DELAY)
+
+    def _handle_message(self, message):
+        kind = message['type']
+        application = self._application
+        if kind == 'mutations':
+            application.apply_replicated_mutations(message['records'])
+        elif kind == 'result':
+            future = self._requests.pop(message['id'], None)
+            if future is None:
+                return
+            error = message['error']
+            if error is None:
+                future.set_result(message.get('value'))
+            elif error['invalid']:
+                future.set_exception(ValueError(error['message']))
+            else:
+                future.set_exception(ReplicationError(error['message']))
+        elif kind == 'state':
+            application.load_replicated_state(
+                message['tournament'], message['epoch'], message['seq'], message['settings']
+            )
+            if not self._ready.done():
+                self._ready.set_result(None)
+        elif kind == 'settings':
+            application.apply_shared_settings(message['settings'])
+        else:
+            self.log.error('unexpected message type (%s)', kind)
+
+    def _fail_requests(self, error):
+        requests, self._requests = self._requests, {}
+        for future in requests.itervalues():
+            future.set_exception(error)
+
+    def _request(self, message):
+        future = Future()
+        if self._stream is None:
+            future.set_exception(ReplicationError('writer not available'))
+            return future
+
+        self._last_id += 1
+        message['id'] = self._last_id
+        self._requests[self._last_id] = future
+        try:
+            self._stream.write(_encode(message))
+        except StreamClosedError:
+            self._requests.pop(self._last_id, None)
+            future.set_exception(ReplicationError('writer not available'))
+        return future
+
+    @gen.coroutine
+    def execute(self, commands):
+        """ Forwards modification commands to the writer.
+
+        :param list commands: the commands
+        :returns Future: resolved with the local tournament snapshot once it includes the modifications
+        """
+        yield self._request({'type': 'commands', 'commands': commands})
+        raise gen.Return(self._application.tournament)
+
+    def reset_tournament(self):
+        """ Asks the writer to reset the tournament.
+
+        :returns Future: resolved once done
+        """
+        return self._request({'type': 'reset'})
+
+    def next_tv_display(self, client, current_display, current_page):
+        """ Asks the writer for the next display of a polling TV client (see `PJCWebApp.next_tv_display()`).
+
+        :returns Future: resolved with a (known, next display) tuple
+        """
+        return self._request({
+            'type': 'tv_display', 'client': client, 'current_display': current_display, 'current_page': current_page
+        })
+
+    def send_settings(self, settings):
+        """ Sends modified shared settings to the writer, which will dispatch them to all the replicas.
+        """
+        if self._stream is not None:
+            try:
+                self._stream.write(_encode({'type': 'settings', 'settings': settings}))
+            except StreamClosedError:
+                pass
@@ -6,53 +6,79 @@ $(document).ready(function() {
 
     var current_display = "";
     var current_page = 0;
+    var current_hash = "";
+
+    /*
+        Updates the page with the data sent by the server.
+
+        Received data is a dictionary with the following entries:
+        - display_name : the symbolic name of the returned display
+        - current_page : the number of the current page (>= 1) for paginated displays
+        - content (string) : the HTML code to be displayed in the content division. It is omitted
+          if unchanged since the last update (see hash).
+        - hash (string) : the hash of the HTML code
+        - delay (int) : the delay (in seconds) before requesting next display
+        - clock (string) : the server clock at display time
+     */
+    function show_display(data) {
+        current_display = data.display_name;
+        current_page = data.current_page;
+
+        clock_container.html(data.clock);
+        if (data.content !== undefined) {
+            display_container.html(data.content);
+            current_hash = data.hash;
+        }
+        error_container.hide();
+    }
+
+    function reset_sequence() {
+        // reset the sequence for restarting cleanly when the communication will be back
+        current_display = "";
+        current_page = 0;
+        current_hash = "";
+    }
+
+    function make_url(path, protocol) {
+        var url = document.location.href;
+        if (url.substr(-1, 1) !== '/') { url += '/'; }
+        url += path;
+        if (protocol) {
+            url = url.replace(/^http/, protocol);
+        }
+        return url;
+    }
 
     /*
         This function is invoked periodically by auto-rescheduling itself using a timer (see
-        end of body).
+        end of body). It is used when the push channel is not available.
 
         It gets the content to be displayed by sending an Ajax request to the server, which replies
         with the HTML code to be put in the content container. Additional data are packaged with the
-        returned structure for managing the display sequencing (see success callback of the Ajax call
-        for details).
+        returned structure for managing the display sequencing (see show_display() for details).
      */
     function update_display() {
         var display_delay = 5; // seconds
 
-        var url = document.location.href;
-        if (url.substr(-1, 1) !== '/') { url += '/'; }
-        url += 'content';
         $.ajax({
-            url: url,
+            url: make_url('content'),
             data: {
                 // the Ajax requests uses the current page and display name to determine what
                 // must be displayed next time.
                 current_display: current_display,
-                current_page: current_page
+                current_page: current_page,
+                hash: current_hash
             },
             dataType: "json",
             timeout: 5000,
             success: function(data) {
-                // received data is a dictionary with the following entries:
-                // - display_name : the symbolic name of the returned display
-                // - current_page : the number of the current page (>= 1) for paginated displays
-                // - content (string) : the HTML code to be displayed in the content division
-                // - delay (int) : the delay (in seconds) before requesting next display
-                // - clock (string) : the server clock at display time
-                current_display = data.display_name;
-                current_page = data.current_page;
+                show_display(data);
                 display_delay = data.delay;
-
-                clock_container.html(data.clock);
-                display_container.html(data.content);
-                error_container.hide();
             },
             error: function(jqXHR, textStatus, errorThrown) {
                 if (textStatus === "error") {
                     error_container.show();
-                    // reset the sequence for restarting cleanly when the communication will be back
-                    current_display = "";
-                    current_page = 0;
+                    reset_sequence();
                 }
             },
             complete: function(jqXHR, textStatus) {
@@ -62,6 +88,38 @@ $(document).ready(function() {
         });
     }
 
+    /*
+        Opens the push channel, on which the server sends the displays following the sequence
+        schedule, and as soon as their content changes.
+
+        Falls back to polling if the channel cannot be opened.
+     */
+    function open_channel() {
+        var opened = false;
+        var channel = new WebSocket(make_url('channel', 'ws'));
+
+        channel.onopen = function() {
+            opened = true;
+        };
+        channel.onmessage = function(event) {
+            show_display(JSON.parse(event.data));
+        };
+        channel.onclose = function() {
+            if (opened) {
+                // communication lost : try to reopen the channel a bit later
+                error_container.show();
+                reset_sequence();
+                setTimeout(open_channel, 5000);
+            } else {
+                update_display();
+            }
+        };
+    }
+
     // bootstraps the first display
-    update_display();
-});
\ No newline at end of file
+    if (window.WebSocket) {
+        open_channel();
+    } else {
+        update_display();
+    }
+});
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+""" Tracing of the requests processing stages.
+
+The processing of a request is split in spans (display sequencing, data computation, template rendering, JSON
+encoding,...), recorded with their start time and duration in a ring buffer. The buffer content can be exported
+in the Chrome trace event format, for being inspected with chrome://tracing or Perfetto (https://ui.perfetto.dev).
+
+Requests are sampled : only a given ratio of them is traced, so that the tracing can stay active during the
+event. The sampling decision is taken when a request starts to be processed (see `Tracer.trace()`), which gives
+the trace of the request. It is kept by the request handler (see `pjc.web.lib.AppRequestHandler`), and the spans
+are opened with it, so that the decision applies to the request only, even if other ones are processed while it
+waits for an asynchronous operation.
+
+The persistence writes are not related to a request, and are recorded by the tracer itself whatever the sampling
+decision, as long as the tracing is enabled.
+"""
+
+from collections import deque
+import os
+import random
+import threading
+import time
+
+__author__ = 'eric'
+
+
+class _Span(object):
+    """ Context manager recording a span.
+    """
+    __slots__ = ('tracer', 'name', 'category', 'args', 'start')
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.tracer.record(self.name, self.category, self.start, time.time() - self.start, self.args)
+
+
+class _NullSpan(object):
+    """ Context manager used when spans are not recorded.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Trace(object):
+    """ Trace of a sampled processing (request, push to a TV display,...).
+
+    The spans of the processing are opened with `span()`. The root span, covering the whole processing, is
+    recorded by `finish()`, or when leaving the block if the trace is used as a context manager.
+    """
+    #: tells if the spans are recorded
+    sampled = True
+
+    def __init__(self, tracer, name, category='request', args=None):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = time.time()
+
+    def span(self, name, category='app', args=None):
+        """ Returns a context manager recording a span of the processing.
+
+        :param str name: the name of the span
+        :param str category: the category of the span
+        :param dict args: optional details shown with the span
+        """
+        return _Span(self.tracer, name, category, args)
+
+    def finish(self, start=None, args=None):
+        """ Records the root span, ending now.
+
+        :param float start: the start time of the processing (as a timestamp), if not the creation time of the trace
+        :param dict args: details added to the ones given when creating the trace
+        """
+        if start is None:
+            start = self.start
+        if args:
+            args = dict(self.args or {}, **args)
+        else:
+            args = self.args
+        self.tracer.record(self.name, self.category, start, time.time() - start, args)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.finish()
+
+
+class _NullTrace(object):
+    """ Trace of the processings which are not sampled.
+    """
+    sampled = False
+
+    def span(self, name, category='app', args=None):
+        return _NULL_SPAN
+
+    def finish(self, start=None, args=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+#: the trace used when the processing is not sampled
+NULL_TRACE = _NullTrace()
+
+
+class Tracer(object):
+    """ Recorder of the spans, in a ring buffer.
+
+    The spans of the sampled processings are recorded with their trace (see `trace()`). The other spans are
+    recorded with the `span()` context manager, or by `record()` when their start and end are not in the same
+    code block.
+
+    Spans can be recorded from any thread.
+    """
+    # default count of events kept in the buffer
+    BUFFER_SIZE = 20000
+
+    def __init__(self, sample_rate=0.0, buffer_size=BUFFER_SIZE):
+        """
+        :param float sample_rate: the ratio of traced requests, between 0 (tracing disabled) and 1
+        :param int buffer_size: the count of spans kept in the buffer
+        """
+        self._sample_rate = 0.0
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=buffer_size)
+        self._thread_names = {}
+        self._pid = os.getpid()
+
+    @property
+    def sample_rate(self):
+        return self._sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, value):
+        value = float(value)
+        if not 0 <= value <= 1:
+            raise ValueError('invalid sample rate (%s)' % value)
+        self._sample_rate = value
+
+    @property
+    def enabled(self):
+        return self._sample_rate > 0
+
+    @property
+    def event_count(self):
+        return len(self._events)
+
+    def trace(self, name, category='request', args=None):
+        """ Takes the sampling decision for a processing starting now.
+
+        :param str name: the name of the root span of the trace
+        :param str category: the category of the root span
+        :param dict args: optional details shown with the root span
+        :returns: the trace of the processing (see `Trace`), or `NULL_TRACE` if not sampled
+        """
+        if self._sample_rate > 0 and random.random() < self._sample_rate:
+            return Trace(self, name, category, args)
+        return NULL_TRACE
+
+    def span(self, name, category='app', args=None):
+        """ Returns a context manager recording a span if the tracing is enabled, whatever the sampling decision.
+
+        :param str name: the name of the span
+        :param str category: the category of the span
+        :param dict args: optional details shown with the span
+        """
+        if self._sample_rate > 0:
+            return _Span(self, name, category, args)
+        return _NULL_SPAN
+
+    def traced(self, name, function, category='persistence'):
+        """ Returns a wrapper of a function recording its calls as spans, whatever the sampling decision.
+        """
+        def wrapper(*args, **kwargs):
+            with self.span(name, category):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def record(self, name, category, start, duration, args=None):
+        """ Records a span.
+
+        :param float start: the start time of the span (as a timestamp)
+        :param float duration: the duration of the span (in seconds)
+        """
+        thread = threading.current_thread()
+        if thread.ident not in self._thread_names:
+            self._thread_names[thread.ident] = thread.name
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': int(start * 1000000),
+            'dur': int(duration * 1000000),
+            'pid': self._pid,
+            'tid': thread.ident,
+        }
+        if args:
+            event['args'] = args
+        with self._lock:
+            self._events.append(event)
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+    def export(self):
+        """ Returns the recorded spans in the Chrome trace event format, as a JSON serializable dictionary.
+        """
+        with self._lock:
+            spans = list(self._events)
+        events = [
+            {'name': 'process_name', 'ph': 'M', 'pid': self._pid, 'args': {'name': 'pjc-webapp %d' % self._pid}}
+        ] + [
+            {'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': ident, 'args': {'name': name}}
+            for ident, name in self._thread_names.items()
+        ]
+        return {
+            'traceEvents': events + spans,
+            'displayTimeUnit': 'ms',
+        }
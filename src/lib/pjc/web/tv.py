@@ -6,8 +6,15 @@
 
 from operator import itemgetter
 import datetime
+import hashlib
 import httplib
 
+import tornado.ioloop
+import tornado.websocket
+from tornado import gen
+from tornado.web import HTTPError
+
+from pjc.web.tracing import NULL_TRACE
 from pjc.web.ui import UIRequestHandler
 
 
@@ -31,10 +38,19 @@ class TVStart(UIRequestHandler):
 
 class SequencedDisplay(object):
     """ Mixin adding the sequenced display feature.
+
+    It implements the sequencing of the displays for a given TV client, and the rendering of their content. It
+    is shared by the polling handler (`TVContent`) and by the push channel (`TVChannel`), which provide the trace
+    of the processing as their `trace` attribute (see `pjc.web.tracing`).
     """
+    TEMPLATES_DIR = 'tv_display'
+
     # default display delay
     _delay = 5
 
+    # display context saved when a message is inserted in the sequence, keyed by the client
+    display_saved_context = {}
+
     @classmethod
     def get_delay(cls):
         """ Defines the delay before showing next display.
@@ -47,55 +63,58 @@ class SequencedDisplay(object):
     def set_delay(cls, delay):
         cls._delay = delay
 
+    def get_next_display(self, client, current_display, current_page):
+        """ Returns the display and the page to be shown next by a client, as a tuple.
 
-class TVContent(UIRequestHandler, SequencedDisplay):
-    """ Handler providing the content part of the displays on TV sets.
-
-    Javascript code of the HTML page periodically uses this request to get the next content
-    to put on the public address TV screens.
-    """
-    TEMPLATES_DIR = 'tv_display'
-    display_saved_context = {}
+        :param str client: the client identification
+        :param str current_display: the name of the display currently shown by the client, if any
+        :param int current_page: the page of the display currently shown by the client
+        :returns: the display name and page number, or None if the display sequence is empty
+        """
+        return self.sequence_next_display(self.application, client, current_display, current_page, self.trace)
 
-    def get(self):
-        client, port = self.request.connection.context.address
+    @classmethod
+    def sequence_next_display(cls, application, client, current_display, current_page, trace=NULL_TRACE):
+        """ Same as `get_next_display()`, for a given application.
 
-        if self.application.client_is_known(client):
-            current_display = self.get_argument("current_display", None)
-            current_page = int(self.get_argument("current_page", '1'))
-        else:
-            current_display, current_page = None, 0
+        Used by the application for sequencing the displays of the polling clients (see
+        `PJCWebApp.next_tv_display()`).
 
-        sequence = self.application.get_client_sequence(client)
-        if self.application.debug:
-            self.application.log.debug("seq(%s) = %s", client, sequence)
+        :param Trace trace: the trace of the processing
+        """
+        with trace.span('get_client_sequence'):
+            sequence = application.get_client_sequence(client)
+        if application.debug:
+            application.sequencing_log.debug("seq(%s) = %s", client, sequence)
         if not sequence:
-            self.send_error(httplib.NOT_FOUND)
+            return None
 
         # handle the case where the server is restarted while a TV was displaying a message
-        if current_display == "message" and not self.application.tv_message:
+        if current_display == "message" and not application.tv_message:
             current_display = None
 
         if not current_display:
             current_display = sequence.pop(0)
 
-        if self.application.debug:
-            self.application.log.debug("curdisp/curpage(%s) = %s/%s", client, current_display, current_page)
+        if application.debug:
+            application.sequencing_log.debug("curdisp/curpage(%s) = %s/%s", client, current_display, current_page)
 
-        if self.application.tv_message and current_display != "message":
-            self.display_saved_context[client] = (current_display, current_page)
+        if application.tv_message and current_display != "message":
+            cls.display_saved_context[client] = (current_display, current_page)
             next_display = "message"
             next_page = 1
 
         else:
             # restore the context as it was when the message was inserted in the sequence
-            if client in self.display_saved_context:
-                if self.application.debug:
-                    self.application.log.debug("restoring display context for client %s", client)
-                current_display, current_page = self.display_saved_context[client]
-                del self.display_saved_context[client]
-
-            if current_page < self.application.required_pages(current_display):
+            if client in cls.display_saved_context:
+                if application.debug:
+                    application.sequencing_log.debug("restoring display context for client %s", client)
+                current_display, current_page = cls.display_saved_context[client]
+                del cls.display_saved_context[client]
+
+            with trace.span('required_pages', args={'display': current_display}):
+                page_count = application.required_pages(current_display)
+            if current_page < page_count:
                 next_display = current_display
                 next_page = current_page + 1
             else:
@@ -103,27 +122,171 @@ class TVContent(UIRequestHandler, SequencedDisplay):
                 next_display = sequence.pop(0)
                 next_page = 1
 
-        if self.application.debug:
-            self.application.log.debug("nextdisp/nextpage(%s) = %s/%s", client, next_display, next_page)
+        if application.debug:
+            application.sequencing_log.debug("nextdisp/nextpage(%s) = %s/%s", client, next_display, next_page)
 
-        html = self.render_string(
-            "%s/%s.html" % (self.TEMPLATES_DIR, next_display),
-            application=self.application,
-            page_num=next_page,
-            page_size=self.application.TV_PAGE_SIZE,
-            page_count=self.application.required_pages(next_display)
-        )
-        self.write({
-            'display_name': next_display,
-            'current_page': next_page,
-            'content': html,
-            'delay': self._delay,
+        return next_display, next_page
+
+    def render_display(self, display_name, page_num):
+        """ Renders the content of a display page.
+
+        :returns: the HTML content
+        """
+        with self.trace.span('render_display', 'template', {'display': display_name, 'page': page_num}):
+            return self.render_string(
+                "%s/%s.html" % (self.TEMPLATES_DIR, display_name),
+                application=self.application,
+                page_num=page_num,
+                page_size=self.application.TV_PAGE_SIZE,
+                page_count=self.application.required_pages(display_name)
+            )
+
+    def _render_and_hash(self, display_name, page_num):
+        html = self.render_display(display_name, page_num)
+        return html, hashlib.md5(html).hexdigest()
+
+    def get_display_data(self, display_name, page_num, known_hash=None):
+        """ Returns the data sent to the client for displaying a page.
+
+        It is a dictionary with the following entries :
+            - display_name : the symbolic name of the display
+            - current_page : the number of the page (>= 1)
+            - content : the HTML code of the display, omitted if its hash is the one already known by the client
+            - hash : the hash of the HTML code
+            - delay : the delay (in seconds) before next display
+            - clock : the server clock at display time
+
+        :param str known_hash: the hash of the content currently shown by the client, if any
+        """
+        with self.trace.span('get_rendered_display'):
+            html, content_hash = self.application.get_rendered_display(display_name, page_num, self._render_and_hash)
+        data = {
+            'display_name': display_name,
+            'current_page': page_num,
+            'hash': content_hash,
+            'delay': self.get_delay(),
             'clock': datetime.datetime.now().strftime("%H:%M")
+        }
+        if content_hash != known_hash:
+            data['content'] = html
+        return data
 
-        })
+
+class TVContent(UIRequestHandler, SequencedDisplay):
+    """ Handler providing the content part of the displays on TV sets.
+
+    Javascript code of the HTML page periodically uses this request to get the next content
+    to put on the public address TV screens. It is used as a fallback when the push channel
+    (see `TVChannel`) cannot be used.
+
+    Since the successive requests of a client can be served by different processes in the multi-process
+    serving mode, the displays sequencing is done by the application (see `PJCWebApp.next_tv_display()`).
+    """
+    @gen.coroutine
+    def get(self):
+        client, port = self.request.connection.context.address
+        self.application.metrics.observe_tv_client(client)
+
+        known, next_ = yield self.application.next_tv_display(
+            client, self.get_argument("current_display", None), int(self.get_argument("current_page", '1')),
+            self.trace
+        )
+        known_hash = self.get_argument("hash", None) if known else None
+        if not next_:
+            raise HTTPError(httplib.NOT_FOUND)
+
+        next_display, next_page = next_
+        data = self.get_display_data(next_display, next_page, known_hash)
+        with self.trace.span('json_encode'):
+            self.write(data)
         self.finish()
 
 
+class TVChannel(tornado.websocket.WebSocketHandler, SequencedDisplay):
+    """ Push channel of the displays on TV sets.
+
+    Each connected TV gets its next display pushed at the end of the display delay, following its own schedule.
+    When the tournament data or the TV message are modified, the current display is rendered again
+    and pushed immediately if its content has changed.
+
+    Messages have the same content as the `TVContent` replies. The HTML content is omitted when unchanged, so
+    that the client can skip its rendering.
+    """
+    # the trace of the push being processed, if sampled
+    trace = NULL_TRACE
+
+    def open(self):
+        self.client = self.request.remote_ip
+        self.current_display, self.current_page = None, 0
+        self._last_hash = None
+        self._timeout = None
+
+        self.application.register_tv_channel(self)
+        self.advance()
+
+    def on_close(self):
+        self._cancel_timeout()
+        self.application.unregister_tv_channel(self)
+
+    def on_message(self, message):
+        # the channel is one-way, nothing expected from the client
+        pass
+
+    def _cancel_timeout(self):
+        if self._timeout is not None:
+            tornado.ioloop.IOLoop.current().remove_timeout(self._timeout)
+            self._timeout = None
+
+    def _push(self, changed_only=False):
+        data = self.get_display_data(self.current_display, self.current_page, self._last_hash)
+        if changed_only and 'content' not in data:
+            return
+        self._last_hash = data['hash']
+        with self.trace.span('write_message'):
+            self.write_message(data)
+
+    def advance(self):
+        """ Pushes the next display of the sequence, and schedules the following one.
+        """
+        self._timeout = None
+        if self.ws_connection is None:
+            return
+
+        self.trace = self.application.tracer.trace('TVChannel.advance', 'websocket', {'client': self.client})
+        try:
+            with self.trace:
+                next_ = self.get_next_display(self.client, self.current_display, self.current_page)
+                if next_:
+                    self.current_display, self.current_page = next_
+                    self._push()
+        except Exception:
+            # the channel must not stop because of a failed display
+            self.application.log.exception('cannot push the next display to %s', self.client)
+        finally:
+            self.trace = NULL_TRACE
+            if self.ws_connection is not None:
+                self._timeout = tornado.ioloop.IOLoop.current().call_later(self.get_delay(), self.advance)
+
+    def refresh(self):
+        """ Pushes the current display again if its content has changed, or the message display if a message
+        has been posted.
+        """
+        if self.ws_connection is None or not self.current_display:
+            return
+
+        if (self.application.tv_message and self.current_display != "message") or \
+                (not self.application.tv_message and self.current_display == "message"):
+            self._cancel_timeout()
+            self.advance()
+        elif self.current_page <= self.application.required_pages(self.current_display):
+            self.trace = self.application.tracer.trace('TVChannel.refresh', 'websocket', {'client': self.client})
+            try:
+                with self.trace:
+                    self._push(changed_only=True)
+            finally:
+                self.trace = NULL_TRACE
+
+
 def get_selectable_displays():
     displays = (
         ('scores', 'Scores'),
@@ -135,6 +298,7 @@ def get_selectable_displays():
 
 handlers = [
     (r"/tv/content", TVContent),
+    (r"/tv/channel", TVChannel),
     (r"/tv[/]?", TVStart),
 ]
 
@@ -29,11 +29,11 @@ class UIRequestHandler(AppRequestHandler):
         _template_name = self.template_name
         if not _template_name.endswith('.html'):
             _template_name += '.html'
-        self.render(
-            os.path.join(self.template_dir, _template_name),
-            title=self.PAGES_TITLE,
-            **self.template_args
-        )
+        with self.trace.span('template_args'):
+            template_args = self.template_args
+        path = os.path.join(self.template_dir, _template_name)
+        with self.trace.span('render', 'template', {'template': path}):
+            self.render(path, title=self.PAGES_TITLE, **template_args)
 
     @property
     def template_dir(self):
@@ -9,6 +9,7 @@ from operator import itemgetter
 from tornado.web import UIModule
 
 from pjc.tournament import Tournament
+from pjc.web.tracing import NULL_TRACE
 
 
 __author__ = 'eric'
@@ -22,6 +23,12 @@ class UIModuleBase(UIModule):
     """
     TEMPLATE_DIRECTORY = "uimodules"
 
+    @property
+    def trace(self):
+        """ The trace of the request rendering the module (see `pjc.web.tracing`).
+        """
+        return getattr(self.handler, 'trace', NULL_TRACE)
+
     @property
     def template_name(self):
         """ Returns the name (without extension and path) of the body template.
@@ -44,10 +51,10 @@ class UIModuleBase(UIModule):
         return os.path.join(self.TEMPLATE_DIRECTORY, name)
 
     def render(self, application, *args, **kwargs):
-        return self.render_string(
-            self.make_template_path(),
-            **self.get_template_args(application, *args, **kwargs)
-        )
+        with self.trace.span(self.__class__.__name__, 'module'):
+            with self.trace.span('get_template_args'):
+                template_args = self.get_template_args(application, *args, **kwargs)
+            return self.render_string(self.make_template_path(), **template_args)
 
 
 class AdminPageTitle(UIModuleBase):
@@ -107,7 +114,8 @@ class PlanningTable(UIModuleBase):
         now = datetime.datetime.now()
         current_time = now.time()
 
-        status_rob, status_research, _ = tournament.get_completion_status()
+        with self.trace.span('get_completion_status'):
+            status_rob, status_research, _ = tournament.get_completion_status()
 
         # transposes the robotics status table, so that lines are teams
         status_rob = zip(*status_rob)
@@ -145,6 +153,9 @@ class NextSchedules(UIModuleBase):
 
     ITEM_LABELS = ['Epreuve 1', 'Epreuve 2', 'Epreuve 3', 'Exposé']
 
+    # count of appointments listed on TV displays
+    TV_DISPLAY_COUNT = 6
+
     @property
     def template_name(self):
         return "next_schedules"
@@ -152,11 +163,6 @@ class NextSchedules(UIModuleBase):
     def get_template_args(self, application, tv_display=False, *args, **kwargs):
         # now = (datetime.datetime.now() - datetime.timedelta(hours=3, minutes=15)).time()
         now = datetime.datetime.now().time()
-        next_appts = sorted([
-            (time, team, team.planning.times.index(time))
-            for team in application.tournament.teams(present_only=True)
-            for time in team.planning.times if time >= now
-        ], key=itemgetter(0, 1))
 
         def emergency(t):
             t_s, now_s = (_t.hour * 3600 + _t.minute * 60 + _t.second for _t in (t, now))
@@ -168,35 +174,26 @@ class NextSchedules(UIModuleBase):
             else:
                 return 'text-danger'
 
+        with self.trace.span('get_timeline'):
+            timeline = application.tournament.get_timeline()
         if tv_display:
             # if we are building the list for the TV displays, we keep only the first slots,
             # and try to make the list the most "natural" by not "truncating" the last one
-
-            # start with the first 6
-            default_count = 6
-            wrk_appts = next_appts[:default_count]
-
-            # if they are more items for the last listed slot, append them
             # (it will fit the display, since at the most we'll add only 2 more)
-            if len(next_appts) > len(wrk_appts):
-                last_slot = wrk_appts[-1][0]
-                for appt in next_appts[default_count:]:
-                    if appt[0] == last_slot:
-                        wrk_appts.append(appt)
-                    else:
-                        break
-
-            next_appts = wrk_appts
-
-        schedules = [
-            self.Schedule(
+            next_appts = timeline.next_appointments(now, count=self.TV_DISPLAY_COUNT, complete_slot=True)
+        else:
+            next_appts = timeline.next_appointments(now)
+
+        tournament = application.tournament
+        schedules = []
+        for when, team_num, item_index in next_appts:
+            team = tournament.get_team(team_num)
+            schedules.append(self.Schedule(
                 team.num,
                 team.name,
                 self.ITEM_LABELS[item_index],
                 team.planning[item_index]
-            )
-            for when, team, item_index in next_appts
-        ]
+            ))
         return {
             'schedules': schedules,
             'emergency_class': emergency
@@ -215,7 +212,8 @@ class ScoresTable(UIModuleBase):
 
     def get_template_args(self, application, page_num=1, tv_display=False):
         tournament = application.tournament
-        scores = tournament.get_compiled_scores()
+        with self.trace.span('get_compiled_scores'):
+            scores = tournament.get_compiled_scores()
         scores_data = [
             self.ScoreDataItem(
                 self.TeamItem(team_num, team.name, team.bonus),
@@ -257,8 +255,11 @@ class RankingTable(UIModuleBase):
         current_rank = None
         current_teams = []
 
+        with self.trace.span('get_final_ranking'):
+            ranking = tournament.get_final_ranking()
+
         exploded = []
-        for rank, teams in tournament.get_final_ranking():
+        for rank, teams in ranking:
             ranks = [rank] * len(teams)
             exploded.extend(zip(ranks, teams))
 
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+""" Detection of the IO loop stalls.
+
+Everything runs on the IO loop thread : when a callback takes too long (a blocking call, a large rendering,...),
+all the other requests wait, and the TV displays freeze. The `StallWatchdog` detects these stalls from another
+thread, and captures the stack of the IO loop thread while it is stalled, so that the blocking code can be
+identified.
+"""
+
+from collections import deque
+import logging
+import sys
+import threading
+import time
+import traceback
+
+import tornado.ioloop
+import tornado.web
+
+__author__ = 'eric'
+
+
+class Stall(object):
+    """ A stall of the IO loop.
+    """
+    def __init__(self, start, stack, request):
+        #: the time of the last IO loop heartbeat before the stall (as a timestamp)
+        self.start = start
+        #: the stack of the IO loop thread when the stall was detected, as a list of formatted lines
+        self.stack = stack
+        #: the description of the request being served when the stall was detected, if any
+        self.request = request
+        #: the duration of the stall (in seconds), None while it is not over
+        self.duration = None
+
+    @property
+    def in_progress(self):
+        return self.duration is None
+
+    def as_dict(self):
+        return {
+            'start': self.start,
+            'duration': self.duration,
+            'request': self.request,
+            'stack': self.stack,
+        }
+
+
+def _describe_request(frame):
+    """ Returns the description of the request served by the innermost request handler found in a stack, if any.
+    """
+    while frame is not None:
+        handler = frame.f_locals.get('self')
+        if isinstance(handler, tornado.web.RequestHandler):
+            request = handler.request
+            return '%s %s (%s, %s)' % (request.method, request.uri, request.remote_ip, handler.__class__.__name__)
+        frame = frame.f_back
+    return None
+
+
+class StallWatchdog(object):
+    """ Watchdog thread detecting the IO loop stalls.
+
+    A heartbeat callback is run periodically by the IO loop. When the watchdog thread notices that no heartbeat
+    happened during the threshold delay, it captures the stack of the IO loop thread and the request being served,
+    and logs them. The stall is over at the next heartbeat, which records its duration.
+
+    The last stalls are kept in memory, for being shown by the administration UI.
+    """
+    # default threshold (in seconds)
+    THRESHOLD = 0.5
+
+    # default count of kept stalls
+    LOG_SIZE = 50
+
+    def __init__(self, threshold=THRESHOLD, log_size=LOG_SIZE):
+        """
+        :param float threshold: the delay (in seconds) without heartbeat after which the IO loop is considered as
+        stalled
+        :param int log_size: the maximum count of stalls kept in memory
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._threshold = threshold
+        self._lock = threading.Lock()
+        self._stalls = deque(maxlen=log_size)
+        self._stall_count = 0
+        self._current = None
+        self._last_beat = None
+        self._io_loop = None
+        self._io_loop_thread_id = None
+        self._heartbeat = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    @property
+    def threshold(self):
+        return self._threshold
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    @property
+    def stall_count(self):
+        """ The total count of stalls detected since the watchdog start.
+        """
+        return self._stall_count
+
+    @property
+    def stalls(self):
+        """ The last stalls, most recent first.
+        """
+        with self._lock:
+            return list(reversed(self._stalls))
+
+    def start(self):
+        """ Starts watching the current IO loop.
+
+        Must be called from the IO loop thread.
+        """
+        if self._thread is not None:
+            return
+        self._io_loop = tornado.ioloop.IOLoop.current()
+        self._io_loop_thread_id = threading.current_thread().ident
+        self._last_beat = time.time()
+        self._heartbeat = tornado.ioloop.PeriodicCallback(self._beat, self._threshold / 4 * 1000)
+        self._heartbeat.start()
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name=self.__class__.__name__)
+        self._thread.daemon = True
+        self._thread.start()
+        self.log.info('IO loop stall watchdog started (threshold: %.3fs)', self._threshold)
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._heartbeat.stop()
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def _beat(self):
+        now = time.time()
+        with self._lock:
+            self._last_beat = now
+            stall, self._current = self._current, None
+            if stall is not None:
+                stall.duration = now - stall.start
+        if stall is not None:
+            self.log.warning('IO loop stall over after %.3fs', stall.duration)
+
+    def _run(self):
+        while not self._stopped.wait(self._threshold / 4):
+            with self._lock:
+                if self._current is not None or time.time() - self._last_beat < self._threshold:
+                    continue
+                frame = sys._current_frames().get(self._io_loop_thread_id)
+                stack = traceback.format_stack(frame) if frame is not None else []
+                request = _describe_request(frame)
+                del frame
+                self._current = Stall(self._last_beat, stack, request)
+                self._stalls.append(self._current)
+                self._stall_count += 1
+                stall = self._current
+
+            self.log.warning(
+                'IO loop stalled for more than %.3fs while serving %s - stack:\n%s',
+                time.time() - stall.start, stall.request or 'no request', ''.join(stall.stack)
+            )
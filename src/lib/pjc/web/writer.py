@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+""" Single writer of the tournament.
+"""
+
+from collections import deque
+import logging
+import threading
+
+import tornado.ioloop
+from tornado.concurrent import Future
+
+__author__ = 'eric'
+
+
+class TournamentWriter(object):
+    """ Owns the tournament, and is the only one modifying it.
+
+    Modifications are submitted as commands (see `pjc.commands`), which are applied on the IO loop thread.
+    After each batch of commands, a new snapshot of the tournament is published (see `Tournament.snapshot()`).
+    Readers use the current snapshot, which is never modified and thus can be used from any thread
+    without locking.
+
+    Commands can be applied :
+        - synchronously with `execute()`, from the IO loop thread (request handlers for instance)
+        - asynchronously with `submit()`, from any thread. Commands submitted before the IO loop
+          processes them are applied as a single batch.
+    """
+    def __init__(self, tournament, io_loop=None):
+        """
+        :param Tournament tournament: the tournament, which must not be modified by others from now on
+        :param IOLoop io_loop: the IO loop on which commands are applied (the current one by default)
+        """
+        self.log = logging.getLogger(self.__class__.__name__)
+        self._tournament = tournament
+        self._io_loop = io_loop or tornado.ioloop.IOLoop.current()
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._scheduled = False
+        self._snapshot = tournament.snapshot()
+
+    @property
+    def snapshot(self):
+        """ The last published snapshot of the tournament.
+        """
+        return self._snapshot
+
+    def publish(self):
+        """ Publishes a new snapshot of the tournament.
+
+        Done automatically after each batch of commands, but must be called after modifications made
+        directly on the tournament (at initialization time for instance).
+        """
+        self._snapshot = self._tournament.snapshot(self._snapshot)
+        return self._snapshot
+
+    def execute(self, commands):
+        """ Applies a list of commands, and publishes the resulting snapshot.
+
+        Must be called from the IO loop thread. Commands are applied in a single tournament transaction.
+        Commands are not validated beforehand, so if one of them fails, the preceding ones remain applied
+        (the snapshot being published anyway).
+
+        :param list commands: the commands
+        :returns: the published snapshot
+        :raises ValueError: if a command is invalid
+        """
+        try:
+            with self._tournament.transaction():
+                for command in commands:
+                    self._tournament.apply_mutation(command)
+        finally:
+            self.publish()
+        return self._snapshot
+
+    def submit(self, commands):
+        """ Queues a list of commands, to be applied on the IO loop thread.
+
+        Can be called from any thread.
+
+        :param list commands: the commands
+        :returns Future: a future resolved with the snapshot including the modifications once they are applied
+        """
+        future = Future()
+        with self._lock:
+            self._pending.append((commands, future))
+            schedule, self._scheduled = not self._scheduled, True
+        if schedule:
+            self._io_loop.add_callback(self._process_pending)
+        return future
+
+    def _process_pending(self):
+        with self._lock:
+            batch = list(self._pending)
+            self._pending.clear()
+            self._scheduled = False
+
+        outcomes = []
+        with self._tournament.transaction():
+            for commands, future in batch:
+                try:
+                    for command in commands:
+                        self._tournament.apply_mutation(command)
+                except Exception as e:
+                    self.log.error('command failed : %s', e)
+                    outcomes.append((future, e))
+                else:
+                    outcomes.append((future, None))
+
+        snapshot = self.publish()
+        for future, error in outcomes:
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(snapshot)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Benchmark of the scoring, ranking and rendering hot paths.
+
+Synthetic tournaments of various sizes are generated with random plannings and scores, and the time taken
+by the main tournament queries, the persistence (JSON and binary data files, SQLite database) and the UI modules
+is measured on them.
+
+Tournament queries are measured twice :
+    - "cold" : the tournament caches are invalidated before each run, by modifying a score of each round
+    - "cached" : repeated calls on an unmodified tournament
+
+Results are written as JSON, so that runs can be compared over time.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'lib'))
+
+import tornado.httputil
+import tornado.web
+
+from pjc import datafile
+from pjc.tournament import Tournament, Team, TeamPlanning, Grade, ResearchEvaluationScore, JuryEvaluationScore
+from pjc.current_edition import Round1Score, Round2Score, Round3Score
+from pjc.database import TournamentDatabase
+from pjc.web import uimodules
+
+__author__ = 'Eric Pascual'
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+
+ROBOTICS_ROUND_TYPES = (Round1Score, Round2Score, Round3Score)
+
+WEB_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'lib', 'pjc', 'web')
+
+
+def random_time(rnd, start_hour, end_hour):
+    return datetime.time(rnd.randint(start_hour, end_hour - 1), rnd.choice(range(0, 60, 10)))
+
+
+def make_tournament(team_count, rnd):
+    """ Generates a tournament with random plannings and scores.
+
+    Some teams have not played all the rounds yet, so that results contain the various cases.
+    """
+    tournament = Tournament(ROBOTICS_ROUND_TYPES)
+    for num in xrange(1, team_count + 1):
+        planning = TeamPlanning(
+            [random_time(rnd, 9 + 2 * i, 11 + 2 * i) for i in range(3)] + [random_time(rnd, 9, 17)]
+        )
+        tournament.add_team(Team(
+            num, 'Team %d' % num, 'School %d' % num, rnd.randint(Grade.POST_BAC, Grade.CM1), 'Nice', '06', True,
+            planning=planning
+        ))
+
+    with tournament.transaction():
+        for num in xrange(1, team_count + 1):
+            if rnd.random() < 0.95:
+                tournament.set_robotics_score(num, 1, Round1Score(rnd.randint(60, 150), rnd.randint(0, 8)))
+            if rnd.random() < 0.9:
+                tournament.set_robotics_score(num, 2, Round2Score(
+                    rnd.randint(60, 150), rnd.randint(0, 8), rnd.randint(0, 2), rnd.randint(0, 2)
+                ))
+            if rnd.random() < 0.8:
+                tournament.set_robotics_score(num, 3, Round3Score(
+                    rnd.randint(60, 150), rnd.randint(Round3Score.OUTSIDE, Round3Score.FULLY_INSIDE), rnd.randint(0, 2)
+                ))
+            if rnd.random() < 0.9:
+                tournament.set_research_evaluation(num, ResearchEvaluationScore(
+                    True, *[rnd.randint(0, 20) for _ in range(4)]
+                ))
+            if rnd.random() < 0.9:
+                tournament.set_jury_evaluation(num, JuryEvaluationScore(rnd.randint(0, 20)))
+    return tournament
+
+
+def invalidate_caches(tournament):
+    """ Invalidates the cached results, by clearing and setting again a score of each round (setting a score
+    identical to the stored one does not modify the tournament).
+    """
+    with tournament.transaction():
+        for round_num, round_ in enumerate(tournament.get_robotics_rounds(), start=1):
+            for team_num, score in round_.scores.items()[:1]:
+                tournament.clear_robotics_score(team_num, round_num)
+                tournament.set_robotics_score(team_num, round_num, score)
+        for team_num, score in tournament.research_evaluations.scores.items()[:1]:
+            tournament.clear_research_evaluation(team_num)
+            tournament.set_research_evaluation(team_num, score)
+        for team_num, score in tournament.jury_evaluations.scores.items()[:1]:
+            tournament.clear_jury_evaluation(team_num)
+            tournament.set_jury_evaluation(team_num, score)
+
+
+def measure(func, repeat, setup=None):
+    """ Runs a function several times, and returns the statistics of the execution times (in seconds).
+    """
+    timings = []
+    for _ in xrange(repeat):
+        if setup:
+            setup()
+        start = timeit.default_timer()
+        func()
+        timings.append(timeit.default_timer() - start)
+    return {
+        'min': min(timings),
+        'mean': sum(timings) / len(timings),
+        'max': max(timings),
+    }
+
+
+class _Connection(object):
+    """ Connection stand-in, for creating request handlers outside of the server.
+    """
+    def set_close_callback(self, callback):
+        pass
+
+
+class BenchmarkApplication(tornado.web.Application):
+    """ Minimal Web application, providing what the UI modules use to render the tournament.
+    """
+    TV_PAGE_SIZE = 10
+
+    def __init__(self, tournament):
+        super(BenchmarkApplication, self).__init__(
+            template_path=os.path.join(WEB_ROOT, 'templates'),
+            ui_modules=uimodules
+        )
+        self.tournament = tournament
+
+    def make_handler(self):
+        request = tornado.httputil.HTTPServerRequest(method='GET', uri='/', connection=_Connection())
+        return tornado.web.RequestHandler(self, request)
+
+
+def run_tournament_benchmarks(tournament, repeat):
+    results = {}
+    for name in ('get_final_ranking', 'get_compiled_scores', 'get_completion_status'):
+        method = getattr(tournament, name)
+        results[name] = {
+            'cold': measure(method, repeat, setup=lambda: invalidate_caches(tournament)),
+            'cached': measure(method, repeat),
+        }
+
+    data = {}
+
+    def serialize():
+        data['content'] = json.dumps(tournament.serialize())
+
+    def deserialize():
+        Tournament(ROBOTICS_ROUND_TYPES).deserialize(json.loads(data['content']))
+
+    results['serialize'] = measure(serialize, repeat)
+    results['deserialize'] = measure(deserialize, repeat)
+    results['serialized_size'] = len(data['content'])
+
+    def pack():
+        data['binary'] = datafile.pack(tournament)
+
+    def unpack():
+        datafile.unpack(data['binary'], Tournament(ROBOTICS_ROUND_TYPES))
+
+    def unpack_decoded():
+        # includes the decoding of all the scores, as done when the results are computed
+        loaded = Tournament(ROBOTICS_ROUND_TYPES)
+        datafile.unpack(data['binary'], loaded)
+        for round_ in loaded.get_robotics_rounds() + [loaded.research_evaluations, loaded.jury_evaluations]:
+            len(round_.scores)
+
+    results['binary_pack'] = measure(pack, repeat)
+    results['binary_unpack'] = measure(unpack, repeat)
+    results['binary_unpack_decoded'] = measure(unpack_decoded, repeat)
+    results['binary_size'] = len(data['binary'])
+
+    db_dir = tempfile.mkdtemp()
+    try:
+        database = TournamentDatabase(os.path.join(db_dir, 'tournament.db'), ROBOTICS_ROUND_TYPES)
+        team_num = tournament.team_nums()[0]
+        record = {'op': 'set_jury_evaluation', 'team': team_num, 'score': JuryEvaluationScore(12).serialize()}
+        results['database_save'] = measure(lambda: database.save(tournament), repeat)
+        results['database_score_update'] = measure(lambda: database.apply([record]), repeat)
+        database.close()
+    finally:
+        shutil.rmtree(db_dir)
+    return results
+
+
+def run_ui_benchmarks(tournament, repeat):
+    application = BenchmarkApplication(tournament)
+    handler = application.make_handler()
+
+    results = {}
+    for module_class, kwargs in (
+        (uimodules.PlanningTable, {}),
+        (uimodules.NextSchedules, {}),
+        (uimodules.ScoresTable, {}),
+        (uimodules.RankingTable, {}),
+        (uimodules.ScoresTable, {'tv_display': True}),
+        (uimodules.RankingTable, {'tv_display': True}),
+    ):
+        module = module_class(handler)
+        name = module_class.__name__ + ('_tv' if kwargs else '')
+        results[name] = {
+            'get_template_args': measure(lambda: module.get_template_args(application, **kwargs), repeat),
+            'render': measure(lambda: module.render(application, **kwargs), repeat),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        '-s', '--sizes',
+        help='comma separated list of tournament sizes (teams count) (default: %s)' % ','.join(
+            str(s) for s in DEFAULT_SIZES
+        ),
+        default=','.join(str(s) for s in DEFAULT_SIZES)
+    )
+    parser.add_argument(
+        '-r', '--repeat',
+        help='count of runs of each measure (default: %(default)s)',
+        type=int,
+        default=5
+    )
+    parser.add_argument(
+        '--seed',
+        help='random generator seed (default: %(default)s)',
+        type=int,
+        default=2016
+    )
+    parser.add_argument(
+        '--no-ui',
+        help='skips the UI modules benchmarks',
+        action='store_true'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        help='path of the JSON result file (default: standard output)'
+    )
+    args = parser.parse_args()
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'tornado': tornado.version,
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'results': {},
+    }
+
+    for size in (int(s) for s in args.sizes.split(',')):
+        sys.stderr.write('benchmarking %d teams...\n' % size)
+        tournament = make_tournament(size, random.Random(args.seed))
+        results = run_tournament_benchmarks(tournament, args.repeat)
+        if not args.no_ui:
+            results['uimodules'] = run_ui_benchmarks(tournament, args.repeat)
+        report['results'][str(size)] = results
+
+    output = json.dumps(report, indent=4, sort_keys=True)
+    if args.output:
+        with open(args.output, 'wt') as fp:
+            fp.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Migration of a tournament data file (tournament.dat) to a SQLite database (tournament.db).
+
+The database is the one used by the Web application in sqlite storage mode (see `pjc.database`). If a journal
+(tournament.journal, and its rotated segment tournament.journal.old) is found next to the data file, its records
+are replayed before the migration.
+
+Note that the Web application migrates the data file by itself when started in sqlite storage mode without
+database. This tool is intended for preparing the database offline, or for getting a database which can be
+queried by external tools.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'lib'))
+
+from pjc import datafile
+from pjc.current_edition import Round1Score, Round2Score, Round3Score
+from pjc.database import TournamentDatabase
+from pjc.journal import Journal
+from pjc.tournament import Tournament
+
+__author__ = 'eric'
+
+ROBOTICS_ROUND_TYPES = (Round1Score, Round2Score, Round3Score)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        'data_file',
+        help='path of the tournament data file'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        help='path of the database (default: tournament.db in the directory of the data file)'
+    )
+    args = parser.parse_args()
+
+    db_path = args.output or os.path.join(os.path.dirname(os.path.abspath(args.data_file)), 'tournament.db')
+    if os.path.exists(db_path):
+        parser.exit(1, 'database already exists (%s)\n' % db_path)
+
+    tournament = Tournament(ROBOTICS_ROUND_TYPES)
+    datafile.load(args.data_file, tournament)
+
+    # the journal may have been rotated (tournament.journal.old) without the current segment being created yet
+    journal_path = os.path.join(os.path.dirname(os.path.abspath(args.data_file)), 'tournament.journal')
+    count = Journal(journal_path).replay(tournament)
+    if count:
+        sys.stderr.write('%d journal record(s) replayed\n' % count)
+
+    database = TournamentDatabase(db_path, ROBOTICS_ROUND_TYPES)
+    try:
+        database.save(tournament)
+    finally:
+        database.close()
+    sys.stderr.write('%d team(s) migrated to %s\n' % (tournament.team_count(present_only=False), db_path))
+
+
+if __name__ == '__main__':
+    main()